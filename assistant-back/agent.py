@@ -1,4 +1,5 @@
 import logging
+import os
 
 from dotenv import load_dotenv
 from livekit.agents import (
@@ -24,11 +25,71 @@ from livekit.plugins import (
 load_dotenv(dotenv_path=".env.local")
 logger = logging.getLogger("voice-agent")
 
+# Imported after load_dotenv so PROMETHEUS_MULTIPROC_DIR may come from .env.local
+from turn_metrics import TurnMetrics, provider_name, start_metrics_server  # noqa: E402
+from voice_common.chat_window import ChatWindow, Entry  # noqa: E402
+
+# Prometheus endpoint on the worker; set METRICS_PORT=0 to turn it off
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+# Chat context bounds (voice_common/chat_window.py): turns and estimated tokens sent verbatim, older
+# turns folded into a summary written by CHAT_SUMMARY_MODEL in the background
+CHAT_WINDOW_TURNS = int(os.getenv("CHAT_WINDOW_TURNS", "6"))
+CHAT_WINDOW_MAX_TOKENS = int(os.getenv("CHAT_WINDOW_MAX_TOKENS", "2000"))
+CHAT_SUMMARY_WORDS = int(os.getenv("CHAT_SUMMARY_WORDS", "150"))
+CHAT_SUMMARY_MODEL = os.getenv("CHAT_SUMMARY_MODEL", "gpt-4o-mini")
+
 
 def prewarm(proc: JobProcess):
     proc.userdata["vad"] = silero.VAD.load()
 
 
+def _message_text(msg: llm.ChatMessage) -> str:
+    if msg.tool_calls:
+        return " ".join(f"[called {call.function_info.name} with {call.arguments}]" for call in msg.tool_calls)
+    if isinstance(msg.content, str):
+        return msg.content
+    return " ".join(part for part in msg.content or [] if isinstance(part, str))
+
+
+def _chat_window() -> ChatWindow:
+    # A separate LLM instance, so summaries stay out of the agent's turn metrics
+    summary_llm = openai.LLM(model=CHAT_SUMMARY_MODEL)
+
+    async def summarize(prompt: str) -> str:
+        stream = summary_llm.chat(chat_ctx=llm.ChatContext().append(role="user", text=prompt))
+        parts = []
+        try:
+            async for chunk in stream:
+                parts.extend(choice.delta.content for choice in chunk.choices if choice.delta.content)
+        finally:
+            await stream.aclose()
+        return "".join(parts)
+
+    return ChatWindow(summarize, max_turns=CHAT_WINDOW_TURNS, max_tokens=CHAT_WINDOW_MAX_TOKENS,
+                      summary_words=CHAT_SUMMARY_WORDS)
+
+
+def _bound_chat_ctx(window: ChatWindow):
+    """before_llm_cb trimming the copy of the chat context sent for this reply;
+    agent.chat_ctx keeps the full history"""
+
+    def before_llm_cb(agent: VoicePipelineAgent, chat_ctx: llm.ChatContext):
+        plan = window.plan([Entry(msg.id, msg.role, _message_text(msg)) for msg in chat_ctx.messages])
+        keep = set(plan.keep_ids)
+        messages = [msg for msg in chat_ctx.messages if msg.id in keep]
+        if plan.summary:
+            pinned = next((i for i, msg in enumerate(messages) if msg.role != "system"), len(messages))
+            messages.insert(pinned, llm.ChatMessage.create(
+                text=f"Summary of the call so far: {plan.summary}", role="system"))
+        chat_ctx.messages[:] = messages
+        logger.debug(f"prompt ~{plan.prompt_tokens} tokens: {plan.recent_turns} recent turn(s), "
+                     f"{plan.pending_turns} awaiting summary")
+        return None  # the default LLM call, on the trimmed context
+
+    return before_llm_cb
+
+
 async def entrypoint(ctx: JobContext):
     initial_ctx = llm.ChatContext().append(
         role="system",
@@ -50,9 +111,11 @@ async def entrypoint(ctx: JobContext):
     # Other great providers exist like Cerebras, ElevenLabs, Groq, Play.ht, Rime, and more
     # Learn more and pick the best one for your app:
     # https://docs.livekit.io/agents/plugins
+    stt = deepgram.STT()
+    chat_window = _chat_window()
     agent = VoicePipelineAgent(
         vad=ctx.proc.userdata["vad"],
-        stt=deepgram.STT(),
+        stt=stt,
         llm=openai.LLM(model="gpt-4o-mini"),
         tts=cartesia.TTS(),
         # use LiveKit's transformer-based turn detector
@@ -65,14 +128,24 @@ async def entrypoint(ctx: JobContext):
         # included at no additional cost with LiveKit Cloud
         noise_cancellation=noise_cancellation.BVC(),
         chat_ctx=initial_ctx,
+        before_llm_cb=_bound_chat_ctx(chat_window),
     )
 
     usage_collector = metrics.UsageCollector()
+    turn_metrics = TurnMetrics(room=ctx.room.name, stt_provider=provider_name(stt.label))
 
     @agent.on("metrics_collected")
     def on_metrics_collected(agent_metrics: metrics.AgentMetrics):
         metrics.log_metrics(agent_metrics)
         usage_collector.collect(agent_metrics)
+        turn_metrics.collect(agent_metrics)
+
+    async def log_usage():
+        logger.info(f"usage for room {ctx.room.name}: {usage_collector.get_summary()}")
+        await chat_window.aclose()
+        logger.info(f"chat context for room {ctx.room.name}: {chat_window.stats()}")
+
+    ctx.add_shutdown_callback(log_usage)
 
     agent.start(ctx.room, participant)
 
@@ -81,6 +154,8 @@ async def entrypoint(ctx: JobContext):
 
 
 if __name__ == "__main__":
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
     cli.run_app(
         WorkerOptions(
             entrypoint_fnc=entrypoint,
@@ -0,0 +1,138 @@
+"""Per-turn latency histograms for the voice pipeline, in Prometheus format.
+
+Job processes record into prometheus_client's multiprocess store; the worker's
+main process serves the merged view over HTTP (see start_metrics_server).
+"""
+
+import glob
+import logging
+import os
+import tempfile
+import time
+
+# Must be set before prometheus_client is imported: job processes inherit it from
+# the worker, so they all write into the same directory
+if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="voice-agent-metrics-")
+
+from livekit.agents import metrics  # noqa: E402
+from prometheus_client import CollectorRegistry, Histogram, multiprocess, start_http_server  # noqa: E402
+
+logger = logging.getLogger("voice-agent")
+
+# Labelled by provider only: room names are per call, and a label per room would add
+# series without bound to every process's multiprocess file. Rooms go to the log.
+
+# Voice latencies live between ~50ms and a few seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+
+EOU_DELAY = Histogram(
+    "voice_eou_delay_seconds",
+    "End of speech (VAD) to the turn being committed",
+    ["provider"], buckets=LATENCY_BUCKETS,
+)
+STT_LATENCY = Histogram(
+    "voice_stt_latency_seconds",
+    "End of speech to the final transcript",
+    ["provider"], buckets=LATENCY_BUCKETS,
+)
+LLM_TTFT = Histogram(
+    "voice_llm_ttft_seconds",
+    "LLM request to its first token",
+    ["provider"], buckets=LATENCY_BUCKETS,
+)
+TTS_TTFB = Histogram(
+    "voice_tts_ttfb_seconds",
+    "TTS request to its first audio byte",
+    ["provider"], buckets=LATENCY_BUCKETS,
+)
+TURN_LATENCY = Histogram(
+    "voice_turn_latency_seconds",
+    "End of user speech to the first agent audio: EOU delay + LLM TTFT + TTS TTFB",
+    ["provider"], buckets=LATENCY_BUCKETS,
+)
+
+# Prompt sizes, to see voice_common.chat_window hold them flat over a long call
+PROMPT_TOKEN_BUCKETS = (250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 12000, 16000, 32000)
+
+LLM_PROMPT_TOKENS = Histogram(
+    "voice_llm_prompt_tokens",
+    "Prompt tokens of each LLM request, as reported by the provider",
+    ["provider"], buckets=PROMPT_TOKEN_BUCKETS,
+)
+
+# Turns whose stages have not all reported are dropped after this long
+# (interrupted turns never get a TTS metric)
+PENDING_TURN_TTL = 60.0
+
+
+def provider_name(label: str) -> str:
+    """'livekit.plugins.openai.llm.LLM' -> 'openai'"""
+    parts = (label or "").split(".")
+    if len(parts) > 2 and parts[:2] == ["livekit", "plugins"]:
+        return parts[2]
+    return label or "unknown"
+
+
+class TurnMetrics:
+    """Feeds a room's pipeline metrics into the histograms, joining stages by turn."""
+
+    def __init__(self, room: str, stt_provider: str):
+        self.room = room
+        # EOU metrics carry no plugin label; the STT decides when the transcript is final
+        self.stt_provider = stt_provider
+        self._turns: dict[str, dict] = {}
+
+    def collect(self, agent_metrics: metrics.AgentMetrics) -> None:
+        if isinstance(agent_metrics, metrics.PipelineEOUMetrics):
+            self.observe_eou(agent_metrics.sequence_id, agent_metrics.end_of_utterance_delay,
+                             agent_metrics.transcription_delay)
+        elif isinstance(agent_metrics, metrics.PipelineLLMMetrics) and not agent_metrics.error:
+            self.observe_llm(agent_metrics.sequence_id, agent_metrics.label, agent_metrics.ttft,
+                             agent_metrics.prompt_tokens)
+        elif isinstance(agent_metrics, metrics.PipelineTTSMetrics) and not agent_metrics.error:
+            self.observe_tts(agent_metrics.sequence_id, agent_metrics.label, agent_metrics.ttfb)
+
+    def observe_eou(self, sequence_id: str, eou_delay: float, transcription_delay: float) -> None:
+        EOU_DELAY.labels(self.stt_provider).observe(eou_delay)
+        STT_LATENCY.labels(self.stt_provider).observe(transcription_delay)
+        self._stage(sequence_id, "eou", eou_delay, self.stt_provider)
+
+    def observe_llm(self, sequence_id: str, label: str, ttft: float, prompt_tokens: int = 0) -> None:
+        provider = provider_name(label)
+        LLM_TTFT.labels(provider).observe(ttft)
+        if prompt_tokens:
+            LLM_PROMPT_TOKENS.labels(provider).observe(prompt_tokens)
+        self._stage(sequence_id, "llm", ttft, provider)
+
+    def observe_tts(self, sequence_id: str, label: str, ttfb: float) -> None:
+        provider = provider_name(label)
+        TTS_TTFB.labels(provider).observe(ttfb)
+        self._stage(sequence_id, "tts", ttfb, provider)
+
+    def _stage(self, sequence_id: str, stage: str, seconds: float, provider: str) -> None:
+        now = time.monotonic()
+        for stale in [key for key, turn in self._turns.items() if now - turn["started"] > PENDING_TURN_TTL]:
+            del self._turns[stale]
+
+        turn = self._turns.setdefault(sequence_id, {"started": now})
+        # A turn with tool calls makes several LLM and TTS requests; only the first reaches the user first
+        turn.setdefault(stage, (seconds, provider))
+        if all(key in turn for key in ("eou", "llm", "tts")):
+            del self._turns[sequence_id]
+            total = sum(turn[key][0] for key in ("eou", "llm", "tts"))
+            pipeline = "+".join(turn[key][1] for key in ("eou", "llm", "tts"))
+            TURN_LATENCY.labels(pipeline).observe(total)
+            logger.debug(f"turn latency in room {self.room}: {total:.3f}s ({pipeline})")
+
+
+def start_metrics_server(port: int, addr: str = "0.0.0.0") -> None:
+    """Serve /metrics for every job process from the worker's main process"""
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    # Files left by an earlier run would be merged into this one
+    for stale in glob.glob(os.path.join(directory, "*.db")):
+        os.remove(stale)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=directory)
+    start_http_server(port, addr=addr, registry=registry)
+    logger.info(f"serving voice pipeline metrics on http://{addr}:{port}/metrics")
@@ -1,140 +1,363 @@
-from dotenv import load_dotenv
-
-from livekit import agents
-from livekit.agents import AgentSession, Agent, RoomInputOptions
-
-from livekit.plugins import (
-    deepgram,
-    openai,
-    cartesia,
-    silero,
-    turn_detector,
-    noise_cancellation,
-    google,
-    elevenlabs,
-)
-
-# Import the AIService for email functionality
-from .Email import AIService
-import logging # Import logging
-
-load_dotenv()
-
-# Configure basic logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+from livekit import agents, rtc
+from livekit.agents import AgentSession, Agent, ChatContext, ChatMessage, RoomInputOptions, function_tool
+from voice_common.chat_window import ChatWindow, Entry
+
+# The email tool lives in tools.py so Django can import it without loading LiveKit
+from .tools import ai_service_registry, warm_up_ai_service, email_tool_for_caller, send_email_tool_schema
+from .tool_runtime import ToolPolicy, ToolRuntime
+from .speculation import Speculator
+from .tts_cache import TTSAudioCache
+
 logger = logging.getLogger(__name__)
 
+# How long prewarm waits for the AIService (Gemini + Gmail) before letting the process
+# take jobs anyway; the build carries on in the background and the email tool waits for it
+PREWARM_AI_SERVICE_TIMEOUT = float(os.getenv('PREWARM_AI_SERVICE_TIMEOUT', '20'))
 
-# --- Email Tool Definition ---
+# Deadlines and spoken progress for each tool (see tool_runtime.py)
+TOOL_POLICIES = {
+    "send_email": ToolPolicy(
+        timeout=float(os.getenv('EMAIL_TOOL_TIMEOUT', '20')),
+        filler_after=float(os.getenv('TOOL_FILLER_AFTER', '1.5')),
+        fillers=("One moment, sending that now.", "Gmail is being slow, still sending."),
+        # The Gmail request itself cannot be recalled once it is in flight
+        timeout_message="Gmail did not confirm the email in time. It may still go out, "
+                        "so check the Sent folder before sending it again.",
+    ),
+}
 
-# Global AIService instance (lazy initialized)
-ai_service_instance = None
+# Opt-in speculative replies (speculation.py). The realtime model takes raw audio and never
+# sees a transcript, so this mode runs the cascaded Deepgram -> Gemini -> ElevenLabs pipeline
+SPECULATIVE_LLM = os.getenv('SPECULATIVE_LLM', 'false').lower() in ('1', 'true', 'yes')
+SPECULATIVE_LLM_MODEL = os.getenv('SPECULATIVE_LLM_MODEL', 'gemini-2.0-flash')
+# Interim transcript must be unchanged this long (s) before a reply is started
+SPECULATION_STABLE_AFTER = float(os.getenv('SPECULATION_STABLE_AFTER', '0.3'))
+# Word-level similarity the final transcript needs for the speculative reply to be used
+SPECULATION_MATCH_THRESHOLD = float(os.getenv('SPECULATION_MATCH_THRESHOLD', '0.9'))
 
-async def initialize_ai_service():
-    """Initializes the AIService if not already done."""
-    global ai_service_instance
-    if ai_service_instance is None:
-        logger.info("Initializing AIService...")
-        try:
-            # Assuming AIService() handles its own setup (env vars, logging)
-            ai_service_instance = AIService()
-            # If AIService has an async initialization method, call it here:
-            # await ai_service_instance.async_init()
-            logger.info("AIService initialized successfully.")
-        except Exception as e:
-            logger.error(f"Failed to initialize AIService: {e}", exc_info=True)
-            ai_service_instance = None # Ensure it's None if init fails
-    return ai_service_instance
-
-async def send_email_tool(to: str, subject: str, body: str) -> str:
-    """Sends an email to the specified recipient with the given subject and body."""
-    logger.info(f"Attempting to send email via tool to: {to}")
+# Chat context bounds (voice_common/chat_window.py): turns and estimated tokens sent verbatim, the rest summarized.
+# Applies to the text LLM; the realtime model keeps its history server-side and is bounded by
+# Gemini's own sliding window, which kicks in at REALTIME_CONTEXT_TRIGGER_TOKENS
+CHAT_WINDOW_TURNS = int(os.getenv('CHAT_WINDOW_TURNS', '6'))
+CHAT_WINDOW_MAX_TOKENS = int(os.getenv('CHAT_WINDOW_MAX_TOKENS', '2000'))
+CHAT_SUMMARY_WORDS = int(os.getenv('CHAT_SUMMARY_WORDS', '150'))
+REALTIME_CONTEXT_TRIGGER_TOKENS = int(os.getenv('REALTIME_CONTEXT_TRIGGER_TOKENS', '16000'))
+REALTIME_CONTEXT_TARGET_TOKENS = int(os.getenv('REALTIME_CONTEXT_TARGET_TOKENS', '8000'))
+
+# End of the user's turn in the cascaded pipeline, the values assistant-back/agent.py uses: this
+# long (s) after the VAD hears them stop, up to the max when the turn detector thinks they are
+# not done. The realtime model detects turns server-side. bench_voice_replay measures these
+MIN_ENDPOINTING_DELAY = float(os.getenv('MIN_ENDPOINTING_DELAY', '0.5'))
+MAX_ENDPOINTING_DELAY = float(os.getenv('MAX_ENDPOINTING_DELAY', '5.0'))
+
+ELEVENLABS_VOICE_ID = "ODq5zmih8GrVes37Dizd"
+ELEVENLABS_MODEL = "eleven_multilingual_v2"
+
+# Synthesized fillers are kept on disk (tts_cache.py) and replayed instead of re-synthesized;
+# TTS_CACHE_MAX_MB=0 turns the cache off
+TTS_CACHE_DIR = os.getenv('TTS_CACHE_DIR', str(Path(__file__).resolve().parent / 'tts_cache'))
+TTS_CACHE_MAX_MB = float(os.getenv('TTS_CACHE_MAX_MB', '64'))
+# Rendered into the cache when a job starts: every tool filler plus these ('|'-separated)
+TTS_PRERENDER_PHRASES = [phrase.strip() for phrase in os.getenv('TTS_PRERENDER_PHRASES', '').split('|') if phrase.strip()]
+
+
+def _load_plugins():
+    """Import only the LiveKit plugins this agent uses.
+
+    Plugins register themselves on import and must be imported on the main
+    thread, so this runs at worker start-up and in the job process instead of
+    whenever something imports this module.
+    """
+    from livekit.plugins import deepgram, elevenlabs, google, noise_cancellation
+    return deepgram, elevenlabs, google, noise_cancellation
+
+
+def _open_tts_cache() -> Optional[TTSAudioCache]:
+    if TTS_CACHE_MAX_MB <= 0:
+        return None
     try:
-        service = await initialize_ai_service()
-        if not service or not service.gmail_service:
-             logger.error("AIService or Gmail service not initialized during email sending attempt.")
-             return "Error: Email service is not available or not initialized properly."
-
-        logger.info(f"Calling AIService.send_email_via_assistant for {to}")
-        result = await service.send_email_via_assistant(to=to, subject=subject, body=body)
-        logger.info(f"AIService.send_email_via_assistant result: {result}")
-
-        if result.get("status") == "success":
-            logger.info(f"Email successfully sent to {to}")
-            return f"Email successfully sent to {to} with subject '{subject}'."
-        else:
-            error_message = result.get('message', 'Unknown error sending email.')
-            logger.error(f"Failed to send email via AIService: {error_message}")
-            return f"Failed to send email: {error_message}"
-    except Exception as e:
-        logger.error(f"Exception in send_email_tool: {e}", exc_info=True)
-        return f"An unexpected error occurred while trying to send the email: {e}"
-
-# Schema describing the tool for the LLM
-send_email_tool_schema = {
-    "name": "send_email",
-    "description": "Sends an email to a recipient using the user's configured Gmail account.",
-    "parameters": {
-        "type": "object",
-        "properties": {
-            "to": {"type": "string", "description": "The recipient's email address."},
-            "subject": {"type": "string", "description": "The subject line of the email."},
-            "body": {"type": "string", "description": "The main content/body of the email."},
-        },
-        "required": ["to", "subject", "body"],
-    },
-}
+        return TTSAudioCache(TTS_CACHE_DIR, max_bytes=int(TTS_CACHE_MAX_MB * 1024 * 1024))
+    except OSError as e:
+        logger.warning(f"TTS cache disabled, cannot use {TTS_CACHE_DIR}: {e}")
+        return None
+
+
+def prewarm(proc: agents.JobProcess):
+    """Runs once in each job process before it is given a job, so none of this
+    lands on a caller's first turn: plugin imports (seconds), the AIService with
+    its Gemini models and Gmail client for the default account, the TTS cache index."""
+    started = time.perf_counter()
+    ai_service_registry.start()  # builds on a background thread while the plugins import
+    proc.userdata["plugins"] = _load_plugins()
+    proc.userdata["tts_cache"] = _open_tts_cache()
+    plugins_s = time.perf_counter() - started
+
+    service = ai_service_registry.get_sync(timeout=PREWARM_AI_SERVICE_TIMEOUT)
+    if service is not None:
+        proc.userdata["ai_service"] = service
+    proc.userdata["prewarm_s"] = time.perf_counter() - started
+    logger.info(f"Prewarmed job process {proc.pid} in {proc.userdata['prewarm_s']:.2f}s "
+                f"(plugins {plugins_s:.2f}s, AIService {ai_service_registry.status()['state']})")
+
+
+def _build_models(plugins):
+    """LLM, TTS and STT for a session"""
+    deepgram, elevenlabs, google, _ = plugins
+    if SPECULATIVE_LLM:
+        llm = google.LLM(model=SPECULATIVE_LLM_MODEL, temperature=0.8)
+    else:
+        from google.genai import types
+        llm = google.beta.realtime.RealtimeModel(
+            model="gemini-2.0-flash-exp",
+            voice="Puck",
+            temperature=0.8,
+            context_window_compression=types.ContextWindowCompressionConfig(
+                trigger_tokens=REALTIME_CONTEXT_TRIGGER_TOKENS,
+                sliding_window=types.SlidingWindow(target_tokens=REALTIME_CONTEXT_TARGET_TOKENS),
+            ),
+            instructions="You are a helpful voice AI assistant. You can chat, answer questions, and send emails on the user's behalf using their Gmail account. If asked to send an email, use the 'send_email' tool provided. Extract the recipient, subject, and body before calling the tool. Confirm the action after the tool is called.",
+        )
+    tts = elevenlabs.TTS(
+        voice_id=ELEVENLABS_VOICE_ID,
+        model=ELEVENLABS_MODEL
+    )
+    stt = deepgram.STT(
+        model="nova-2-general",
+        interim_results=True,
+        smart_format=True,
+        punctuate=True,
+        filler_words=True,
+        profanity_filter=False,
+        keywords=[("LiveKit", 1.5)],
+        language="en-US",
+    )
+    return llm, tts, stt
+
+
+def turn_handling(min_delay: float = MIN_ENDPOINTING_DELAY, max_delay: float = MAX_ENDPOINTING_DELAY,
+                  turn_detection=None) -> dict:
+    """AgentSession turn handling; the replay harness (voice_replay.py) builds its session with this too"""
+    options = {"endpointing": {"min_delay": min_delay, "max_delay": max_delay}}
+    if turn_detection is not None:
+        options["turn_detection"] = turn_detection
+    return options
+
+
+def _email_function_tool(send_email, runtime: ToolRuntime):
+    """Expose send_email to the LLM with the JSON schema from tools.py, run under the tool runtime"""
+    async def send_email_raw(raw_arguments: dict) -> str:
+        return await runtime.run("send_email", send_email, to=raw_arguments.get("to", ""),
+                                 subject=raw_arguments.get("subject", ""), body=raw_arguments.get("body", ""))
+    return function_tool(send_email_raw, raw_schema=send_email_tool_schema)
+
+
+async def _cached_frames(clip):
+    """Audio frames straight from a memory-mapped cached clip"""
+    try:
+        for chunk in clip.chunks():
+            yield rtc.AudioFrame(chunk, clip.sample_rate, clip.num_channels, len(chunk) // (2 * clip.num_channels))
+    finally:
+        clip.close()
+
 
+async def _synthesized_frames(tts, cache: TTSAudioCache, text: str):
+    """Synthesize `text`, passing the frames on as they arrive; the clip is cached once it is complete"""
+    pcm = bytearray()
+    num_channels = tts.num_channels
+    async with tts.synthesize(text) as stream:
+        async for audio in stream:
+            pcm += audio.frame.data
+            num_channels = audio.frame.num_channels
+            yield audio.frame
+    await asyncio.to_thread(cache.put, text, ELEVENLABS_VOICE_ID, ELEVENLABS_MODEL, tts.sample_rate,
+                            num_channels, pcm)
 
 
+def say_cached(session: AgentSession, tts, cache: Optional[TTSAudioCache], text: str):
+    """session.say() for fixed phrases (kept out of the chat context), played from the TTS cache when possible"""
+    if cache is None:
+        return session.say(text, add_to_chat_ctx=False)
+    clip = cache.get(text, ELEVENLABS_VOICE_ID, ELEVENLABS_MODEL, tts.sample_rate)
+    audio = _cached_frames(clip) if clip is not None else _synthesized_frames(tts, cache, text)
+    return session.say(text, audio=audio, add_to_chat_ctx=False)
+
+
+async def _prerender(tts, cache: TTSAudioCache, phrases) -> None:
+    missing = cache.missing(phrases, ELEVENLABS_VOICE_ID, ELEVENLABS_MODEL, tts.sample_rate)
+    for text in missing:
+        try:
+            async for _ in _synthesized_frames(tts, cache, text):
+                pass
+        except Exception as e:  # the phrase is synthesized live instead
+            logger.warning(f"Could not prerender {text!r}: {e}")
+    if missing:
+        logger.info(f"Prerendered {len(missing)} phrase(s) into the TTS cache: {cache.stats()}")
+
 
 #  there should be a function that will analyse the prompt, if its an email, it would call the email function from "email.py"
 class Assistant(Agent):
     def __init__(self) -> None:
         # Updated instructions to mention the email capability
         super().__init__(instructions="You are a helpful voice AI assistant. You can chat, answer questions, and send emails on the user's behalf using their Gmail account. If asked to send an email, use the 'send_email' tool.")
+        # Set by entrypoint when SPECULATIVE_LLM is on
+        self.speculator: Optional[Speculator] = None
+        self.chat_window: Optional[ChatWindow] = None
+
+    async def llm_node(self, chat_ctx, tools, model_settings):
+        # Only reached with a text LLM (SPECULATIVE_LLM); the realtime model bypasses llm_node
+        if self.chat_window is not None:
+            chat_ctx = _windowed(chat_ctx, self.chat_window)
+        if self.speculator is not None:
+            stream = self.speculator.take(_last_user_text(chat_ctx))
+            if stream is not None:
+                async for chunk in stream:
+                    yield chunk
+                return
+        async for chunk in Agent.default.llm_node(self, chat_ctx, tools, model_settings):
+            yield chunk
+
+
+def _last_user_text(chat_ctx) -> str:
+    for item in reversed(chat_ctx.items):
+        if getattr(item, "role", None) == "user":
+            return item.text_content or ""
+    return ""
+
+
+def _entry(item) -> Entry:
+    if item.type == "message":
+        return Entry(item.id, item.role, item.text_content or "")
+    if item.type == "function_call":
+        return Entry(item.id, "assistant", f"[called {item.name} with {item.arguments}]")
+    if item.type == "function_call_output":
+        return Entry(item.id, "tool", item.output)
+    return Entry(item.id, "assistant", "")
+
+
+def _windowed(chat_ctx: ChatContext, window: ChatWindow) -> ChatContext:
+    """A copy of `chat_ctx` holding the instructions, the summary and the turns the window keeps"""
+    plan = window.plan([_entry(item) for item in chat_ctx.items])
+    keep = set(plan.keep_ids)
+    items = [item for item in chat_ctx.items if item.id in keep]
+    if plan.summary:
+        pinned = next((i for i, item in enumerate(items) if getattr(item, "role", None) not in ("system", "developer")),
+                      len(items))
+        items.insert(pinned, ChatMessage(role="system", content=[f"Summary of the call so far: {plan.summary}"]))
+    logger.debug(f"Prompt ~{plan.prompt_tokens} tokens: {plan.recent_turns} recent turn(s), "
+                 f"{plan.pending_turns} awaiting summary, summary={'yes' if plan.summary else 'no'}")
+    return ChatContext(items)
+
+
+def _chat_window_for(llm) -> ChatWindow:
+    """Summaries come from the session's own text LLM, outside the conversation"""
+    async def summarize(prompt):
+        chat_ctx = ChatContext.empty()
+        chat_ctx.add_message(role="user", content=prompt)
+        parts = []
+        async with llm.chat(chat_ctx=chat_ctx) as stream:
+            async for chunk in stream:
+                if chunk.delta and chunk.delta.content:
+                    parts.append(chunk.delta.content)
+        return "".join(parts)
+
+    return ChatWindow(summarize, max_turns=CHAT_WINDOW_TURNS, max_tokens=CHAT_WINDOW_MAX_TOKENS,
+                      summary_words=CHAT_SUMMARY_WORDS)
+
+
+def _speculator_for(agent: Agent, llm, tools) -> Speculator:
+    """Speculative replies generated with the agent's current context plus the interim user text"""
+    async def start_stream(text):
+        chat_ctx = agent.chat_ctx.copy()
+        chat_ctx.add_message(role="user", content=text)
+        if agent.chat_window is not None:
+            chat_ctx = _windowed(chat_ctx, agent.chat_window)
+        async with llm.chat(chat_ctx=chat_ctx, tools=tools) as stream:
+            async for chunk in stream:
+                yield chunk
+
+    def chunk_accounting(chunk):
+        chars = len(chunk.delta.content or "") if chunk.delta else 0
+        return chars, chunk.usage.completion_tokens if chunk.usage else None
+
+    return Speculator(start_stream, chunk_accounting, stable_after=SPECULATION_STABLE_AFTER,
+                      match_threshold=SPECULATION_MATCH_THRESHOLD)
 
 
 async def entrypoint(ctx: agents.JobContext):
-    # Ensure the AI service is initialized before starting the session potentially
-    # Although lazy initialization in the tool function might be sufficient
-    # await initialize_ai_service() # Optional: pre-initialize
+    job_started = time.perf_counter()
+    # Both done by prewarm() unless this process skipped it; the email tool waits on the same AIService build
+    warm_up_ai_service()
+    plugins = ctx.proc.userdata.get("plugins") or _load_plugins()
+    noise_cancellation = plugins[3]
+
+    llm, tts, stt = _build_models(plugins)
+    # Open the provider connections while the room connects and the caller joins,
+    # instead of on the first turn (needs the job's HTTP context, so not in prewarm)
+    tts.prewarm()
+    stt.prewarm()
+    tts_cache = ctx.proc.userdata["tts_cache"] if "tts_cache" in ctx.proc.userdata else _open_tts_cache()
+    if tts_cache is not None:
+        # Usually a no-op after the first job on this machine; rendered over the connection
+        # just opened, while the room connects (prewarm has no HTTP context for the provider)
+        phrases = [filler for policy in TOOL_POLICIES.values() for filler in policy.fillers] + TTS_PRERENDER_PHRASES
+        prerender = asyncio.create_task(_prerender(tts, tts_cache, phrases), name="tts-prerender")
+
+        async def stop_prerender():
+            prerender.cancel()
+            await asyncio.gather(prerender, return_exceptions=True)
+        ctx.add_shutdown_callback(stop_prerender)
 
     await ctx.connect()
+    # Emails go out from the caller's own Gmail account (see generate_livekit_token)
+    participant = await ctx.wait_for_participant()
+    send_email = email_tool_for_caller(participant.metadata)
+    caller_joined = time.perf_counter()
+    tool_runtime = ToolRuntime(TOOL_POLICIES)
+
+    # Tools go to the session (RealtimeModel takes no tools argument); the schema is
+    # tools.send_email_tool_schema and the call runs the caller's send_email
+    tools = [_email_function_tool(send_email, tool_runtime)]
 
     # Updated AgentSession to include the email tool
     session = AgentSession(
-        llm=google.beta.realtime.RealtimeModel(
-            model="gemini-2.0-flash-exp",
-            voice="Puck",
-            temperature=0.8,
-            # Pass the tool schema to the LLM
-            # Note: The exact parameter name ('tools') might vary based on the specific LLM provider implementation in livekit-plugins
-            tools=[send_email_tool_schema],
-            instructions="You are a helpful voice AI assistant. You can chat, answer questions, and send emails on the user's behalf using their Gmail account. If asked to send an email, use the 'send_email' tool provided. Extract the recipient, subject, and body before calling the tool. Confirm the action after the tool is called.",
-        ),
-        tts=elevenlabs.TTS(
-            voice_id="ODq5zmih8GrVes37Dizd",
-            model="eleven_multilingual_v2"
-        ),
-        stt = deepgram.STT(
-            model="nova-2-general",
-            interim_results=True,
-            smart_format=True,
-            punctuate=True,
-            filler_words=True,
-            profanity_filter=False,
-            keywords=[("LiveKit", 1.5)],
-            language="en-US",
-        ),
-        # Map the tool name to the actual function to execute
-        # Note: The exact parameter name ('tools') might vary based on the AgentSession API
-        tools={"send_email": send_email_tool}
+        llm=llm,
+        tts=tts,
+        stt=stt,
+        tools=tools,
+        turn_handling=turn_handling(),
     )
+    # Fillers are spoken with the session's TTS, from the cache once rendered, and kept out of the chat context
+    tool_runtime.speak = lambda text: say_cached(session, tts, tts_cache, text)
+    ctx.add_shutdown_callback(tool_runtime.aclose)
+
+    assistant = Assistant()
+    if SPECULATIVE_LLM:
+        assistant.chat_window = chat_window = _chat_window_for(llm)
+
+        async def log_chat_window():
+            await chat_window.aclose()
+            logger.info(f"Chat context in room {ctx.room.name}: {chat_window.stats()}")
+        ctx.add_shutdown_callback(log_chat_window)
+
+        assistant.speculator = speculator = _speculator_for(assistant, llm, tools)
+        session.on("user_input_transcribed",
+                   lambda ev: speculator.on_transcript(ev.transcript, ev.is_final))
+
+        async def log_speculation():
+            await speculator.aclose()
+            logger.info(f"Speculation in room {ctx.room.name}: {speculator.stats.to_dict()}")
+        ctx.add_shutdown_callback(log_speculation)
 
     await session.start(
         room=ctx.room,
-        agent=Assistant(),
+        agent=assistant,
         room_input_options=RoomInputOptions(
             noise_cancellation=noise_cancellation.BVC(),
         ),
@@ -144,11 +367,17 @@ async def entrypoint(ctx: agents.JobContext):
     await session.generate_reply(
         instructions="Greet the user and offer your assistance. Mention you can help with tasks like sending emails."
     )
+    # First-turn latency: from the caller joining until the greeting has played out
+    logger.info(f"First turn in room {ctx.room.name} took {time.perf_counter() - caller_joined:.2f}s "
+                f"after the caller joined ({caller_joined - job_started:.2f}s job setup before that, "
+                f"prewarmed={'prewarm_s' in ctx.proc.userdata})")
 
 
 if __name__ == "__main__":
-    # Consider initializing the service once here if needed globally,
-    # but the lazy init in the tool should handle it per-call.
-    # import asyncio
-    # asyncio.run(initialize_ai_service())
-    agents.cli.run_app(agents.WorkerOptions(entrypoint_fnc=entrypoint))
\ No newline at end of file
+    _load_plugins()  # registered up front so `download-files` sees them
+    agents.cli.run_app(agents.WorkerOptions(
+        entrypoint_fnc=entrypoint,
+        prewarm_fnc=prewarm,
+        # Plugin imports plus the AIService build take longer than the 10s default
+        initialize_process_timeout=PREWARM_AI_SERVICE_TIMEOUT + 30,
+    ))
\ No newline at end of file
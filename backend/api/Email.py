@@ -4,28 +4,47 @@ import json
 import base64
 import pickle
 import logging.config
+import logging.handlers
 import re
-from typing import Dict, Any, List, Optional, Tuple, Union
-from datetime import datetime
+import asyncio
+import atexit
+import queue
+import math
+import time
+from collections import deque, Counter
+from typing import Dict, Any, List, Optional, Tuple, Union, Callable, AsyncIterator
 from pathlib import Path
 from email.mime.text import MIMEText
-from functools import lru_cache
-from dataclasses import dataclass
+from functools import partial
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
 
-# Third-party imports
-import pytz
-import openai
-import google.generativeai as genai
+# Third-party imports. Provider SDKs (Gemini, LangChain/OpenAI, the Google API
+# client) take seconds to import, so they are imported inside the methods that
+# use them; importing this module (and therefore the Django views) stays cheap.
 from dotenv import load_dotenv
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient import errors as google_errors
-from langchain_openai import OpenAI
-from langchain.memory import ConversationBufferWindowMemory
 from tenacity import retry, stop_after_attempt, wait_exponential
 
+from .gmail_pool import DEFAULT_ACCOUNT, GmailClient, GmailClientPool, UnknownAccountError
+from .mime_stream import Attachment, MessageStream, build_message_stream
+from .response_cache import ResponseCache
+from .timezones import get_timezone_index
+
+# Gmail rejects HTTP batch requests with more than 100 calls
+GMAIL_BATCH_LIMIT = 100
+
+def _env(name: str, default: Optional[str], cast: Callable[[str], Any] = str):
+    """A field read from the environment when the config is created, i.e. after load_dotenv"""
+    def read():
+        value = os.getenv(name, default)
+        return None if value is None else cast(value)
+    return field(default_factory=read)
+
+
+def _flag(value: str) -> bool:
+    return value.lower() in ("1", "true", "yes")
+
+
 # Configuration
 @dataclass
 class ServiceConfig:
@@ -34,7 +53,34 @@ class ServiceConfig:
     LOG_LEVEL: str = "INFO"
     MAX_RETRIES: int = 3
     CACHE_TTL: int = 3600
+    # generate_text response cache: in-memory LRU bound, plus an optional SQLite file that survives restarts
+    CACHE_ENABLED: bool = _env("AI_CACHE_ENABLED", "true", _flag)
+    CACHE_MAX_ENTRIES: int = 1024
+    CACHE_DISK_PATH: Optional[str] = _env("AI_CACHE_PATH", None)
     MAX_CONTENT_LENGTH: int = 1000
+    # Threads used for blocking SDK calls (Gmail/httplib2) so they never run on the event loop
+    EXECUTOR_MAX_WORKERS: int = _env("AI_SERVICE_MAX_WORKERS", "8", int)
+    # Bulk sends: messages per Gmail batch request (Google recommends <= 50) and batches in flight
+    GMAIL_BATCH_SIZE: int = 50
+    MAX_CONCURRENT_BATCHES: int = 4
+    # generate_text strategy: "fallback" (Gemini, then OpenAI on failure), "hedge" (fire
+    # OpenAI if Gemini has not answered after HEDGE_DELAY seconds) or "race" (both at once)
+    LLM_MODE: str = _env("LLM_MODE", "fallback")
+    HEDGE_DELAY: float = _env("LLM_HEDGE_DELAY", "1.5", float)
+    # Per-provider deadlines in seconds
+    GEMINI_TIMEOUT: float = 30.0
+    OPENAI_TIMEOUT: float = 30.0
+    # Refresh the Gmail token this many seconds before it expires
+    TOKEN_REFRESH_MARGIN: float = _env("GMAIL_TOKEN_REFRESH_MARGIN", "600", float)
+    # Gmail client pool: clients for accounts other than the default are dropped after
+    # GMAIL_IDLE_TIMEOUT seconds without use, and at most GMAIL_MAX_CLIENTS are kept
+    GMAIL_IDLE_TIMEOUT: float = _env("GMAIL_IDLE_TIMEOUT", "900", float)
+    GMAIL_MAX_CLIENTS: int = _env("GMAIL_MAX_CLIENTS", "64", int)
+    # Emails with attachments go through Gmail's resumable upload in chunks of this many
+    # bytes (a multiple of 256KB), which bounds the memory a send takes. Gmail refuses
+    # uploaded messages over 35MB, attachments base64-encoded included
+    UPLOAD_CHUNK_SIZE: int = _env("GMAIL_UPLOAD_CHUNK_KB", "4096", lambda kb: int(kb) * 1024)
+    MAX_MESSAGE_BYTES: int = 35 * 1024 * 1024
 
     def __post_init__(self):
         self.SCOPES = [
@@ -45,22 +91,69 @@ class ServiceConfig:
             'https://www.googleapis.com/auth/calendar.events',
         ]
 
+@dataclass
+class LatencyStats:
+    """Rolling window of latency samples (seconds) for a metric such as time-to-first-token"""
+    samples: deque = field(default_factory=lambda: deque(maxlen=1000))
+    count: int = 0
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self.count += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        ordered = sorted(self.samples)
+
+        def pct(p: float) -> float:
+            if not ordered:
+                return 0.0
+            return round(ordered[max(1, math.ceil(p / 100 * len(ordered))) - 1] * 1000, 1)
+
+        return {"count": self.count, "p50_ms": pct(50), "p95_ms": pct(95), "max_ms": pct(100)}
+
 class PathConfig:
     """Path configuration"""
     BASE_DIR = Path(__file__).parent
     CREDENTIALS_PATH = BASE_DIR / './credentials.json'  
     TOKEN_PATH = BASE_DIR / './token.json'
+    # One <account>.json token per additional Gmail account
+    TOKENS_DIR = BASE_DIR / 'tokens'
     LOG_CONFIG_PATH = BASE_DIR / 'logging.json'
     LOG_FILE = BASE_DIR / 'app.log'
     JSON_LOG_FILE = BASE_DIR / 'applog.json'
 
+class _TimestampCache:
+    """strftime once per second per formatter; the milliseconds are appended per record"""
+
+    def __init__(self, datefmt: str):
+        self.datefmt = datefmt
+        # (second, text) swapped as one object so threads never see a mismatched pair
+        self._cached = (None, "")
+
+    def format(self, created: float) -> str:
+        second = int(created)
+        cached_second, text = self._cached
+        if second != cached_second:
+            text = time.strftime(self.datefmt, time.localtime(second))
+            self._cached = (second, text)
+        return f"{text},{int((created - second) * 1000):03d}"
+
+
 # Custom JSON formatter for the app.json file
 class JsonFormatter(logging.Formatter):
     """Formatter that outputs JSON strings after parsing the log record."""
+
+    # One encoder for every record: json.dumps builds a new one when given options
+    _encoder = json.JSONEncoder(separators=(',', ':'))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._timestamps = _TimestampCache('%Y-%m-%d %H:%M:%S')
+
     def format(self, record):
         """Format log record as JSON"""
         log_data = {
-            "timestamp": datetime.fromtimestamp(record.created).strftime('%Y-%m-%d %H:%M:%S,%f')[:-3],
+            "timestamp": self._timestamps.format(record.created),
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
@@ -73,7 +166,7 @@ class JsonFormatter(logging.Formatter):
         if record.exc_info:
             log_data["exception"] = self.formatException(record.exc_info)
             
-        return json.dumps(log_data)
+        return self._encoder.encode(log_data)
 
 # Tabular formatter for the app.log file
 class TabularFormatter(logging.Formatter):
@@ -82,6 +175,11 @@ class TabularFormatter(logging.Formatter):
         # Define format with fixed column widths
         fmt = "%(asctime)s | %(levelname)-8s | %(name)-20s | %(message)s"
         super().__init__(fmt=fmt, datefmt='%Y-%m-%d %H:%M:%S')
+        self._timestamps = _TimestampCache(self.datefmt)
+
+    def formatTime(self, record, datefmt=None):
+        """Cached per second; the column shows whole seconds"""
+        return self._timestamps.format(record.created)[:-4]
     
     def formatException(self, exc_info):
         """Format exception information as indented text."""
@@ -96,11 +194,46 @@ class TabularFormatter(logging.Formatter):
             formatted += '\n    ----------------------------------------'
         return formatted
 
+
+class _LogQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler for an in-process listener: resolves the message on the caller's
+    thread (args may change later) but leaves formatting, including exceptions, to
+    the listener thread. The stdlib version formats everything up front."""
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+# Background thread that runs the real handlers when logging through a queue
+_log_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread (registered with atexit)"""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+
 # Enhanced logging configuration
-def setup_logging() -> None:
-    """Configure logging with both JSON and tabular formats."""
+def setup_logging(use_queue: Optional[bool] = None, log_dir: Optional[Path] = None) -> None:
+    """Configure logging with both JSON and tabular formats.
+
+    With `use_queue` (default: env LOG_QUEUE, on) the root logger only gets a
+    QueueHandler; the console and file handlers run on a QueueListener thread, so
+    logging from the event loop costs a queue put instead of formatting and file writes.
+    """
+    if use_queue is None:
+        use_queue = os.getenv("LOG_QUEUE", "true").lower() in ("1", "true", "yes")
+    log_file = Path(log_dir) / PathConfig.LOG_FILE.name if log_dir else PathConfig.LOG_FILE
+    json_log_file = Path(log_dir) / PathConfig.JSON_LOG_FILE.name if log_dir else PathConfig.JSON_LOG_FILE
+    stop_logging()
+
     # Create necessary directories
-    Path(PathConfig.LOG_FILE).parent.mkdir(exist_ok=True)
+    Path(log_file).parent.mkdir(exist_ok=True)
     
     # Configure logging
     logging.config.dictConfig({
@@ -124,7 +257,7 @@ def setup_logging() -> None:
                 'level': 'INFO',
                 'formatter': 'tabular',
                 'class': 'logging.handlers.RotatingFileHandler',
-                'filename': str(PathConfig.LOG_FILE),
+                'filename': str(log_file),
                 'maxBytes': 10485760,  # 10MB
                 'backupCount': 5,
                 'encoding': 'utf8',
@@ -133,7 +266,7 @@ def setup_logging() -> None:
                 'level': 'INFO',
                 'formatter': 'json',
                 'class': 'logging.handlers.RotatingFileHandler',
-                'filename': str(PathConfig.JSON_LOG_FILE),
+                'filename': str(json_log_file),
                 'maxBytes': 10485760,  # 10MB
                 'backupCount': 5,
                 'encoding': 'utf8',
@@ -147,9 +280,23 @@ def setup_logging() -> None:
             }
         }
     })
+
+    if use_queue:
+        global _log_listener
+        root = logging.getLogger()
+        handlers = list(root.handlers)
+        log_queue = queue.SimpleQueue()
+        for handler in handlers:
+            root.removeHandler(handler)
+        root.addHandler(_LogQueueHandler(log_queue))
+        _log_listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _log_listener.start()
     
     logger = logging.getLogger(__name__)
-    logger.info("Logging system initialized with tabular and JSON formats")
+    logger.info(f"Logging system initialized with tabular and JSON formats{' (queued)' if use_queue else ''}")
+
+
+atexit.register(stop_logging)
 
 logger = logging.getLogger(__name__)
 
@@ -157,11 +304,42 @@ class AIService:
     """Main service class for AI operations"""
     
     def __init__(self, config: ServiceConfig = None):
-        self.config = config or ServiceConfig()
         self._setup_environment()
+        # Built after _setup_environment has loaded .env, which the defaults read
+        self.config = config or ServiceConfig()
         self.gmail_service = None
         self.openai_llm = None
         self.gemini_model = None
+        self._gmail_credentials = None
+        self.credential_manager = None
+        # Gmail clients per account. Each keeps its token in memory and refreshes it
+        # before expiry, off the send path; gmail_service is the default account's client
+        self.gmail_pool = GmailClientPool(
+            default_token_path=PathConfig.TOKEN_PATH,
+            tokens_dir=PathConfig.TOKENS_DIR,
+            client_secrets_path=PathConfig.CREDENTIALS_PATH,
+            scopes=self.config.SCOPES,
+            idle_timeout=self.config.GMAIL_IDLE_TIMEOUT,
+            max_clients=self.config.GMAIL_MAX_CLIENTS,
+            refresh_margin=self.config.TOKEN_REFRESH_MARGIN,
+        )
+        # Bounded pool for blocking calls; httplib2 is not thread-safe, so each
+        # worker thread gets its own authorized Http object (see GmailClient.http)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.config.EXECUTOR_MAX_WORKERS,
+            thread_name_prefix="aiservice",
+        )
+        # Time-to-first-token per provider for generate_text_stream
+        self.ttft_stats: Dict[str, LatencyStats] = {"gemini": LatencyStats(), "openai": LatencyStats()}
+        # Outcome counters for generate_text: wins/losses/cancellations/errors/timeouts per provider
+        self.llm_stats: Dict[str, Counter] = {"gemini": Counter(), "openai": Counter(), "hedge": Counter()}
+        self.response_cache = ResponseCache(
+            ttl=self.config.CACHE_TTL,
+            max_entries=self.config.CACHE_MAX_ENTRIES,
+            disk_path=self.config.CACHE_DISK_PATH,
+        ) if self.config.CACHE_ENABLED else None
+        # Built once per process; lookups after this are dictionary hits
+        self.timezone_index = get_timezone_index()
         self._initialize_services()
 
     def _setup_environment(self) -> None:
@@ -181,6 +359,7 @@ class AIService:
     def _initialize_ai_models(self) -> None:
         """Initialize AI models with Gemini first, fallback to OpenAI"""
         try:
+            import google.generativeai as genai
             # Try Gemini first - Use a potentially more stable model name
             genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
             self.gemini_model = genai.GenerativeModel('gemini-1.5-pro') # Changed model name
@@ -189,6 +368,7 @@ class AIService:
             logger.warning(f"Failed to initialize Gemini: {e}, falling back to OpenAI")
             self.gemini_model = None # Ensure it's None if init fails
             try:
+                from langchain_openai import OpenAI
                 self.openai_llm = OpenAI(temperature=0.7, openai_api_key=os.getenv("OPENAI_API_KEY"))
                 logger.info("Initialized OpenAI model successfully")
             except Exception as e:
@@ -200,55 +380,18 @@ class AIService:
         logger.info("Initializing Gmail service...")  # Added log
         try:
             logger.info("Getting Gmail credentials...")  # Added log
-            creds = self._get_gmail_credentials()
+            # The default account may run the consent flow on first start
+            client = self.gmail_pool.acquire(DEFAULT_ACCOUNT, interactive=True)
             logger.info("Gmail credentials obtained.")  # Added log
-            self.gmail_service = build('gmail', 'v1', credentials=creds)
+            self.credential_manager = client.credential_manager
+            self._gmail_credentials = client.credentials
+            self.gmail_service = client.service
             logger.info("Initialized Gmail service successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Gmail service: {e}")
             self.gmail_service = None
         logger.info(f"Gmail service initialized: {self.gmail_service is not None}") # Added log to check if service is initialized
 
-    def _get_gmail_credentials(self) -> Credentials:
-        """Get Gmail credentials with proper token management"""
-        creds = None
-        logger.info(f"Checking if token file exists at: {PathConfig.TOKEN_PATH}") # Log token path
-        if PathConfig.TOKEN_PATH.exists():
-            logger.info("Token file exists. Attempting to load credentials from token file.") # Log if token file exists
-            try:
-                with open(PathConfig.TOKEN_PATH, 'r', encoding='utf-8') as token:
-                    token_data = json.load(token)
-                    creds = Credentials.from_authorized_user_info(token_data, self.config.SCOPES)
-            except (UnicodeDecodeError, json.JSONDecodeError) as e:
-                logger.warning(f"Error reading token file: {e}")
-                # Delete corrupted token file
-                PathConfig.TOKEN_PATH.unlink(missing_ok=True)
-        else:
-            logger.info("Token file does not exist.") # Log if token file doesn't exist
-
-        if not creds or not creds.valid:
-            logger.info("Credentials not found or invalid. Attempting to refresh or obtain new credentials.") # Log if creds are invalid or not found
-            if creds and creds.expired and creds.refresh_token:
-                logger.info("Credentials expired and refresh token exists. Refreshing credentials.") # Log if refreshing credentials
-                creds.refresh(Request())
-                logger.info("Credentials refreshed.") # Log if credentials refreshed
-            else:
-                logger.info("No valid credentials or refresh token. Running installed app flow to obtain new credentials.") # Log if obtaining new credentials
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    str(PathConfig.CREDENTIALS_PATH),
-                    self.config.SCOPES
-                )
-                creds = flow.run_local_server(port=0)
-                logger.info("New credentials obtained.") # Log if new credentials obtained
-            
-            with open(PathConfig.TOKEN_PATH, 'w', encoding='utf-8') as token:
-                token.write(creds.to_json())
-                logger.info("Credentials saved to token file.") # Log if credentials saved to token file
-        else:
-            logger.info("Valid credentials found.") # Log if valid credentials found
-
-        return creds
-
     async def get_current_time(self, location: str) -> Dict[str, Any]:
         """Get current time for a location with error handling"""
         try:
@@ -268,48 +411,122 @@ class AIService:
         message['subject'] = subject
         return {'raw': base64.urlsafe_b64encode(message.as_bytes()).decode()}
 
-    async def _send_email_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
+    def _create_email_upload(self, to: str, subject: str, body: str,
+                             attachments: List[Union[Attachment, str, Path]]) -> MessageStream:
+        """The message with its attachments as a stream for _send_email_upload; paths are read from disk"""
+        attachments = [a if isinstance(a, Attachment) else Attachment.from_path(str(a)) for a in attachments]
+        message = build_message_stream(to, subject, body if body is not None else "", attachments)
+        if message.size > self.config.MAX_MESSAGE_BYTES:
+            message.close()
+            raise ValueError(f"Email is {message.size / 1024 / 1024:.1f}MB with its attachments encoded, "
+                             f"over the {self.config.MAX_MESSAGE_BYTES / 1024 / 1024:.0f}MB limit")
+        return message
+
+    async def _run_blocking(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking SDK call on the service executor without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def get_gmail_client(self, account: Optional[str] = None) -> GmailClient:
+        """Pooled Gmail client for `account` (default account when None).
+
+        Raises UnknownAccountError if the account has no token, ValueError if the name is invalid.
+        """
+        client = self.gmail_pool.get(account)
+        if client is None:
+            # First use of this account in this process: reads (and may refresh) its token
+            client = await self._run_blocking(self.gmail_pool.acquire, account)
+        return client
+
+    async def _send_email_message(self, message: Dict[str, Any], account: Optional[str] = None) -> Dict[str, Any]:
         """Send email message using Gmail API"""
-        return self.gmail_service.users().messages().send(userId='me', body=message).execute()
+        client = await self.get_gmail_client(account)
+        request = client.service.users().messages().send(userId='me', body=message)
+        return await self._run_blocking(client.execute, request)
+
+    async def _send_email_upload(self, message: MessageStream, account: Optional[str] = None) -> Dict[str, Any]:
+        """Send a message through Gmail's resumable media upload, one chunk in memory at a time"""
+        from googleapiclient.http import MediaIoBaseUpload
+        client = await self.get_gmail_client(account)
+        media = MediaIoBaseUpload(message, mimetype='message/rfc822',
+                                  chunksize=self.config.UPLOAD_CHUNK_SIZE, resumable=True)
+        request = client.service.users().messages().send(userId='me', media_body=media)
+        try:
+            return await self._run_blocking(self._upload, client, request)
+        finally:
+            message.close()
+
+    def _upload(self, client: GmailClient, request) -> Dict[str, Any]:
+        """Drive a resumable upload on an executor thread. After a dropped connection or a
+        5xx/429 it asks Gmail how much arrived and carries on from there; MAX_RETRIES
+        failures in a row without progress give up"""
+        from googleapiclient import errors as google_errors
+        import httplib2
+        http = client.http()
+        failures = 0
+        while True:
+            try:
+                _, response = request.next_chunk(http=http)
+            except (google_errors.HttpError, httplib2.HttpLib2Error, OSError) as e:
+                status = e.resp.status if isinstance(e, google_errors.HttpError) else None
+                if (status is not None and status < 500 and status != 429) or failures >= self.config.MAX_RETRIES:
+                    raise
+                failures += 1
+                delay = min(2 ** failures, 30)
+                logger.warning(f"Upload interrupted at byte {request.resumable_progress} ({e}), "
+                               f"resuming in {delay}s")
+                time.sleep(delay)
+                continue
+            if response is not None:
+                return response
+            failures = 0
 
-    @lru_cache(maxsize=100)
     def _get_all_us_times(self) -> Dict[str, Any]:
-        """Get all US timezone times with caching"""
-        us_timezones = {
-            'eastern': 'US/Eastern',
-            'central': 'US/Central',
-            'mountain': 'US/Mountain',
-            'pacific': 'US/Pacific',
-            'alaska': 'US/Alaska',
-            'hawaii': 'US/Hawaii'
-        }
-        
-        current_times = []
-        for zone_name, timezone in us_timezones.items():
-            tz = pytz.timezone(timezone)
-            current_time = datetime.now(tz)
-            current_times.append(f"🕐 {zone_name.title()}: {current_time.strftime('%I:%M %p')}")
-        
+        """Get all US timezone times (cached by the index until the minute changes)"""
+        return self._get_specific_timezone('us')
+
+    def _get_specific_timezone(self, location: str) -> Dict[str, Any]:
+        """Get the current time for a city, country, abbreviation or spoken place name"""
+        current_times = self.timezone_index.current_time(location)
+        if current_times is None:
+            return {"status": "error", "message": f"Unknown location: {location}"}
         return {
             "status": "success",
-            "data": "\n".join(current_times),
+            "data": current_times,
             "type": "time"
         }
 
-    async def send_email(self, to: str, subject: str, body: str) -> Dict[str, Any]:
-        """Send email with comprehensive error handling and logging"""
-        if not self.gmail_service:
+    def _default_account_missing(self, account: Optional[str]) -> bool:
+        return not self.gmail_service and (account or DEFAULT_ACCOUNT) == DEFAULT_ACCOUNT
+
+    async def _send(self, to: str, subject: str, body: str, account: Optional[str],
+                    attachments: Optional[List[Union[Attachment, str, Path]]]) -> Dict[str, Any]:
+        """Send and return the success result; attachments switch to the streamed upload"""
+        if attachments:
+            message = await self._run_blocking(self._create_email_upload, to, subject, body, attachments)
+            sent_message = await self._send_email_upload(message, account)
+        else:
+            message = self._create_email_message(to, subject, body)
+            sent_message = await self._send_email_message(message, account)
+        details = {"to": to, "subject": subject}
+        if attachments:
+            details["attachments"] = [a.filename if isinstance(a, Attachment) else Path(a).name for a in attachments]
+        return {"status": "success", "message_id": sent_message['id'], "details": details}
+
+    async def send_email(self, to: str, subject: str, body: str, account: Optional[str] = None,
+                         attachments: Optional[List[Union[Attachment, str, Path]]] = None) -> Dict[str, Any]:
+        """Send email as `account` (default account when None) with error handling and logging.
+
+        `attachments` are Attachment objects or file paths; they are streamed, never read whole.
+        """
+        if self._default_account_missing(account):
             return {"status": "error", "message": "Gmail service not initialized"}
 
+        from googleapiclient import errors as google_errors
         try:
-            message = self._create_email_message(to, subject, body)
-            sent_message = await self._send_email_message(message)  # Fixed: Added await for async call
+            result = await self._send(to, subject, body, account, attachments)
             logger.info(f"Email sent successfully to {to}")
-            return {
-                "status": "success",
-                "message_id": sent_message['id'],
-                "details": {"to": to, "subject": subject}
-            }
+            return result
         except google_errors.HttpError as e:
             logger.error(f"Gmail API error: {e}")
             return {"status": "error", "message": str(e)}
@@ -326,30 +543,115 @@ class AIService:
         text = re.sub(r'\n+', '\n', text)
         return text.strip()
 
-    async def generate_text(self, prompt: str) -> str:
-        """Generate text using available model with fallback"""
+    async def _generate_gemini(self, prompt: str) -> str:
+        response = await self.gemini_model.generate_content_async(prompt)
+        return response.text
+
+    async def _generate_openai(self, prompt: str) -> str:
+        response = await self.openai_llm.ainvoke(prompt)
+        return response if isinstance(response, str) else ""
+
+    async def _call_with_deadline(self, name: str, prompt: str) -> str:
+        """Call one provider under its deadline; returns "" on failure, timeout or empty text"""
+        generate, timeout = {
+            "gemini": (self._generate_gemini, self.config.GEMINI_TIMEOUT),
+            "openai": (self._generate_openai, self.config.OPENAI_TIMEOUT),
+        }[name]
+        try:
+            text = await asyncio.wait_for(generate(prompt), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.llm_stats[name]["timeouts"] += 1
+            logger.warning(f"{name} generation exceeded its {timeout}s deadline")
+            return ""
+        except Exception as e:
+            self.llm_stats[name]["errors"] += 1
+            logger.warning(f"{name} generation failed: {e}")
+            return ""
+        if not text:
+            self.llm_stats[name]["empty"] += 1
+            logger.warning(f"{name} returned empty content")
+        return text or ""
+
+    async def _generate_hedged(self, prompt: str, delay: float) -> str:
+        """Start Gemini, fire OpenAI after `delay` seconds (0 = race) and keep the first non-empty answer"""
+        tasks = {"gemini": asyncio.create_task(self._call_with_deadline("gemini", prompt))}
+        try:
+            if delay > 0:
+                done, _ = await asyncio.wait({tasks["gemini"]}, timeout=delay)
+                if done and tasks["gemini"].result():
+                    self.llm_stats["gemini"]["wins"] += 1
+                    return tasks["gemini"].result()
+
+            # Primary is slow (or already came back empty): hedge with the secondary
+            self.llm_stats["hedge"]["fired"] += 1
+            tasks["openai"] = asyncio.create_task(self._call_with_deadline("openai", prompt))
+            pending = {task for task in tasks.values() if not task.done()}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for name, task in tasks.items():
+                    if task in done and task.result():
+                        self.llm_stats[name]["wins"] += 1
+                        for other, other_task in tasks.items():
+                            if other_task is not task and other_task.done():
+                                self.llm_stats[other]["losses"] += 1
+                        return task.result()
+
+            for name in tasks:
+                self.llm_stats[name]["losses"] += 1
+            logger.error("Both Gemini and OpenAI failed to generate text.")
+            return ""
+        finally:
+            for name, task in tasks.items():
+                if not task.done():
+                    task.cancel()
+                    self.llm_stats[name]["cancellations"] += 1
+
+    def _model_signature(self) -> str:
+        """Identifies the configured models, so a model change never serves stale answers"""
+        gemini = getattr(self.gemini_model, "model_name", None) if self.gemini_model else None
+        openai_model = getattr(self.openai_llm, "model_name", None) if self.openai_llm else None
+        return f"{gemini}|{openai_model}"
+
+    async def generate_text(self, prompt: str, use_cache: bool = True) -> str:
+        """Generate text, served from the response cache when an identical prompt was answered recently"""
+        if not use_cache or self.response_cache is None:
+            return await self._generate_text_uncached(prompt)
+        key = self.response_cache.make_key(prompt, self._model_signature())
+        return await self.response_cache.get_or_compute(key, lambda: self._generate_text_uncached(prompt))
+
+    async def _generate_text_uncached(self, prompt: str) -> str:
+        """Generate text using available model with fallback (or hedging, see ServiceConfig.LLM_MODE)"""
+        mode = self.config.LLM_MODE
+        if mode in ("hedge", "race") and self.gemini_model and self.openai_llm:
+            return await self._generate_hedged(prompt, 0.0 if mode == "race" else self.config.HEDGE_DELAY)
+
         generated_content = "" # Default to empty string
         try:
             if self.gemini_model:
-                response = self.gemini_model.generate_content(prompt)
-                generated_content = response.text
+                generated_content = await asyncio.wait_for(
+                    self._generate_gemini(prompt), timeout=self.config.GEMINI_TIMEOUT
+                )
                 if generated_content: # Check if Gemini returned content
                     return generated_content
                 else:
                     logger.warning("Gemini returned empty content, falling back to OpenAI")
+        except asyncio.TimeoutError:
+            logger.warning(f"Gemini exceeded its {self.config.GEMINI_TIMEOUT}s deadline, falling back to OpenAI")
         except Exception as e:
             logger.warning(f"Gemini generation failed: {e}, falling back to OpenAI")
             
         try:
             if self.openai_llm:
-                response = self.openai_llm(prompt) 
-                if isinstance(response, str):
-                    generated_content = response
+                generated_content = await asyncio.wait_for(
+                    self._generate_openai(prompt), timeout=self.config.OPENAI_TIMEOUT
+                )
                 
                 if generated_content:
                     return generated_content
                 else:
                     logger.warning("OpenAI returned empty content.")
+        except asyncio.TimeoutError:
+            logger.error(f"OpenAI exceeded its {self.config.OPENAI_TIMEOUT}s deadline")
         except Exception as e:
             logger.error(f"OpenAI text generation failed: {e}")
 
@@ -358,22 +660,139 @@ class AIService:
             
         return generated_content # Return empty string if all fails
     
-    async def send_email_via_assistant(self, to: str, subject: str, body: str) -> Dict[str, Any]:
+    async def generate_text_stream(self, prompt: str, info: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """Stream generated text as it arrives, Gemini first with OpenAI fallback.
+
+        Falls back to OpenAI only if Gemini fails or is empty before yielding
+        anything; text already sent to the caller cannot be taken back, so a
+        mid-stream failure just ends the stream. If given, `info` is filled
+        with the provider used and its time-to-first-token.
+        """
+        info = info if info is not None else {}
+        providers = []
+        if self.gemini_model:
+            providers.append(("gemini", self._stream_gemini))
+        if self.openai_llm:
+            providers.append(("openai", self._stream_openai))
+
+        for name, stream in providers:
+            started = time.perf_counter()
+            produced = False
+            try:
+                async for text in stream(prompt):
+                    if not text:
+                        continue
+                    if not produced:
+                        produced = True
+                        ttft = time.perf_counter() - started
+                        self.ttft_stats[name].record(ttft)
+                        info.update(provider=name, ttft_ms=round(ttft * 1000, 1))
+                        logger.info(f"Time to first token from {name}: {ttft * 1000:.0f}ms")
+                    yield text
+            except Exception as e:
+                if produced:
+                    logger.error(f"{name} stream failed mid-response: {e}")
+                    return
+                logger.warning(f"{name} streaming failed: {e}, trying next provider")
+                continue
+            if produced:
+                return
+            logger.warning(f"{name} returned empty content, trying next provider")
+
+        logger.error("Both Gemini and OpenAI failed to generate text.")
+
+    async def _stream_gemini(self, prompt: str) -> AsyncIterator[str]:
+        response = await self.gemini_model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            yield chunk.text
+
+    async def _stream_openai(self, prompt: str) -> AsyncIterator[str]:
+        async for chunk in self.openai_llm.astream(prompt):
+            yield chunk if isinstance(chunk, str) else getattr(chunk, "content", "")
+    
+    async def send_email_via_assistant(self, to: str, subject: str, body: str, account: Optional[str] = None,
+                                       attachments: Optional[List[Union[Attachment, str, Path]]] = None
+                                       ) -> Dict[str, Any]:
         """Send email using the AI service with proper error handling."""
-        if not self.gmail_service:
+        if self._default_account_missing(account):
             return {"status": "error", "message": "Gmail service not initialized"}
         
         try:
-            message = self._create_email_message(to, subject, body)
-            sent_message = await self._send_email_message(message)
-            return {
-                "status": "success",
-                "message_id": sent_message['id'],
-                "details": {"to": to, "subject": subject}
-            }
+            return await self._send(to, subject, body, account, attachments)
         except Exception as e:
             logger.error(f"Unexpected error sending email: {e}")
             return {"status": "error", "message": str(e)}
+
+    async def send_emails_bulk(self, messages: List[Dict[str, Any]],
+                               account: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Send many emails as `account` through Gmail HTTP batch requests.
+
+        Returns one result per message, in the same order as `messages`.
+        """
+        if self._default_account_missing(account):
+            return [{"status": "error", "message": "Gmail service not initialized"} for _ in messages]
+        try:
+            client = await self.get_gmail_client(account)
+        except (UnknownAccountError, ValueError) as e:
+            return [{"status": "error", "message": str(e)} for _ in messages]
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(messages)
+        batch_size = max(1, min(self.config.GMAIL_BATCH_SIZE, GMAIL_BATCH_LIMIT))
+        semaphore = asyncio.Semaphore(self.config.MAX_CONCURRENT_BATCHES)
+
+        async def run_batch(offset: int) -> None:
+            async with semaphore:
+                chunk = messages[offset:offset + batch_size]
+                try:
+                    await self._run_blocking(self._execute_batch, client, offset, chunk, results)
+                except Exception as e:
+                    logger.error(f"Gmail batch starting at {offset} failed: {e}")
+                    for index in range(offset, offset + len(chunk)):
+                        if results[index] is None:
+                            results[index] = {"status": "error", "message": str(e)}
+
+        await asyncio.gather(*(run_batch(offset) for offset in range(0, len(messages), batch_size)))
+        sent = sum(1 for result in results if result["status"] == "success")
+        logger.info(f"Bulk send finished: {sent}/{len(messages)} emails sent")
+        return results
+
+    def _execute_batch(self, client: GmailClient, offset: int, chunk: List[Dict[str, Any]],
+                       results: List[Optional[Dict[str, Any]]]) -> None:
+        """Send one Gmail batch request; runs on an executor thread and fills `results` in place"""
+
+        def on_response(request_id: str, response: Dict[str, Any], exception: Exception) -> None:
+            index = int(request_id)
+            message = messages_by_index[index]
+            if exception is not None:
+                results[index] = {"status": "error", "message": str(exception)}
+            else:
+                results[index] = {
+                    "status": "success",
+                    "message_id": response['id'],
+                    "details": {"to": message['to'], "subject": message['subject']}
+                }
+
+        messages_by_index = {}
+        batch = client.service.new_batch_http_request(callback=on_response)
+        for position, message in enumerate(chunk):
+            index = offset + position
+            missing = [field for field in ('to', 'subject', 'body') if field not in message]
+            if missing:
+                results[index] = {"status": "error", "message": f"Missing required field: {missing[0]}"}
+                continue
+            messages_by_index[index] = message
+            raw = self._create_email_message(message['to'], message['subject'], message['body'])
+            batch.add(client.service.users().messages().send(userId='me', body=raw), request_id=str(index))
+
+        if messages_by_index:
+            client.execute(batch)
+
+    def close(self) -> None:
+        """Release the executor threads, stop the token refreshers and close the response cache"""
+        self.gmail_pool.close()
+        self._executor.shutdown(wait=False)
+        if self.response_cache is not None:
+            self.response_cache.close()
             
 
 
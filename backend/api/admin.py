@@ -1,3 +1,12 @@
 from django.contrib import admin
 
+from .models import OutboundEmail
+
 # Register your models here.
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('job_id', 'account', 'to', 'subject', 'status', 'attempts', 'created_at')
+    list_filter = ('status',)
+    search_fields = ('to', 'subject', 'job_id')
@@ -0,0 +1,241 @@
+# Shared helpers for the benchmark management commands (api/management/commands/bench_*.py)
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Union
+
+import aiohttp
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile, returns 0.0 for an empty sample"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    """Summarize a run into throughput and latency percentiles (milliseconds)"""
+    total = len(latencies) + errors
+    return {
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+async def run_http_load(url: Union[str, Callable[[int], str]], method: str = "GET",
+                        payload: Optional[Dict[str, Any]] = None, concurrency: int = 10, total: int = 1000,
+                        timeout: float = 30.0,
+                        check: Optional[Callable[[aiohttp.ClientSession, bytes], Awaitable[bool]]] = None
+                        ) -> Dict[str, Any]:
+    """Drive `url` with `concurrency` parallel clients until `total` requests completed.
+
+    `url` may be a callable taking the request number, to spread requests over many URLs.
+    `check(session, body)` may look at a successful response; False counts it as an error.
+    """
+    latencies: List[float] = []
+    errors = 0
+    remaining = total
+    data = json.dumps(payload) if payload is not None else None
+    headers = {"Content-Type": "application/json"} if data is not None else {}
+
+    async def client(session: aiohttp.ClientSession) -> None:
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            target = url(total - remaining - 1) if callable(url) else url
+            started = time.perf_counter()
+            try:
+                async with session.request(method, target, data=data, headers=headers) as response:
+                    body = await response.read()
+                    if response.status >= 500:
+                        errors += 1
+                        continue
+                if check is not None and response.status < 400 and not await check(session, body):
+                    errors += 1
+                    continue
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return summarize(latencies, errors, elapsed)
+
+
+async def wait_for_http(url: str, timeout: float = 60.0, expect_status: Optional[int] = None) -> None:
+    """Poll `url` until it answers (with `expect_status`, if given), used after spawning a server"""
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=2)) as session:
+        while True:
+            try:
+                async with session.get(url) as response:
+                    await response.read()
+                    if expect_status is None or response.status == expect_status:
+                        return
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Server at {url} did not come up within {timeout}s")
+            await asyncio.sleep(0.2)
+
+
+def print_table(stdout, rows: Dict[str, Dict[str, Any]]) -> None:
+    """Print a small fixed-width comparison table"""
+    columns = ["requests", "errors", "rps", "p50_ms", "p95_ms", "p99_ms"]
+    stdout.write(f"{'target':<12} | " + " | ".join(f"{c:>9}" for c in columns))
+    for name, row in rows.items():
+        stdout.write(f"{name:<12} | " + " | ".join(f"{row.get(c, ''):>9}" for c in columns))
+
+
+
+# What each process type imports on start-up
+IMPORT_TARGETS = {
+    'django': (
+        "import os; os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings'); "
+        "import django; django.setup(); import api.urls"
+    ),
+    'email': "import api.Email",
+    'agent': "import api.Call",
+}
+
+_PROVIDER_SDKS = (
+    'google.generativeai', 'google.ai', 'google.oauth2', 'googleapiclient', 'google_auth_httplib2', 'httplib2',
+    'langchain_core', 'langchain_openai', 'langchain_google_genai',
+)
+
+# Packages each target must leave to first use: provider SDKs load when AIService first
+# needs them, Django never loads LiveKit (api.livekit imports livekit.api per token) and
+# the agent loads model runtimes only in its job processes. The agent does need openai:
+# livekit.plugins.openai imports it.
+LAZY_IMPORTS = {
+    'django': _PROVIDER_SDKS + ('openai', 'livekit', 'aiohttp'),
+    'email': _PROVIDER_SDKS + ('openai', 'livekit', 'aiohttp'),
+    'agent': _PROVIDER_SDKS + ('transformers', 'onnxruntime', 'torch'),
+}
+
+
+def imported_modules(code: str, cwd: str) -> List[str]:
+    """Every module loaded by running `code` in a fresh interpreter"""
+    completed = subprocess.run(
+        [sys.executable, '-c', f"{code}\nimport sys; print('\\n'.join(sys.modules))"],
+        cwd=cwd, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Import failed:\n{completed.stderr[-2000:]}")
+    return completed.stdout.split()
+
+
+def eager_imports(target: str, cwd: str) -> List[str]:
+    """The packages in LAZY_IMPORTS[target] that importing the target already loaded"""
+    modules = imported_modules(IMPORT_TARGETS[target], cwd)
+    return [name for name in LAZY_IMPORTS[target]
+            if any(module == name or module.startswith(name + '.') for module in modules)]
+
+
+# Vocabulary for build_corpus
+_NAMES = ['john', 'sarah', 'mike', 'ada', 'chidi', 'emeka', 'grace', 'li', 'priya', 'tom']
+_DOMAINS = ['gmail.com', 'example.com', 'company.org', 'yahoo.co.uk']
+_SUBJECTS = ['the quarterly report', 'lunch tomorrow', 'project update', 'the invoice', 'our meeting']
+_BODIES = ['please review it by friday', 'see you at noon', 'the deploy went fine', 'call me when you can']
+_PLACES = ['new york', 'lagos', 'london', 'tokyo', 'pacific time', 'sydney', 'berlin']
+_CHATTER = [
+    'tell me a joke', 'how is the weather looking', 'what can you do', 'play some music',
+    'I got an email yesterday from my boss', 'remind me to call mom', 'thank you so much',
+    'how do I reset my password', 'read my last message', 'who won the game last night',
+]
+
+
+def build_corpus(size: int, seed: int = 7):
+    """Synthetic labelled transcripts: complete and partial email commands, time questions, chatter"""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        kind = rng.random()
+        name, subject, body = rng.choice(_NAMES), rng.choice(_SUBJECTS), rng.choice(_BODIES)
+        address = f"{name}@{rng.choice(_DOMAINS)}"
+        if kind < 0.35:
+            spoken = address.replace('@', ' at ').replace('.', ' dot ')
+            recipient = rng.choice([address, spoken])
+            text = rng.choice([
+                f"send an email to {recipient} about {subject} saying {body}",
+                f"please write an email to {recipient} with the subject {subject} and tell them {body}",
+                f"compose an email to {recipient} regarding {subject}, message: {body}",
+            ])
+            corpus.append({'text': text, 'intent': 'email', 'recipient': address})
+        elif kind < 0.55:
+            text = rng.choice([
+                f"send an email to {name}", f"email {name} about {subject}",
+                f"can you send a message to {name} saying {body}", "write an email",
+            ])
+            corpus.append({'text': text, 'intent': 'email', 'recipient': None})
+        elif kind < 0.75:
+            place = rng.choice(_PLACES)
+            text = rng.choice([f"what time is it in {place}", f"what's the time in {place} right now",
+                               f"current time in {place}"])
+            corpus.append({'text': text, 'intent': 'time', 'recipient': None})
+        else:
+            corpus.append({'text': rng.choice(_CHATTER), 'intent': 'other', 'recipient': None})
+    return corpus
+
+
+def make_offline_service(config=None, gmail_service=None):
+    """Build an AIService that skips env checks and provider setup, for benchmarks"""
+    from .Email import AIService
+    from .gmail_pool import DEFAULT_ACCOUNT
+
+    class OfflineAIService(AIService):
+        def _setup_environment(self) -> None:
+            pass
+
+        def _initialize_services(self) -> None:
+            pass
+
+    service = OfflineAIService(config)
+    service.gmail_service = gmail_service
+    if gmail_service is not None:
+        service.gmail_pool.register(DEFAULT_ACCOUNT, gmail_service)
+    return service
+
+
+def stub_ai_service(config=None):
+    """AIService whose Gmail and LLM clients talk to local stub servers over HTTP.
+
+    Used as AI_SERVICE_FACTORY by bench_load_suite: LOADTEST_GMAIL_URL and
+    LOADTEST_LLM_URL name a GmailStubServer and an LLMStubServer (api/fakes.py).
+    """
+    from .Email import AIService
+    from .gmail_pool import DEFAULT_ACCOUNT, build_gmail_resource
+
+    class StubAIService(AIService):
+        def _setup_environment(self) -> None:
+            pass
+
+        def _initialize_services(self) -> None:
+            from langchain_openai import OpenAI
+            # The OpenAI-compatible routes; see LLMStubServer for why not Gemini
+            self.openai_llm = OpenAI(temperature=0.7, openai_api_key='stub',
+                                     base_url=os.environ['LOADTEST_LLM_URL'].rstrip('/') + '/v1')
+            client = self.gmail_pool.register(DEFAULT_ACCOUNT, build_gmail_resource(os.environ['LOADTEST_GMAIL_URL']))
+            self.gmail_service = client.service
+
+    return StubAIService(config)
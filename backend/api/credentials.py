@@ -0,0 +1,212 @@
+# Gmail OAuth credentials held in memory and refreshed in the background before they expire,
+# so sends never wait on a token refresh. token.json is shared by every worker process:
+# it is only read and written under an exclusive file lock, and written by atomic rename.
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# Google access tokens last an hour; a refresh margin of that or more would refresh forever
+ACCESS_TOKEN_LIFETIME = 3600.0
+
+
+def check_refresh_margin(refresh_margin: float) -> float:
+    if not 0 <= refresh_margin < ACCESS_TOKEN_LIFETIME:
+        raise ValueError(f"Token refresh margin must be between 0 and {ACCESS_TOKEN_LIFETIME:.0f}s, "
+                         f"got {refresh_margin}")
+    return refresh_margin
+
+
+@contextmanager
+def file_lock(path: Path):
+    """Exclusive inter-process lock on a sidecar `<path>.lock` file"""
+    lock_path = path.with_name(path.name + '.lock')
+    with open(lock_path, 'a+b') as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def atomic_write(path: Path, data: str) -> None:
+    """Write to a temp file in the same directory, fsync, then rename over `path`"""
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as handle:
+            handle.write(data)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+class GmailCredentialManager:
+    """Loads Gmail credentials once and keeps them fresh from a background thread"""
+
+    def __init__(self, token_path: Path, client_secrets_path: Path, scopes: List[str],
+                 refresh_margin: float = 600.0, retry_interval: float = 30.0):
+        self.token_path = Path(token_path)
+        self.client_secrets_path = Path(client_secrets_path)
+        self.scopes = scopes
+        # Refresh this many seconds before expiry; must exceed google-auth's own
+        # expiry threshold, otherwise the send path would refresh first
+        self.refresh_margin = check_refresh_margin(refresh_margin)
+        self.retry_interval = retry_interval
+        self.credentials: Optional["Credentials"] = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.refresh_count = 0
+        self.refresh_failures = 0
+        self.last_refresh: Optional[datetime] = None
+
+    def _read_token_file(self) -> Optional["Credentials"]:
+        from google.oauth2.credentials import Credentials
+
+        if not self.token_path.exists():
+            logger.info(f"Token file does not exist at {self.token_path}")
+            return None
+        try:
+            with open(self.token_path, 'r', encoding='utf-8') as token:
+                info = json.load(token)
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            logger.warning(f"Error reading token file: {e}")
+            # Delete corrupted token file
+            self.token_path.unlink(missing_ok=True)
+            return None
+        try:
+            return Credentials.from_authorized_user_info(info, self.scopes)
+        except ValueError as e:
+            # Readable but incomplete: keep the file (and its refresh token) for someone to fix
+            raise ValueError(f"Token file {self.token_path} is incomplete: {e}") from e
+
+    def _seconds_left(self, creds: Optional["Credentials"]) -> float:
+        if creds is None or not creds.token:
+            return 0.0
+        if creds.expiry is None:
+            return float('inf')
+        # google-auth keeps expiry as a naive UTC datetime
+        return (creds.expiry - datetime.utcnow()).total_seconds()
+
+    def load(self, interactive: bool = True) -> "Credentials":
+        """Return usable credentials, refreshing or (if `interactive`) running the consent flow"""
+        from google.auth.transport.requests import Request
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
+        with self._lock, file_lock(self.token_path):
+            creds = self._read_token_file()
+            if creds is not None and self._seconds_left(creds) > self.refresh_margin:
+                logger.info("Valid credentials found.")
+            elif creds is not None and creds.refresh_token:
+                logger.info("Credentials expire soon and a refresh token exists. Refreshing credentials.")
+                creds.refresh(Request())
+                self._record_refresh()
+                atomic_write(self.token_path, creds.to_json())
+            elif not interactive:
+                raise LookupError(f"No usable Gmail token at {self.token_path}")
+            else:
+                logger.info("No valid credentials or refresh token. Running installed app flow to obtain new credentials.")
+                flow = InstalledAppFlow.from_client_secrets_file(str(self.client_secrets_path), self.scopes)
+                creds = flow.run_local_server(port=0)
+                atomic_write(self.token_path, creds.to_json())
+                logger.info("New credentials saved to token file.")
+            self.credentials = creds
+        return creds
+
+    def refresh(self) -> None:
+        """Bring the in-memory token up to date, reusing one another worker already wrote"""
+        from google.auth.transport.requests import Request
+
+        with self._lock, file_lock(self.token_path):
+            creds = self.credentials
+            if creds is None:
+                return
+            on_disk = self._read_token_file()
+            if on_disk is not None and self._seconds_left(on_disk) > self._seconds_left(creds) \
+                    and self._seconds_left(on_disk) > self.refresh_margin:
+                # Another process refreshed first: adopt its token rather than spending a refresh.
+                # Update in place; authorized Http objects hold a reference to this object
+                creds.token = on_disk.token
+                creds.expiry = on_disk.expiry
+                logger.info(f"Adopted Gmail token refreshed by another worker (expires {creds.expiry} UTC)")
+                return
+            creds.refresh(Request())
+            self._record_refresh()
+            atomic_write(self.token_path, creds.to_json())
+            logger.info(f"Gmail token refreshed in background (expires {creds.expiry} UTC)")
+
+    def _record_refresh(self) -> None:
+        self.refresh_count += 1
+        self.last_refresh = datetime.utcnow()
+
+    def start(self) -> None:
+        """Start the background refresher (idempotent)"""
+        if self.credentials is None or not self.credentials.refresh_token:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="gmail-token-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            delay = max(0.0, self._seconds_left(self.credentials) - self.refresh_margin)
+            if self._stopping.wait(timeout=delay):
+                return
+            try:
+                self.refresh()
+                if self._seconds_left(self.credentials) <= self.refresh_margin:
+                    # A token shorter-lived than the margin would otherwise be refreshed in a loop
+                    logger.warning("Refreshed Gmail token expires within the refresh margin")
+                    if self._stopping.wait(timeout=self.retry_interval):
+                        return
+            except Exception as e:
+                # Revoked grants and network errors alike: keep the old token (it may still be
+                # valid for a while) and try again shortly
+                self.refresh_failures += 1
+                logger.error(f"Background Gmail token refresh failed: {e}")
+                if self._stopping.wait(timeout=self.retry_interval):
+                    return
+
+    def status(self) -> Dict[str, Any]:
+        seconds_left = self._seconds_left(self.credentials)
+        return {
+            "loaded": self.credentials is not None,
+            "expires_in_s": None if seconds_left == float('inf') else round(seconds_left, 1),
+            "refresher_running": self._thread is not None and self._thread.is_alive(),
+            "refresh_count": self.refresh_count,
+            "refresh_failures": self.refresh_failures,
+            "last_refresh": self.last_refresh.isoformat() if self.last_refresh else None,
+        }
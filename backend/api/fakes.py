@@ -0,0 +1,429 @@
+# Local stand-ins for external providers, used by the benchmark commands
+import hashlib
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Iterable, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+
+class _FakeRequest:
+    """Mimics a googleapiclient HttpRequest whose execute() blocks for `latency` seconds"""
+
+    def __init__(self, service: "FakeGmailService", body: Dict[str, Any], media_body=None):
+        self._service = service
+        self._body = body
+        self._media = media_body
+
+    def execute(self, http=None, num_retries: int = 0) -> Dict[str, Any]:
+        time.sleep(self._service.latency)
+        return {"id": f"fake-{next(self._service._ids)}", "labelIds": ["SENT"]}
+
+    def next_chunk(self, http=None, num_retries: int = 0):
+        """Resumable upload in one call: reads the media a chunk at a time, then answers like execute()"""
+        if self._media is not None:
+            for offset in range(0, self._media.size(), self._media.chunksize()):
+                self._media.getbytes(offset, self._media.chunksize())
+        return None, self.execute()
+
+
+class FakeGmailService:
+    """In-process replacement for build('gmail', 'v1'); every send blocks like a real HTTP round trip"""
+
+    def __init__(self, latency: float = 0.2):
+        self.latency = latency
+        self._ids = itertools.count(1)
+
+    def users(self) -> "FakeGmailService":
+        return self
+
+    def messages(self) -> "FakeGmailService":
+        return self
+
+    def send(self, userId: str, body: Optional[Dict[str, Any]] = None, media_body=None, **kwargs) -> _FakeRequest:
+        return _FakeRequest(self, body or {}, media_body)
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Shared plumbing for the stub servers below"""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; with Nagle on, the body would wait
+    # for the client's delayed ACK and add ~40ms to every response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args) -> None:  # keep benchmark output clean
+        pass
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _reply(self, code: int, content_type: str, payload: bytes) -> None:
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _reply_json(self, code: int, data: Any) -> None:
+        self._reply(code, "application/json", json.dumps(data).encode())
+
+    def _injected_failure(self, stub: "_StubServer") -> bool:
+        """Count the request and answer it with the stub's error status if it is picked to fail"""
+        if not stub.should_fail():
+            return False
+        self._reply_json(stub.error_status, {"error": {"code": stub.error_status, "message": "Injected failure"}})
+        return True
+
+    def _stream(self, content_type: str, chunks: Iterable[bytes], delay: float) -> None:
+        """Chunked response, one chunk every `delay` seconds"""
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for i, chunk in enumerate(chunks):
+                if i and delay:
+                    time.sleep(delay)
+                self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):  # the client stopped reading
+            self.close_connection = True
+
+
+class _ThreadingServer(ThreadingHTTPServer):
+    # The default backlog of 5 drops connections under load and the client only
+    # retries after a 1s SYN timeout, which would show up as p99 latency
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class _StubServer:
+    """Threaded local HTTP server with latency and error injection.
+
+    Each request waits `latency` seconds; a share `error_rate` of them then
+    fails with HTTP `error_status`. The failures come from a seeded RNG, so two
+    runs with the same settings fail the same requests.
+    """
+
+    handler_class = _StubHandler
+
+    def __init__(self, latency: float = 0.05, error_rate: float = 0.0, error_status: int = 503,
+                 port: int = 0, seed: int = 7):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.stats: Counter = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = _ThreadingServer(("127.0.0.1", port), self.handler_class)
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            self.stats["requests"] += 1
+            failed = self.error_rate > 0 and self._random.random() < self.error_rate
+            if failed:
+                self.stats["injected_errors"] += 1
+        return failed
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+_CONTENT_RANGE = re.compile(r"bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)")
+
+
+class _GmailStubHandler(_StubHandler):
+    """Serves messages.send (plain and resumable upload) and the /batch endpoint the way gmail.googleapis.com does"""
+
+    def do_POST(self) -> None:
+        stub: GmailStubServer = self.server.stub
+        if self.path.startswith("/batch"):
+            self._handle_batch(stub, self._read_body())
+            return
+        # A send's body is never looked at; not keeping it lets benchmarks measure the client alone
+        self._drain(int(self.headers.get("Content-Length", 0)))
+        if "uploadType=resumable" in self.path:
+            time.sleep(stub.latency)
+            if not self._injected_failure(stub):
+                session = stub.start_upload(int(self.headers.get("X-Upload-Content-Length", 0)))
+                self.send_response(200)
+                self.send_header("Location", f"{stub.url}upload/session/{session}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+        elif self.path.split("?")[0].endswith("/messages/send"):
+            time.sleep(stub.latency)
+            if not self._injected_failure(stub):
+                self._reply_json(200, stub.sent_message())
+        else:
+            self._reply(404, "application/json", b'{"error": {"code": 404, "message": "Not found"}}')
+
+    def do_PUT(self) -> None:
+        """One chunk of a resumable upload, or a status query ("bytes */total") after a failed one"""
+        stub: GmailStubServer = self.server.stub
+        session = stub.uploads.get(self.path.rsplit("/", 1)[-1]) if self.path.startswith("/upload/session/") else None
+        match = _CONTENT_RANGE.fullmatch(self.headers.get("Content-Range", ""))
+        length = int(self.headers.get("Content-Length", 0))
+        if session is None or match is None:
+            self._drain(length)
+            code = 404 if session is None else 400
+            self._reply_json(code, {"error": {"code": code, "message": "Unknown upload session or bad Content-Range"}})
+            return
+        time.sleep(stub.latency)
+        if match.group(1) is not None:
+            if int(match.group(1)) != session["received"]:
+                self._drain(length)
+                self._reply_json(400, {"error": {"code": 400, "message": "Chunk does not continue the upload"}})
+                return
+            digest = session["digest"].copy()
+            received = self._drain(length, digest)
+            if self._injected_failure(stub):
+                return  # lost in transit: nothing of this chunk is kept
+            session["digest"] = digest
+            session["received"] += received
+        if session["received"] >= session["total"]:
+            stub.finish_upload(session)
+            self._reply_json(200, stub.sent_message())
+            return
+        self.send_response(308)
+        if session["received"]:
+            self.send_header("Range", f"bytes=0-{session['received'] - 1}")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _drain(self, length: int, digest=None) -> int:
+        """Read (and hash into `digest`) a body of `length` bytes without keeping it"""
+        received = 0
+        while received < length:
+            block = self.rfile.read(min(length - received, 1 << 16))
+            if not block:
+                break
+            if digest is not None:
+                digest.update(block)
+            received += len(block)
+        return received
+
+    def _handle_batch(self, stub: "GmailStubServer", body: bytes) -> None:
+        content_type = self.headers["Content-Type"]
+        envelope = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body
+        )
+        parts = list(envelope.iter_parts())
+        # One network round trip for the whole batch plus a small per-item cost
+        time.sleep(stub.latency + stub.batch_item_cost * len(parts))
+        if self._injected_failure(stub):
+            return
+
+        boundary = "batch_stub_boundary"
+        chunks = []
+        for part in parts:
+            content_id = part["Content-ID"]
+            payload = json.dumps(stub.sent_message())
+            chunks.append(
+                f"--{boundary}\r\n"
+                f"Content-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id[1:]}\r\n\r\n"
+                f"HTTP/1.1 200 OK\r\n"
+                f"Content-Type: application/json; charset=UTF-8\r\n"
+                f"Content-Length: {len(payload)}\r\n\r\n"
+                f"{payload}\r\n"
+            )
+        chunks.append(f"--{boundary}--\r\n")
+        self._reply(200, f"multipart/mixed; boundary={boundary}", "".join(chunks).encode())
+
+
+class GmailStubServer(_StubServer):
+    """Local HTTP server speaking enough of the Gmail REST API for benchmarks"""
+
+    handler_class = _GmailStubHandler
+
+    def __init__(self, latency: float = 0.05, batch_item_cost: float = 0.001, port: int = 0, **kwargs):
+        super().__init__(latency=latency, port=port, **kwargs)
+        self.batch_item_cost = batch_item_cost
+        self._ids = itertools.count(1)
+        # Resumable upload sessions by id, and the messages completed through them
+        self.uploads: Dict[str, Dict[str, Any]] = {}
+        self.uploaded: List[Dict[str, Any]] = []
+
+    def start_upload(self, total: int) -> str:
+        with self._lock:
+            session = f"upload-{next(self._ids)}"
+            self.uploads[session] = {"id": session, "total": total, "received": 0, "digest": hashlib.sha256()}
+        return session
+
+    def finish_upload(self, session: Dict[str, Any]) -> None:
+        with self._lock:
+            self.uploads.pop(session["id"], None)
+            self.stats["uploaded_bytes"] += session["received"]
+            self.uploaded.append({"bytes": session["received"], "sha256": session["digest"].hexdigest()})
+
+    def sent_message(self) -> Dict[str, Any]:
+        with self._lock:
+            message_id = next(self._ids)
+        return {"id": f"stub-{message_id}", "threadId": f"stub-{message_id}", "labelIds": ["SENT"]}
+
+    def build_client(self, max_upload_bytes: Optional[int] = None):
+        """Gmail client from the bundled discovery document, pointed at this stub.
+
+        `max_upload_bytes` lifts Gmail's 35MB limit on messages.send uploads, which
+        googleapiclient enforces before sending anything.
+        """
+        from googleapiclient.discovery import build_from_document
+        from googleapiclient.discovery_cache import get_static_doc
+        import httplib2
+
+        document = json.loads(get_static_doc("gmail", "v1"))
+        document["rootUrl"] = self.url
+        document.pop("mtlsRootUrl", None)
+        if max_upload_bytes is not None:
+            send = document["resources"]["users"]["resources"]["messages"]["methods"]["send"]
+            send["mediaUpload"]["maxSize"] = str(max_upload_bytes)
+        return build_from_document(document, http=httplib2.Http())
+
+
+class _LLMStubHandler(_StubHandler):
+    """Gemini generateContent/streamGenerateContent and OpenAI completions/chat completions"""
+
+    def do_POST(self) -> None:
+        stub: LLMStubServer = self.server.stub
+        request = json.loads(self._read_body() or b"{}")
+        path = urlsplit(self.path)
+        time.sleep(stub.latency)  # time to first token
+        if self._injected_failure(stub):
+            return
+        if path.path.endswith(":generateContent"):
+            stub.stats["gemini"] += 1
+            self._reply_json(200, self._gemini_chunk(stub.reply_text()))
+        elif path.path.endswith(":streamGenerateContent"):
+            stub.stats["gemini"] += 1
+            chunks = [self._gemini_chunk(text) for text in stub.reply_chunks()]
+            if parse_qs(path.query).get("alt") == ["sse"]:
+                self._stream("text/event-stream", (f"data: {json.dumps(c)}\n\n".encode() for c in chunks),
+                             stub.token_delay)
+            else:
+                # The REST transport reads a streamed JSON array
+                parts = [("[" if i == 0 else ",") + json.dumps(c) for i, c in enumerate(chunks)] + ["]"]
+                self._stream("application/json", (part.encode() for part in parts), stub.token_delay)
+        elif path.path.endswith("/completions"):
+            stub.stats["openai"] += 1
+            chat = path.path.endswith("/chat/completions")
+            if request.get("stream"):
+                events = [json.dumps(self._openai_chunk(text, chat, request)) for text in stub.reply_chunks()]
+                self._stream("text/event-stream", (f"data: {event}\n\n".encode() for event in events + ["[DONE]"]),
+                             stub.token_delay)
+            else:
+                self._reply_json(200, self._openai_chunk(stub.reply_text(), chat, request, final=True))
+        else:
+            self._reply_json(404, {"error": {"code": 404, "message": "Not found"}})
+
+    @staticmethod
+    def _gemini_chunk(text: str) -> Dict[str, Any]:
+        return {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "index": 0,
+                                "finishReason": "STOP"}]}
+
+    @staticmethod
+    def _openai_chunk(text: str, chat: bool, request: Dict[str, Any], final: bool = False) -> Dict[str, Any]:
+        if chat:
+            key = "message" if final else "delta"
+            choice = {"index": 0, key: {"role": "assistant", "content": text}, "finish_reason": "stop" if final else None}
+        else:
+            choice = {"index": 0, "text": text, "logprobs": None, "finish_reason": "stop" if final else None}
+        response = {"id": "stub", "object": "chat.completion" if chat else "text_completion",
+                    "created": int(time.time()), "model": request.get("model", "stub"), "choices": [choice]}
+        if final:
+            words = len(text.split())
+            response["usage"] = {"prompt_tokens": 0, "completion_tokens": words, "total_tokens": words}
+        return response
+
+
+class LLMStubServer(_StubServer):
+    """Local stand-in for the Gemini and OpenAI APIs.
+
+    `latency` is the time to first token; streamed replies then send one of
+    `tokens` words every `token_delay` seconds. google-generativeai only has
+    async calls over gRPC, so AIService reaches this stub through the OpenAI
+    routes; the Gemini routes serve its synchronous REST client.
+    """
+
+    handler_class = _LLMStubHandler
+
+    def __init__(self, latency: float = 0.3, token_delay: float = 0.01, tokens: int = 40, **kwargs):
+        super().__init__(latency=latency, **kwargs)
+        self.token_delay = token_delay
+        self.tokens = tokens
+
+    def reply_chunks(self):
+        words = ("Thanks for reaching out, this is the load test stub answering your request. " * 8).split()
+        return [word + " " for word in itertools.islice(itertools.cycle(words), self.tokens)]
+
+    def reply_text(self) -> str:
+        return "".join(self.reply_chunks()).strip()
+
+
+class _TokenVerifierHandler(_StubHandler):
+    """GET /rtc/validate the way a LiveKit server checks a join token"""
+
+    def do_GET(self) -> None:
+        stub: TokenVerifierServer = self.server.stub
+        path = urlsplit(self.path)
+        if path.path != "/rtc/validate":
+            self._reply_json(404, {"error": "not found"})
+            return
+        time.sleep(stub.latency)
+        if self._injected_failure(stub):
+            return
+        token = parse_qs(path.query).get("access_token", [""])[0]
+        if not token and self.headers.get("Authorization", "").startswith("Bearer "):
+            token = self.headers["Authorization"][len("Bearer "):]
+        try:
+            claims = stub.verify(token)
+        except Exception as e:
+            stub.stats["rejected"] += 1
+            self._reply_json(401, {"error": f"invalid token: {e}"})
+            return
+        stub.stats["verified"] += 1
+        self._reply_json(200, {"identity": claims.identity, "room": claims.video.room if claims.video else None})
+
+
+class TokenVerifierServer(_StubServer):
+    """Checks LiveKit access tokens: signature, expiry and a room join grant"""
+
+    handler_class = _TokenVerifierHandler
+
+    def __init__(self, api_key: str, api_secret: str, latency: float = 0.005, **kwargs):
+        super().__init__(latency=latency, **kwargs)
+        from livekit.api import TokenVerifier
+        self._verifier = TokenVerifier(api_key, api_secret)
+
+    def verify(self, token: str):
+        claims = self._verifier.verify(token)
+        if not (claims.video and claims.video.room_join and claims.video.room):
+            raise ValueError("no room join grant")
+        return claims
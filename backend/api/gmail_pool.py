@@ -0,0 +1,252 @@
+# Gmail clients per account, built from the discovery document bundled with
+# google-api-python-client (no discovery fetch) and reused across requests.
+# A client's googleapiclient Resource only builds requests; they are executed with a
+# per-thread authorized Http because httplib2 is not thread-safe.
+import copy
+import json
+import logging
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union, TYPE_CHECKING
+
+from .credentials import GmailCredentialManager, check_refresh_margin
+
+if TYPE_CHECKING:
+    import httplib2
+    from google_auth_httplib2 import AuthorizedHttp
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ACCOUNT = 'default'
+# Account names become token file names, so keep them to a safe character set
+ACCOUNT_NAME = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._@+-]{0,127}$')
+
+_discovery_documents: Dict[str, dict] = {}
+_discovery_lock = threading.Lock()
+
+
+class UnknownAccountError(LookupError):
+    """No usable Gmail token exists for the requested account"""
+
+
+def normalize_account(account: Optional[str]) -> str:
+    """Map None/"" to the default account and reject names that are not safe file names"""
+    account = (account or DEFAULT_ACCOUNT).strip()
+    if not ACCOUNT_NAME.match(account):
+        raise ValueError(f"Invalid Gmail account name: {account!r}")
+    return account
+
+
+def gmail_discovery_document(root_url: Optional[str] = None) -> dict:
+    """The bundled Gmail v1 discovery document, parsed once per process"""
+    document = _discovery_documents.get('gmail')
+    if document is None:
+        from googleapiclient.discovery_cache import get_static_doc
+        with _discovery_lock:
+            document = _discovery_documents.get('gmail')
+            if document is None:
+                document = _discovery_documents['gmail'] = json.loads(get_static_doc('gmail', 'v1'))
+    if root_url:
+        document = copy.deepcopy(document)
+        document['rootUrl'] = root_url
+        document.pop('mtlsRootUrl', None)
+    return document
+
+
+def build_gmail_resource(root_url: Optional[str] = None):
+    """Build a Gmail Resource without any network access"""
+    from googleapiclient.discovery import build_from_document
+    import httplib2
+
+    # The Http given here is never used: requests are executed with GmailClient.http()
+    return build_from_document(gmail_discovery_document(root_url), http=httplib2.Http())
+
+
+class GmailClient:
+    """One account's Gmail Resource, credentials and per-thread Http objects"""
+
+    def __init__(self, account: str, service: Any, credential_manager: Optional[GmailCredentialManager] = None):
+        self.account = account
+        self.service = service
+        self.credential_manager = credential_manager
+        self.last_used = time.monotonic()
+        # Dropped with the client on eviction, which releases every thread's Http
+        self._local = threading.local()
+
+    @property
+    def credentials(self):
+        return self.credential_manager.credentials if self.credential_manager else None
+
+    def http(self) -> Union["AuthorizedHttp", "httplib2.Http"]:
+        """Per-thread Http for this account (httplib2 is not thread-safe)"""
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            from google_auth_httplib2 import AuthorizedHttp
+            from googleapiclient.http import build_http
+            # build_http: a socket timeout, and 308 left to resumable uploads rather than followed
+            http = build_http()
+            if self.credentials is not None:
+                http = AuthorizedHttp(self.credentials, http=http)
+            self._local.http = http
+        return http
+
+    def execute(self, request) -> Dict[str, Any]:
+        """Execute a googleapiclient request or batch; call from an executor thread"""
+        return request.execute(http=self.http())
+
+    def close(self) -> None:
+        if self.credential_manager is not None:
+            self.credential_manager.stop()
+
+
+class GmailClientPool:
+    """Thread-safe pool of GmailClient keyed by account, with idle eviction.
+
+    The default account uses token.json (and may run the consent flow on first
+    start); other accounts need an existing token at <tokens_dir>/<account>.json.
+    """
+
+    def __init__(self, default_token_path: Path, tokens_dir: Path, client_secrets_path: Path,
+                 scopes: List[str], idle_timeout: float = 900.0, max_clients: int = 64,
+                 refresh_margin: float = 600.0, root_url: Optional[str] = None):
+        self.default_token_path = Path(default_token_path)
+        self.tokens_dir = Path(tokens_dir)
+        self.client_secrets_path = Path(client_secrets_path)
+        self.scopes = scopes
+        self.idle_timeout = idle_timeout
+        self.max_clients = max_clients
+        self.refresh_margin = check_refresh_margin(refresh_margin)
+        self.root_url = root_url
+        self._clients: Dict[str, GmailClient] = {}
+        self._lock = threading.Lock()
+        # One build lock per account so concurrent first requests build the client once
+        self._build_locks: Dict[str, threading.Lock] = {}
+        self._last_sweep = time.monotonic()
+        self._stats = {'hits': 0, 'builds': 0, 'evictions': 0, 'build_failures': 0}
+
+    def token_path(self, account: str) -> Path:
+        if account == DEFAULT_ACCOUNT:
+            return self.default_token_path
+        return self.tokens_dir / f"{account}.json"
+
+    def get(self, account: Optional[str] = None) -> Optional[GmailClient]:
+        """The cached client for `account`, or None; never blocks on I/O"""
+        account = normalize_account(account)
+        with self._lock:
+            client = self._clients.get(account)
+            if client is not None:
+                client.last_used = time.monotonic()
+                self._stats['hits'] += 1
+        self._maybe_evict()
+        return client
+
+    def acquire(self, account: Optional[str] = None, interactive: bool = False) -> GmailClient:
+        """Cached client for `account`, building it on first use.
+
+        Building reads the token file and may refresh it, so call this from an
+        executor thread. Raises UnknownAccountError when there is no usable token.
+        """
+        client = self.get(account)
+        if client is not None:
+            return client
+        account = normalize_account(account)
+        with self._lock:
+            build_lock = self._build_locks.setdefault(account, threading.Lock())
+        with build_lock:
+            client = self.get(account)
+            if client is not None:
+                return client
+            try:
+                client = self._build(account, interactive)
+            except Exception:
+                with self._lock:
+                    self._build_locks.pop(account, None)
+                raise
+            with self._lock:
+                self._clients[account] = client
+                self._stats['builds'] += 1
+                overflow = len(self._clients) - self.max_clients
+            if overflow > 0:
+                self._evict_oldest(overflow)
+            return client
+
+    def _build(self, account: str, interactive: bool) -> GmailClient:
+        token_path = self.token_path(account)
+        if account != DEFAULT_ACCOUNT and not token_path.exists():
+            with self._lock:
+                self._stats['build_failures'] += 1
+            raise UnknownAccountError(f"Unknown Gmail account: {account}")
+        manager = GmailCredentialManager(
+            token_path=token_path,
+            client_secrets_path=self.client_secrets_path,
+            scopes=self.scopes,
+            refresh_margin=self.refresh_margin,
+        )
+        try:
+            manager.load(interactive=interactive and account == DEFAULT_ACCOUNT)
+        except LookupError as e:
+            with self._lock:
+                self._stats['build_failures'] += 1
+            raise UnknownAccountError(str(e)) from e
+        manager.start()
+        logger.info(f"Built Gmail client for account {account}")
+        return GmailClient(account, build_gmail_resource(self.root_url), manager)
+
+    def register(self, account: str, service: Any,
+                 credential_manager: Optional[GmailCredentialManager] = None) -> GmailClient:
+        """Put a ready-made client in the pool (offline benchmarks and fakes)"""
+        account = normalize_account(account)
+        client = GmailClient(account, service, credential_manager)
+        with self._lock:
+            previous = self._clients.pop(account, None)
+            self._clients[account] = client
+        if previous is not None:
+            previous.close()
+        return client
+
+    def _maybe_evict(self) -> None:
+        # A sweep is a scan of the pool; a few per idle period is plenty
+        now = time.monotonic()
+        if now - self._last_sweep >= self.idle_timeout / 4:
+            self._last_sweep = now
+            self.evict_idle(now)
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Drop clients unused for idle_timeout seconds; the default account stays"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            idle = [
+                account for account, client in self._clients.items()
+                if account != DEFAULT_ACCOUNT and now - client.last_used >= self.idle_timeout
+            ]
+            evicted = [self._clients.pop(account) for account in idle]
+            self._stats['evictions'] += len(evicted)
+        for client in evicted:
+            client.close()
+            logger.info(f"Evicted idle Gmail client for account {client.account}")
+        return len(evicted)
+
+    def _evict_oldest(self, count: int) -> None:
+        with self._lock:
+            candidates = sorted(
+                (client for account, client in self._clients.items() if account != DEFAULT_ACCOUNT),
+                key=lambda client: client.last_used,
+            )[:count]
+            for client in candidates:
+                del self._clients[client.account]
+            self._stats['evictions'] += len(candidates)
+        for client in candidates:
+            client.close()
+
+    def close(self) -> None:
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'clients': len(self._clients), 'accounts': sorted(self._clients), **self._stats}
@@ -0,0 +1,244 @@
+# Intent matching for process_voice_command: every trigger phrase of every intent is
+# compiled into one word trie, so a transcript is scanned once, then slot extractors
+# pull out recipient/subject/body (or location) and a confidence score says whether the
+# command is complete enough to act on without another LLM round trip.
+import json
+import logging
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Intent table: trigger phrases (with a weight for how strongly they imply the intent)
+# and the slots an intent needs before it can run without the LLM.
+# Override with a JSON file of the same shape via settings.VOICE_INTENTS_PATH.
+DEFAULT_INTENTS: Dict[str, Dict[str, Any]] = {
+    'email': {
+        'phrases': {
+            'send an email': 1.0, 'send email': 1.0, 'send a mail': 1.0, 'send a email': 1.0,
+            'write an email': 1.0, 'compose an email': 1.0, 'draft an email': 1.0,
+            'shoot an email': 1.0, 'drop an email': 1.0, 'email to': 1.0,
+            'send a message': 0.8, 'write a message': 0.8, 'compose a message': 0.8,
+            'send a note': 0.7, 'email': 0.6,
+        },
+        'required_slots': ['recipient', 'subject', 'body'],
+    },
+    'time': {
+        'phrases': {
+            'what time is it': 1.0, "what's the time": 1.0, 'what is the time': 1.0,
+            'current time': 1.0, 'local time': 0.9, 'time is it': 0.9, 'time in': 0.7,
+        },
+        'required_slots': ['location'],
+    },
+}
+
+# Commands at or above this confidence with every required slot filled can skip the LLM
+SKIP_LLM_THRESHOLD = 0.85
+# Weaker triggers (a bare "email" mid-sentence) are treated as mentions, not commands
+MIN_TRIGGER_WEIGHT = 0.7
+
+_EMAIL_ADDRESS = re.compile(r'\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b')
+# "john dot smith at gmail dot com"
+_SPOKEN_ADDRESS = re.compile(
+    r'\b([a-z0-9_+-]+(?: dot [a-z0-9_+-]+)*) at ([a-z0-9-]+(?: dot [a-z0-9-]+)+)\b'
+)
+_RECIPIENT_NAME = re.compile(
+    r"\b(?:to|email|message|mail|tell)\s+(?!(?:to|the|a|an|my|me|him|her|them|it|say|about|regarding|that)\b)"
+    r"([a-z][a-z'-]+)\b",
+)
+# A bare "body" marks the body anywhere; a bare "message" or "content" only after a comma
+# or "and" ("subject lunch, message see you"). The match takes the joining comma or "and"
+# with it, so the subject before it ends cleanly.
+_BODY = re.compile(
+    r"(?:(?:\s*,\s*|\s+and\s+)(?:message|content)\b"
+    r"|(?:\s*,\s*|\s+and\s+|\b)(?:saying|that says|and say|and tell (?:him|her|them)(?: that)?"
+    r"|tell (?:him|her|them)(?: that)?|with the body|(?:body|message|content)(?: is|:)|body\b))"
+    r"\s*:?\s+(?P<body>.+)",
+)
+_SUBJECT = re.compile(
+    r"\b(?:with the subject(?: line)?(?: of)?|subject(?: line)?(?: is|:)?|titled|entitled|about|regarding)"
+    r"\s*:?\s+(?P<subject>.+)",
+)
+_LOCATION = re.compile(
+    r"\b(?:in|at|for)\s+(?P<location>[a-z][a-z .'-]*?)(?:\s+(?:right now|now|today))?[?.!]*$",
+)
+
+
+@dataclass
+class IntentMatch:
+    intent: str
+    confidence: float
+    slots: Dict[str, str] = field(default_factory=dict)
+    missing_slots: List[str] = field(default_factory=list)
+    phrase: Optional[str] = None
+
+    @property
+    def detected(self) -> bool:
+        return self.intent != 'other'
+
+    @property
+    def skip_llm(self) -> bool:
+        return self.detected and not self.missing_slots and self.confidence >= SKIP_LLM_THRESHOLD
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'intent': self.intent,
+            'confidence': self.confidence,
+            'slots': self.slots,
+            'missing_slots': self.missing_slots,
+            'skip_llm': self.skip_llm,
+        }
+
+
+_PUNCTUATION = '.,!?;:"()'
+
+
+def _words(text: str) -> List[str]:
+    """Lower-cased words of a single-spaced string, one per space-separated token"""
+    # Apostrophes dropped so "what's" and "whats" are the same word
+    return [word.strip(_PUNCTUATION).replace("'", "") for word in text.lower().split(' ')]
+
+
+# Slot extractors search the lower-cased transcript (cheaper than IGNORECASE) and
+# slice values out of the original so subject and body keep their capitalisation
+
+def _extract_email_slots(text: str, lowered: str, trigger_end: int) -> Dict[str, str]:
+    slots: Dict[str, str] = {}
+    # Body first: it runs to the end and may itself contain "about" or an address
+    body_match = _BODY.search(lowered, trigger_end)
+    head_end = body_match.start() if body_match else len(lowered)
+    if body_match:
+        slots['body'] = text[body_match.start('body'):].rstrip('.!? ')
+
+    subject_match = _SUBJECT.search(lowered, trigger_end, head_end)
+    if subject_match:
+        slots['subject'] = text[subject_match.start('subject'):head_end].rstrip(',.;!? ')
+        head_end = subject_match.start()
+
+    # Recipient: a written address, a spoken one, or failing that a name
+    address = _EMAIL_ADDRESS.search(lowered, 0, head_end)
+    if address:
+        slots['recipient'] = address.group(0)
+    else:
+        spoken = _SPOKEN_ADDRESS.search(lowered, 0, head_end)
+        if spoken:
+            local, domain = (part.replace(' dot ', '.') for part in spoken.groups())
+            slots['recipient'] = f"{local}@{domain}"
+        else:
+            name = _RECIPIENT_NAME.search(lowered, max(0, trigger_end - len('email')), head_end)
+            if name:
+                slots['recipient_name'] = name.group(1)
+    return slots
+
+
+def _extract_time_slots(text: str, lowered: str, trigger_end: int) -> Dict[str, str]:
+    match = _LOCATION.search(lowered, max(0, trigger_end - len('in ')))
+    return {'location': text[match.start('location'):match.end('location')].strip()} if match else {}
+
+
+SLOT_EXTRACTORS = {
+    'email': _extract_email_slots,
+    'time': _extract_time_slots,
+}
+
+
+class IntentMatcher:
+    """Word-level trie over every intent's trigger phrases, plus slot extraction.
+
+    The trie is a multi-pattern automaton: a transcript is tokenized once and each
+    word position is extended only while it follows a phrase, so the cost grows
+    with the transcript, not with the number of phrases.
+    """
+
+    def __init__(self, intents: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.intents = intents or DEFAULT_INTENTS
+        self._trie: Dict[Optional[str], Any] = {}
+        for intent, spec in self.intents.items():
+            for phrase, weight in spec['phrases'].items():
+                node = self._trie
+                for word in _words(phrase):
+                    node = node.setdefault(word, {})
+                node[None] = (intent, phrase, float(weight))
+
+    def _triggers(self, words: List[str]):
+        """Yield (intent, phrase, weight, start word, end word) for the longest phrase at each position"""
+        trie = self._trie
+        for start in range(len(words)):
+            node = trie.get(words[start])
+            if node is None:
+                continue
+            found, end = node.get(None), start + 1
+            position = start + 1
+            while position < len(words):
+                node = node.get(words[position])
+                if node is None:
+                    break
+                position += 1
+                if None in node:
+                    found, end = node[None], position
+            if found is not None:
+                yield found + (start, end)
+
+    def match(self, text: str) -> IntentMatch:
+        text = " ".join((text or "").split())
+        lowered = text.lower()
+        if len(lowered) != len(text):  # a few non-ASCII characters change length when lower-cased
+            text = lowered
+        words = _words(text)
+        best = None
+        for intent, phrase, weight, start, end in self._triggers(words):
+            # A trigger at the start of the utterance is a command, not a mention
+            if start == 0:
+                weight = min(1.0, weight + 0.1)
+            if best is None or weight > best[2]:
+                best = (intent, phrase, weight, end)
+        if best is None or best[2] < MIN_TRIGGER_WEIGHT:
+            return IntentMatch(intent='other', confidence=0.0)
+
+        intent, phrase, weight, end = best
+        # Character offset just after the trigger's last word (words are single-space separated)
+        trigger_end = len(" ".join(text.split(' ')[:end]))
+        extractor = SLOT_EXTRACTORS.get(intent)
+        slots = extractor(text, lowered, trigger_end) if extractor else {}
+        required = self.intents[intent].get('required_slots', [])
+        missing = [slot for slot in required if slot not in slots]
+
+        # Phrase strength counts for 60%, filled required slots for the rest;
+        # a recipient known only by name counts as half a slot
+        filled = len(required) - len(missing)
+        if 'recipient' in missing and 'recipient_name' in slots:
+            filled += 0.5
+        slot_score = filled / len(required) if required else 1.0
+        confidence = round(0.6 * weight + 0.4 * slot_score, 3)
+        return IntentMatch(intent=intent, confidence=confidence, slots=slots, missing_slots=missing, phrase=phrase)
+
+
+def load_intents(path: Union[str, Path]) -> Dict[str, Dict[str, Any]]:
+    """Read an intent table from JSON; phrases may be a list (weight 1.0) or a phrase->weight map"""
+    with open(path, 'r', encoding='utf-8') as handle:
+        table = json.load(handle)
+    for spec in table.values():
+        if isinstance(spec.get('phrases'), list):
+            spec['phrases'] = {phrase: 1.0 for phrase in spec['phrases']}
+    return table
+
+
+_matcher: Optional[IntentMatcher] = None
+
+
+def get_intent_matcher() -> IntentMatcher:
+    """Process-wide matcher, compiled on first use from settings.VOICE_INTENTS_PATH or the defaults"""
+    global _matcher
+    if _matcher is None:
+        from django.conf import settings
+        path = getattr(settings, 'VOICE_INTENTS_PATH', None)
+        intents = None
+        if path:
+            try:
+                intents = load_intents(path)
+            except (OSError, ValueError) as e:
+                logger.error(f"Could not load intents from {path}, using defaults: {e}")
+        _matcher = IntentMatcher(intents)
+    return _matcher
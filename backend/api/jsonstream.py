@@ -0,0 +1,118 @@
+# Incremental readers for large JSON request bodies: a top-level JSON array or
+# newline-delimited JSON, parsed item by item from a file-like object so memory
+# stays proportional to one item, not to the whole body.
+import codecs
+import json
+from typing import Any, BinaryIO, Iterator, Tuple
+
+CHUNK_SIZE = 64 * 1024
+# Largest single item (array element or NDJSON line) accepted, in bytes
+MAX_ITEM_SIZE = 1024 * 1024
+
+_WHITESPACE = ' \t\r\n'
+
+
+class StreamFormatError(ValueError):
+    """The body is not a JSON array / NDJSON stream, or an item is too large"""
+
+
+def sniff_array(stream: BinaryIO) -> Tuple[bool, bytes]:
+    """Read up to the first non-whitespace byte; returns (is_array, bytes consumed)"""
+    consumed = b''
+    while True:
+        chunk = stream.read(1)
+        if not chunk:
+            return False, consumed
+        consumed += chunk
+        if chunk not in b' \t\r\n\xef\xbb\xbf':  # whitespace or a UTF-8 BOM
+            return chunk == b'[', consumed
+
+
+def iter_ndjson(stream: BinaryIO, prefix: bytes = b'') -> Iterator[Tuple[Any, str]]:
+    """Yield (item, error) per non-blank line; a bad line yields (None, message) and reading continues"""
+    pending = prefix.lstrip(b'\xef\xbb\xbf')  # UTF-8 BOM
+    while True:
+        line = stream.readline(MAX_ITEM_SIZE + 1)
+        if pending:
+            line, pending = pending + line, b''
+        if not line:
+            return
+        if len(line) > MAX_ITEM_SIZE and not line.endswith(b'\n'):
+            # Skip the rest of an oversized line without holding it in memory
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(CHUNK_SIZE)
+            yield None, f"Line longer than {MAX_ITEM_SIZE} bytes"
+            continue
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line), None
+        except ValueError as e:  # JSONDecodeError and bad UTF-8
+            yield None, f"Invalid JSON: {e}"
+
+
+def iter_json_array(stream: BinaryIO, prefix: bytes = b'') -> Iterator[Any]:
+    """Yield the elements of a top-level JSON array one at a time.
+
+    Raises StreamFormatError when the body is malformed; elements already
+    yielded stay valid, but nothing after the error can be recovered.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8-sig')()
+    buffer = utf8.decode(prefix)
+    pos = 0
+    eof = False
+
+    def fill() -> None:
+        nonlocal buffer, pos, eof
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            eof = True
+        # Drop consumed text only now and then; slicing per element would copy the buffer each time
+        if pos > CHUNK_SIZE:
+            buffer, pos = buffer[pos:], 0
+        buffer += utf8.decode(chunk, final=eof)
+
+    def skip_whitespace() -> None:
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    skip_whitespace()
+    if pos >= len(buffer) or buffer[pos] != '[':
+        raise StreamFormatError("Expected a JSON array")
+    pos += 1
+    skip_whitespace()
+    if pos < len(buffer) and buffer[pos] == ']':
+        return
+
+    while True:
+        skip_whitespace()
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(buffer) or eof:
+                    break
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise StreamFormatError(f"Invalid JSON array: {e.msg}") from e
+            if len(buffer) - pos > MAX_ITEM_SIZE:
+                raise StreamFormatError(f"Array element longer than {MAX_ITEM_SIZE} bytes")
+            fill()
+        pos = end
+        yield item
+
+        skip_whitespace()
+        if pos >= len(buffer):
+            raise StreamFormatError("Unterminated JSON array")
+        if buffer[pos] == ']':
+            return
+        if buffer[pos] != ',':
+            raise StreamFormatError(f"Expected ',' or ']' at offset {pos}")
+        pos += 1
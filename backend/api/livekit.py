@@ -0,0 +1,112 @@
+# LiveKit access tokens for the frontend. Signed tokens are cached by
+# (room, identity, name, metadata, grants) and handed out again until shortly
+# before they expire, so reconnect storms do not re-sign a JWT per request.
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, Counter
+from datetime import timedelta
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Grants a caller may switch off for a participant; everything else stays at LiveKit's defaults
+ALLOWED_GRANTS = ('can_publish', 'can_subscribe', 'can_publish_data')
+
+
+class LiveKitTokenCache:
+    """Mints LiveKit JWTs and reuses them until `refresh_margin` before expiry"""
+
+    def __init__(self, api_key: Optional[str] = None, api_secret: Optional[str] = None,
+                 ttl: float = 6 * 3600, refresh_margin: float = 600, max_entries: int = 10000,
+                 enabled: bool = True):
+        # Read once; the environment does not change while the process runs
+        self.api_key = api_key or os.getenv('LIVEKIT_API_KEY')
+        self.api_secret = api_secret or os.getenv('LIVEKIT_API_SECRET')
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._entries: "OrderedDict[Tuple, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: Counter = Counter()
+
+    @staticmethod
+    def clean_grants(grants: Optional[Dict[str, Any]]) -> Tuple[Tuple[str, bool], ...]:
+        """Validated, hashable grants; raises ValueError for anything not in ALLOWED_GRANTS"""
+        grants = grants or {}
+        if not isinstance(grants, dict):
+            raise ValueError("grants must be an object")
+        unknown = sorted(set(grants) - set(ALLOWED_GRANTS))
+        if unknown:
+            raise ValueError(f"Unsupported grants: {', '.join(unknown)}")
+        if not all(isinstance(value, bool) for value in grants.values()):
+            raise ValueError("grant values must be true or false")
+        return tuple(sorted(grants.items()))
+
+    def _mint(self, room: str, identity: str, name: str, metadata: Optional[str],
+              grants: Tuple[Tuple[str, bool], ...]) -> str:
+        from livekit import api  # livekit-api pulls in aiohttp; only load it when a token is requested
+
+        token = api.AccessToken(self.api_key, self.api_secret) \
+            .with_identity(identity) \
+            .with_name(name) \
+            .with_ttl(timedelta(seconds=self.ttl)) \
+            .with_grants(api.VideoGrants(room_join=True, room=room, **dict(grants)))
+        if metadata:
+            token = token.with_metadata(metadata)
+        return token.to_jwt()
+
+    def get(self, room: str, identity: str, name: Optional[str] = None, metadata: Optional[str] = None,
+            grants: Optional[Dict[str, Any]] = None) -> Tuple[str, float]:
+        """Return (jwt, expires_at epoch seconds), signing a new token only when needed"""
+        name = name or identity
+        grant_items = self.clean_grants(grants)
+        key = (room, identity, name, metadata or '', grant_items)
+        now = time.time()
+        if self.enabled:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] - self.refresh_margin > now:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return entry[1], entry[0]
+
+        # JWT expiry is truncated to whole seconds
+        expires_at = float(int(now + self.ttl))
+        jwt = self._mint(room, identity, name, metadata, grant_items)
+        with self._lock:
+            self._stats['minted'] += 1
+            if self.enabled:
+                self._entries[key] = (expires_at, jwt)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._stats['evictions'] += 1
+        return jwt, expires_at
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'entries': len(self._entries), **self._stats}
+
+
+_token_cache: Optional[LiveKitTokenCache] = None
+_token_cache_lock = threading.Lock()
+
+
+def get_token_cache() -> LiveKitTokenCache:
+    """Process-wide token cache configured from settings"""
+    global _token_cache
+    if _token_cache is None:
+        from django.conf import settings
+        with _token_cache_lock:
+            if _token_cache is None:
+                _token_cache = LiveKitTokenCache(
+                    api_key=settings.LIVEKIT_API_KEY,
+                    api_secret=settings.LIVEKIT_API_SECRET,
+                    ttl=settings.LIVEKIT_TOKEN_TTL,
+                    refresh_margin=settings.LIVEKIT_TOKEN_REFRESH_MARGIN,
+                    enabled=settings.LIVEKIT_TOKEN_CACHE_ENABLED,
+                )
+    return _token_cache
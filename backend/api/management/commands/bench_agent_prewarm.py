@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# The plugin constructors only check that a key is present; nothing here talks to the providers
+DUMMY_PROVIDER_KEYS = {'DEEPGRAM_API_KEY': 'bench', 'ELEVEN_API_KEY': 'bench', 'GOOGLE_API_KEY': 'bench'}
+
+
+class Command(BaseCommand):
+    help = (
+        "First-turn latency of the Call.py agent with and without prewarm(). Each round starts a "
+        "fresh process (like a LiveKit job process) and times what a job needs before its first "
+        "email can go out: plugin imports, the session models, the AIService and a send through "
+        "the email tool. Without --real the AIService is an offline one (fake Gmail) whose build "
+        "sleeps --service-init seconds in place of the Gemini and Gmail setup."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=3)
+        parser.add_argument('--service-init', type=float, default=2.0,
+                            help='Simulated AIService build time in seconds (offline mode)')
+        parser.add_argument('--real', action='store_true', help='Build the real AIService (needs API keys)')
+        parser.add_argument('--child', choices=['cold', 'prewarmed'], help=argparse.SUPPRESS)
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['child']:
+            self.stdout.write(json.dumps(asyncio.run(self._child(options))))
+            return
+
+        env = dict(DUMMY_PROVIDER_KEYS, **os.environ)
+        report = {}
+        for mode in ('cold', 'prewarmed'):
+            runs = []
+            for _ in range(options['rounds']):
+                command = [sys.executable, 'manage.py', 'bench_agent_prewarm', '--child', mode,
+                           '--service-init', str(options['service_init'])]
+                if options['real']:
+                    command.append('--real')
+                result = subprocess.run(command, cwd=str(settings.BASE_DIR), env=env,
+                                        capture_output=True, text=True)
+                if result.returncode != 0:
+                    raise CommandError(f"{mode} run failed:\n{result.stderr[-2000:]}")
+                runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+            report[mode] = {
+                key: round(statistics.median(run[key] for run in runs), 3) for key in runs[0]
+            }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        columns = ['prewarm_s', 'plugins_s', 'models_s', 'ai_service_s', 'first_email_s', 'first_turn_s']
+        self.stdout.write(f"{'mode':<10} | " + " | ".join(f"{c:>13}" for c in columns))
+        for mode, row in report.items():
+            self.stdout.write(f"{mode:<10} | " + " | ".join(f"{row.get(c, 0.0):>13}" for c in columns))
+
+    async def _child(self, options):
+        """One job process: optionally prewarm, then time the first turn"""
+        from api import Call
+        from api.tools import ai_service_registry, send_email_tool
+
+        if not options['real']:
+            from api.benchmarking import make_offline_service
+            from api.fakes import FakeGmailService
+
+            def offline_service():
+                time.sleep(options['service_init'])
+                return make_offline_service(gmail_service=FakeGmailService(latency=0.0))
+            ai_service_registry.factory = offline_service
+
+        timings = {}
+        proc = SimpleNamespace(userdata={}, pid=os.getpid())  # the parts of JobProcess prewarm uses
+        if options['child'] == 'prewarmed':
+            started = time.perf_counter()
+            # prewarm runs on the process's main thread before any job is assigned
+            Call.prewarm(proc)
+            timings['prewarm_s'] = time.perf_counter() - started
+
+        # The job starts here: the same steps entrypoint() and the first send_email call take
+        job_started = time.perf_counter()
+        ai_service_registry.start()  # entrypoint's warm_up_ai_service(), a no-op after prewarm
+        plugins = proc.userdata.get('plugins') or Call._load_plugins()
+        timings['plugins_s'] = time.perf_counter() - job_started
+
+        started = time.perf_counter()
+        Call._build_models(plugins)
+        timings['models_s'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        service = await ai_service_registry.get()
+        if service is None:
+            raise CommandError(f"AIService failed: {ai_service_registry.status()}")
+        await service.get_gmail_client()
+        timings['ai_service_s'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        result = await send_email_tool('bench@example.com', 'Prewarm benchmark', 'Hello', enqueue=False)
+        if not result.startswith('Email successfully sent'):
+            raise CommandError(result)
+        timings['first_email_s'] = time.perf_counter() - started
+        timings['first_turn_s'] = time.perf_counter() - job_started
+        timings.setdefault('prewarm_s', 0.0)
+        return {key: round(value, 4) for key, value in timings.items()}
+
@@ -0,0 +1,172 @@
+import asyncio
+import base64
+import gc
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarking import make_offline_service
+from api.fakes import GmailStubServer
+from api.mime_stream import Attachment
+
+MB = 1024 * 1024
+
+
+class RSSSampler:
+    """Peak resident set size of this process, polled from /proc/self/statm on a thread"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def rss() -> int:
+        with open('/proc/self/statm') as handle:
+            return int(handle.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self.rss()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.rss())
+
+
+class Command(BaseCommand):
+    help = (
+        "Peak memory of sending one email with large attachments: the streamed resumable "
+        "upload (api/mime_stream.py, AIService UPLOAD_CHUNK_SIZE chunks) against building the "
+        "whole message as base64 'raw' in memory. Both go to a local Gmail stub with the 35MB "
+        "limit lifted; the stub's SHA-256 of the upload is checked against the stream. Linux only "
+        "(/proc/self/statm)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--total-mb', type=int, default=100, help='Attachment bytes in total')
+        parser.add_argument('--files', type=int, default=4, help='Split over this many attachments')
+        parser.add_argument('--chunk-kb', type=int, help='Default: AIService UPLOAD_CHUNK_SIZE')
+        parser.add_argument('--latency', type=float, default=0.005, help='Stub latency per request (s)')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Stub injected 503 rate')
+        parser.add_argument('--skip-inline', action='store_true', help='Only measure the streamed upload')
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        if not os.path.exists('/proc/self/statm'):
+            raise CommandError("Needs /proc/self/statm to sample memory")
+        directory = tempfile.mkdtemp(prefix='bench-attachments-')
+        try:
+            paths = self._write_files(directory, options['total_mb'] * MB, options['files'])
+            with GmailStubServer(latency=options['latency'], error_rate=options['error_rate'], seed=7) as stub:
+                service = make_offline_service(gmail_service=stub.build_client(max_upload_bytes=2 ** 40))
+                service.config.MAX_MESSAGE_BYTES = 2 ** 40
+                service.config.MAX_RETRIES = max(service.config.MAX_RETRIES, 10)
+                if options['chunk_kb']:
+                    service.config.UPLOAD_CHUNK_SIZE = options['chunk_kb'] * 1024
+                try:
+                    # Streamed first: memory the inline run takes is not always returned to the OS
+                    report = {'streamed': self._measure(self._streamed, service, stub, paths)}
+                    if not options['skip_inline']:
+                        report['inline'] = self._measure(self._inline, service, stub, paths)
+                finally:
+                    service.close()
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        report['settings'] = {
+            'attachment_mb': options['total_mb'], 'files': options['files'],
+            'chunk_kb': service.config.UPLOAD_CHUNK_SIZE // 1024, 'error_rate': options['error_rate'],
+            'injected_errors': stub.stats.get('injected_errors', 0),
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.stdout.write(f"{'mode':<9} | {'message_mb':>10} | {'elapsed_s':>9} | {'baseline_mb':>11} | "
+                              f"{'peak_mb':>8} | {'delta_mb':>8} | {'verified':>8}")
+            for mode in ('streamed', 'inline'):
+                row = report.get(mode)
+                if row:
+                    self.stdout.write(f"{mode:<9} | {row['message_mb']:>10} | {row['elapsed_s']:>9} | "
+                                      f"{row['baseline_mb']:>11} | {row['peak_mb']:>8} | {row['delta_mb']:>8} | "
+                                      f"{str(row['verified']):>8}")
+            self.stdout.write(f"settings: {report['settings']}")
+        if not report['streamed']['verified']:
+            raise CommandError("The stub received different bytes than the streamed message")
+
+    @staticmethod
+    def _write_files(directory, total, count):
+        paths = []
+        block = os.urandom(MB)
+        for i in range(count):
+            size = total // count + (1 if i < total % count else 0)
+            path = os.path.join(directory, f"attachment-{i + 1}.bin")
+            with open(path, 'wb') as handle:
+                for offset in range(0, size, MB):
+                    handle.write(block[:min(MB, size - offset)])
+            paths.append(path)
+        return paths
+
+    def _measure(self, run, service, stub, paths):
+        gc.collect()
+        baseline = RSSSampler.rss()
+        started = time.perf_counter()
+        with RSSSampler() as sampler:
+            size, digest = asyncio.run(run(service, paths))
+        elapsed = time.perf_counter() - started
+        received = stub.uploaded[-1] if stub.uploaded else None
+        return {
+            'message_mb': round(size / MB, 1),
+            'elapsed_s': round(elapsed, 2),
+            'baseline_mb': round(baseline / MB, 1),
+            'peak_mb': round(sampler.peak / MB, 1),
+            'delta_mb': round((sampler.peak - baseline) / MB, 1),
+            'verified': None if digest is None else received == {'bytes': size, 'sha256': digest},
+        }
+
+    @staticmethod
+    async def _streamed(service, paths):
+        message = service._create_email_upload('bench@example.com', 'Attachments', 'See attached',
+                                               [Attachment.from_path(path) for path in paths])
+        # Hash what will be sent, a chunk at a time, to check against what the stub received
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: message.read(service.config.UPLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+        message.seek(0)
+        size = message.size
+        await service._send_email_upload(message)
+        return size, digest.hexdigest()
+
+    @staticmethod
+    async def _inline(service, paths):
+        # The usual way: every attachment read, encoded into the message, and the message
+        # base64-encoded again into a JSON 'raw' body
+        message = MIMEMultipart()
+        message['to'] = 'bench@example.com'
+        message['subject'] = 'Attachments'
+        message.attach(MIMEText('See attached'))
+        for path in paths:
+            with open(path, 'rb') as handle:
+                part = MIMEApplication(handle.read(), Name=os.path.basename(path))
+            part.add_header('Content-Disposition', 'attachment', filename=os.path.basename(path))
+            message.attach(part)
+        raw = message.as_bytes()
+        await service._send_email_message({'raw': base64.urlsafe_b64encode(raw).decode()})
+        return len(raw), None
@@ -0,0 +1,73 @@
+import asyncio
+import json
+import random
+
+from django.core.management.base import BaseCommand
+from voice_common.chat_window import ChatWindow, Entry, estimate_tokens
+
+from api.benchmarking import build_corpus
+
+
+class Command(BaseCommand):
+    help = (
+        "Prompt size and modelled LLM time to first token per turn over a long synthetic call, "
+        "sending the full history versus the bounded chat context (voice_common/chat_window.py) with a "
+        "fake summarizer taking --summary-latency seconds. TTFT is modelled as --base-ttft plus "
+        "--ttft-per-1k seconds per thousand prompt tokens. Time runs --speed times faster than real."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--turns', type=int, default=120)
+        parser.add_argument('--window-turns', type=int, default=6)
+        parser.add_argument('--window-tokens', type=int, default=2000)
+        parser.add_argument('--reply-words', type=int, default=45, help='Agent reply length')
+        parser.add_argument('--turn-interval', type=float, default=8.0, help='Seconds between user turns')
+        parser.add_argument('--summary-latency', type=float, default=2.5)
+        parser.add_argument('--base-ttft', type=float, default=0.3)
+        parser.add_argument('--ttft-per-1k', type=float, default=0.12)
+        parser.add_argument('--speed', type=float, default=50.0)
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        report = asyncio.run(self._run(options))
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(f"{'turn':>5} | {'full_tokens':>11} | {'full_ttft_s':>11} | "
+                          f"{'window_tokens':>13} | {'window_ttft_s':>13}")
+        for row in report['turns']:
+            self.stdout.write(f"{row['turn']:>5} | {row['full_tokens']:>11} | {row['full_ttft_s']:>11} | "
+                              f"{row['window_tokens']:>13} | {row['window_ttft_s']:>13}")
+        self.stdout.write(f"window stats: {report['window']}")
+
+    async def _run(self, options):
+        speed = options['speed']
+        rng = random.Random(5)
+        corpus = [row['text'] for row in build_corpus(options['turns'])]
+        words = " ".join(corpus).split()
+
+        async def summarize(prompt):
+            await asyncio.sleep(options['summary_latency'] / speed)
+            return " ".join(prompt.split()[-120:])
+
+        def ttft(tokens):
+            return round(options['base_ttft'] + options['ttft_per_1k'] * tokens / 1000, 3)
+
+        window = ChatWindow(summarize, max_turns=options['window_turns'], max_tokens=options['window_tokens'])
+        history = [Entry('system', 'system', "You are a helpful voice AI assistant. " * 8)]
+        checkpoints = {1, 10, 30, 60, 90, options['turns']}
+        rows = []
+        for turn in range(1, options['turns'] + 1):
+            history.append(Entry(f'u{turn}', 'user', corpus[turn - 1]))
+            plan = window.plan(history)
+            full = sum(estimate_tokens(entry.text) for entry in history)
+            if turn in checkpoints:
+                rows.append({
+                    'turn': turn, 'full_tokens': full, 'full_ttft_s': ttft(full),
+                    'window_tokens': plan.prompt_tokens, 'window_ttft_s': ttft(plan.prompt_tokens),
+                })
+            reply = " ".join(rng.choice(words) for _ in range(options['reply_words']))
+            history.append(Entry(f'a{turn}', 'assistant', reply))
+            await asyncio.sleep(options['turn_interval'] / speed)
+        await window.aclose()
+        return {'turns': rows, 'window': window.stats()}
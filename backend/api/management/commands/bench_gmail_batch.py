@@ -0,0 +1,66 @@
+import asyncio
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.benchmarking import make_offline_service
+from api.fakes import GmailStubServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-message latency of one-request-per-email sends against "
+        "AIService.send_emails_bulk (Gmail HTTP batch requests), both against a "
+        "local Gmail stub with --latency seconds per round trip."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=500)
+        parser.add_argument('--latency', type=float, default=0.05, help='Stub round-trip latency in seconds')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        messages = [
+            {"to": f"user{i}@example.com", "subject": f"Campaign {i}", "body": "Hello from the campaign"}
+            for i in range(options['messages'])
+        ]
+        with GmailStubServer(latency=options['latency']) as stub:
+            service = make_offline_service(gmail_service=stub.build_client())
+            if options['batch_size']:
+                service.config.GMAIL_BATCH_SIZE = options['batch_size']
+            try:
+                report = {
+                    "single": asyncio.run(self._run_single(service, messages)),
+                    "bulk": asyncio.run(self._run_bulk(service, messages)),
+                }
+            finally:
+                service.close()
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(f"{'mode':<8} | {'sent':>6} | {'elapsed_s':>9} | {'per_msg_ms':>10}")
+        for mode, row in report.items():
+            self.stdout.write(f"{mode:<8} | {row['sent']:>6} | {row['elapsed_s']:>9} | {row['per_msg_ms']:>10}")
+
+    async def _run_single(self, service, messages):
+        started = time.perf_counter()
+        results = await asyncio.gather(*(
+            service.send_email(m['to'], m['subject'], m['body']) for m in messages
+        ))
+        return self._row(results, time.perf_counter() - started)
+
+    async def _run_bulk(self, service, messages):
+        started = time.perf_counter()
+        results = await service.send_emails_bulk(messages)
+        return self._row(results, time.perf_counter() - started)
+
+    @staticmethod
+    def _row(results, elapsed):
+        return {
+            "sent": sum(1 for r in results if r.get("status") == "success"),
+            "elapsed_s": round(elapsed, 3),
+            "per_msg_ms": round(elapsed / len(results) * 1000, 3),
+        }
@@ -0,0 +1,110 @@
+import json
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from api.benchmarking import percentile
+from api.gmail_pool import GmailClientPool
+
+
+def _write_tokens(directory: Path, accounts):
+    """Token files that stay valid for a day, so nothing tries to refresh"""
+    expiry = (datetime.utcnow() + timedelta(days=1)).strftime('%Y-%m-%dT%H:%M:%SZ')
+    for account in accounts:
+        (directory / f"{account}.json").write_text(json.dumps({
+            "token": f"token-{account}", "refresh_token": f"refresh-{account}",
+            "client_id": "bench", "client_secret": "bench",
+            "token_uri": "https://oauth2.googleapis.com/token", "expiry": expiry,
+        }))
+
+
+def _timed(func, iterations):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return {
+        "samples": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 4),
+        "p95_ms": round(percentile(samples, 95) * 1000, 4),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 4),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure Gmail client acquisition: build('gmail', 'v1') per use (the old per-AIService "
+        "path) against GmailClientPool cold builds (static discovery document) and warm hits, "
+        "plus concurrent acquisition across accounts from many threads."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--accounts', type=int, default=20)
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        from google.oauth2.credentials import Credentials
+        from googleapiclient.discovery import build
+
+        accounts = [f"user{i}" for i in range(options['accounts'])]
+        iterations = options['iterations']
+        with tempfile.TemporaryDirectory() as tmp:
+            tokens_dir = Path(tmp)
+            _write_tokens(tokens_dir, accounts)
+
+            def make_pool():
+                return GmailClientPool(
+                    default_token_path=tokens_dir / 'default.json', tokens_dir=tokens_dir,
+                    client_secrets_path=tokens_dir / 'credentials.json', scopes=['https://www.googleapis.com/auth/gmail.send'],
+                )
+
+            credentials = Credentials(token='bench')
+            report = {
+                "build_per_use": _timed(
+                    lambda: build('gmail', 'v1', credentials=credentials, cache_discovery=False), iterations),
+            }
+
+            def cold():
+                pool = make_pool()
+                pool.acquire(accounts[0])
+                pool.close()
+            report["pool_cold"] = _timed(cold, iterations)
+
+            pool = make_pool()
+            pool.acquire(accounts[0])
+            report["pool_warm"] = _timed(lambda: pool.acquire(accounts[0]), iterations * 100)
+            pool.close()
+
+            # Many threads racing for the same accounts must build each client exactly once
+            pool = make_pool()
+            requests = [accounts[i % len(accounts)] for i in range(iterations * len(accounts))]
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+                clients = list(executor.map(pool.acquire, requests))
+            elapsed = time.perf_counter() - started
+            stats = pool.stats()
+            report["concurrent"] = {
+                "acquisitions": len(clients),
+                "threads": options['threads'],
+                "elapsed_s": round(elapsed, 3),
+                "per_acquire_us": round(elapsed / len(clients) * 1e6, 1),
+                "builds": stats['builds'],
+                "distinct_clients": len({id(client) for client in clients}),
+            }
+            pool.close()
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(f"{'mode':<14} | {'p50_ms':>9} | {'p95_ms':>9} | {'mean_ms':>9}")
+        for mode in ("build_per_use", "pool_cold", "pool_warm"):
+            row = report[mode]
+            self.stdout.write(f"{mode:<14} | {row['p50_ms']:>9} | {row['p95_ms']:>9} | {row['mean_ms']:>9}")
+        self.stdout.write(f"concurrent     | {report['concurrent']}")
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarking import run_http_load, wait_for_http, print_table
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test an API endpoint and report requests/sec and p50/p95/p99. "
+        "With --spawn, starts the WSGI (gunicorn) and ASGI (uvicorn) servers "
+        "side by side and compares them on the same path."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/health/', help='Endpoint path to hit')
+        parser.add_argument('--method', default='GET')
+        parser.add_argument('--body', default=None, help='JSON request body')
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--workers', type=int, default=2, help='Server worker processes (with --spawn)')
+        parser.add_argument('--target', action='append', default=[],
+                            help='name=base_url of an already running server, may be repeated')
+        parser.add_argument('--spawn', action='store_true', help='Start WSGI and ASGI servers locally')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        payload = json.loads(options['body']) if options['body'] else None
+        targets = {}
+        for target in options['target']:
+            name, _, url = target.partition('=')
+            if not url:
+                raise CommandError(f"--target must look like name=http://host:port, got {target!r}")
+            targets[name] = url.rstrip('/')
+
+        servers = []
+        if options['spawn']:
+            servers, spawned = self._spawn_servers(options['workers'])
+            targets.update(spawned)
+        if not targets:
+            raise CommandError("Nothing to benchmark: pass --target name=url or --spawn")
+
+        report = {}
+        try:
+            for name, base_url in targets.items():
+                url = base_url + options['path']
+                asyncio.run(wait_for_http(base_url + '/api/health/'))
+                # Short warm-up so lazy initialisation is not counted
+                asyncio.run(run_http_load(url, options['method'], payload, concurrency=4, total=50))
+                report[name] = asyncio.run(run_http_load(
+                    url, options['method'], payload,
+                    concurrency=options['concurrency'], total=options['requests'],
+                ))
+        finally:
+            for proc in servers:
+                proc.send_signal(signal.SIGTERM)
+                try:
+                    proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            print_table(self.stdout, report)
+
+    def _spawn_servers(self, workers):
+        """Start gunicorn (WSGI) and uvicorn (ASGI) on local ports"""
+        # Plain sync workers for WSGI: LiveKit plugins refuse to register from
+        # a gthread worker thread, so --threads cannot be used here.
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='backend.settings')
+        cwd = str(settings.BASE_DIR)
+        commands = {
+            'wsgi': [sys.executable, '-m', 'gunicorn', 'backend.wsgi:application',
+                     '-b', '127.0.0.1:8101', '-w', str(workers), '--log-level', 'warning'],
+            'asgi': [sys.executable, '-m', 'uvicorn', 'backend.asgi:application',
+                     '--host', '127.0.0.1', '--port', '8102', '--workers', str(workers),
+                     '--log-level', 'warning', '--no-access-log'],
+        }
+        urls = {'wsgi': 'http://127.0.0.1:8101', 'asgi': 'http://127.0.0.1:8102'}
+        procs = [subprocess.Popen(cmd, cwd=cwd, env=env) for cmd in commands.values()]
+        return procs, urls
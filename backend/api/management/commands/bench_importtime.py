@@ -0,0 +1,60 @@
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarking import IMPORT_TARGETS, LAZY_IMPORTS, eager_imports
+
+
+def measure(code: str, cwd: str):
+    """Run `code` under `python -X importtime`; return total ms and the heaviest top-level imports"""
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=cwd, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        raise CommandError(f"Import failed:\n{completed.stderr[-2000:]}")
+
+    total_us = 0
+    modules = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name[1:].startswith(' '):  # top-level import (no nesting indent)
+            total_us += int(cumulative)
+            modules.append((int(cumulative), name.strip()))
+    modules.sort(reverse=True)
+    return total_us / 1000, [(module, round(us / 1000, 1)) for us, module in modules[:5]]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure start-up import cost with `python -X importtime` for the Django app, "
+        "AIService and the LiveKit agent, and fail if any of them imports a package it must "
+        "leave to first use (api.benchmarking.LAZY_IMPORTS). Times vary by machine and are "
+        "only reported; the lazy-import rules are what CI checks (api.tests.ImportBoundaryTests)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3, help='Fresh interpreters per target; the fastest run counts')
+        parser.add_argument('--target', action='append', choices=sorted(IMPORT_TARGETS),
+                            help='Only measure these targets')
+
+    def handle(self, *args, **options):
+        cwd = str(settings.BASE_DIR)
+        violations = []
+        for name in options['target'] or IMPORT_TARGETS:
+            runs = [measure(IMPORT_TARGETS[name], cwd) for _ in range(max(1, options['runs']))]
+            total_ms, heaviest = min(runs, key=lambda run: run[0])
+            self.stdout.write(f"{name:<8} {total_ms:>9.1f} ms   heaviest: "
+                              + ", ".join(f"{module} {ms}ms" for module, ms in heaviest))
+            eager = eager_imports(name, cwd)
+            if eager:
+                violations.append(f"{name} imports {', '.join(eager)} at start-up")
+
+        if violations:
+            raise CommandError("Eager imports (see LAZY_IMPORTS):\n  " + "\n  ".join(violations))
+        self.stdout.write(self.style.SUCCESS(
+            f"No eager imports of {', '.join(sorted(set().union(*LAZY_IMPORTS.values())))}"))
@@ -0,0 +1,99 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.benchmarking import build_corpus, percentile
+from api.intents import IntentMatcher
+
+# The keyword scan process_voice_command used before the compiled matcher
+LEGACY_EMAIL_KEYWORDS = [
+    'send an email', 'send email', 'write an email', 'compose an email',
+    'email to', 'send a message', 'write a message', 'compose a message'
+]
+
+def legacy_match(text: str) -> str:
+    text = text.lower()
+    return 'email' if any(keyword in text for keyword in LEGACY_EMAIL_KEYWORDS) else 'other'
+
+
+class Command(BaseCommand):
+    help = (
+        "Throughput and accuracy of the compiled intent matcher (api/intents.py) against the "
+        "old keyword scan over a labelled corpus of transcripts (synthetic, or --corpus JSONL "
+        "with text/intent/recipient fields)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=5000, help='Synthetic corpus size')
+        parser.add_argument('--corpus', help='JSONL file with {"text", "intent", "recipient"} per line')
+        parser.add_argument('--rounds', type=int, default=3, help='Passes over the corpus; the fastest counts')
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['corpus']:
+            with open(options['corpus'], 'r', encoding='utf-8') as handle:
+                corpus = [json.loads(line) for line in handle if line.strip()]
+        else:
+            corpus = build_corpus(options['size'])
+
+        started = time.perf_counter()
+        matcher = IntentMatcher()
+        compile_ms = round((time.perf_counter() - started) * 1000, 2)
+
+        report = {
+            'transcripts': len(corpus),
+            'compile_ms': compile_ms,
+            'legacy': self._measure(corpus, lambda text: (legacy_match(text), None), options['rounds']),
+            'compiled': self._measure(corpus, lambda text: self._compiled(matcher, text), options['rounds']),
+        }
+        skip = sum(1 for row in corpus if matcher.match(row['text']).skip_llm)
+        report['compiled']['skip_llm_rate'] = round(skip / len(corpus), 4)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(f"{len(corpus)} transcripts, matcher compiled in {compile_ms}ms")
+        self.stdout.write(f"{'matcher':<9} | {'per_s':>9} | {'p50_us':>7} | {'p99_us':>7} | "
+                          f"{'intent_acc':>10} | {'recipient_acc':>13}")
+        for name in ('legacy', 'compiled'):
+            row = report[name]
+            self.stdout.write(f"{name:<9} | {row['per_s']:>9} | {row['p50_us']:>7} | {row['p99_us']:>7} | "
+                              f"{row['intent_accuracy']:>10} | {str(row['recipient_accuracy']):>13}")
+        self.stdout.write(f"compiled matcher lets {report['compiled']['skip_llm_rate']:.1%} of transcripts skip the LLM")
+
+    @staticmethod
+    def _compiled(matcher, text):
+        match = matcher.match(text)
+        return match.intent, match.slots.get('recipient')
+
+    @staticmethod
+    def _measure(corpus, classify, rounds):
+        best = None
+        for _ in range(max(1, rounds)):
+            latencies = []
+            outputs = []
+            started = time.perf_counter()
+            for row in corpus:
+                t0 = time.perf_counter()
+                outputs.append(classify(row['text']))
+                latencies.append(time.perf_counter() - t0)
+            elapsed = time.perf_counter() - started
+            if best is None or elapsed < best[0]:
+                best = (elapsed, latencies, outputs)
+
+        elapsed, latencies, outputs = best
+        intent_hits = sum(1 for row, (intent, _) in zip(corpus, outputs) if intent == row['intent'])
+        with_recipient = [(row, recipient) for row, (_, recipient) in zip(corpus, outputs) if row.get('recipient')]
+        recipient_accuracy = None
+        if with_recipient and any(recipient is not None for _, recipient in with_recipient):
+            recipient_accuracy = round(
+                sum(1 for row, recipient in with_recipient if recipient == row['recipient']) / len(with_recipient), 4
+            )
+        return {
+            'per_s': round(len(corpus) / elapsed),
+            'p50_us': round(percentile(latencies, 50) * 1e6, 1),
+            'p99_us': round(percentile(latencies, 99) * 1e6, 1),
+            'intent_accuracy': round(intent_hits / len(corpus), 4),
+            'recipient_accuracy': recipient_accuracy,
+        }
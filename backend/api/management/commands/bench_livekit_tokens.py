@@ -0,0 +1,128 @@
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.benchmarking import percentile, print_table, run_http_load, wait_for_http
+from api.livekit import LiveKitTokenCache
+
+
+def _mint_rate(cache, identities, calls):
+    """Tokens per second and per-call latency, cycling through `identities` participants"""
+    samples = []
+    started = time.perf_counter()
+    for i in range(calls):
+        t0 = time.perf_counter()
+        cache.get('bench-room', f"user-{i % identities}")
+        samples.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+    return {
+        'calls': calls,
+        'per_s': round(calls / elapsed),
+        'p50_us': round(percentile(samples, 50) * 1e6, 1),
+        'p99_us': round(percentile(samples, 99) * 1e6, 1),
+        **cache.stats(),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Throughput of LiveKit token minting: in-process with and without the token cache "
+        "(api/livekit.py), then /api/livekit-token/ and /api/livekit-token/bulk/ over HTTP "
+        "against two uvicorn servers, one with LIVEKIT_TOKEN_CACHE=false, simulating a "
+        "reconnect storm from --identities participants."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--identities', type=int, default=200, help='Distinct participants reconnecting')
+        parser.add_argument('--calls', type=int, default=20000, help='In-process mint calls per case')
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--bulk-size', type=int, default=100, help='Participants per bulk request')
+        parser.add_argument('--workers', type=int, default=1, help='uvicorn worker processes')
+        parser.add_argument('--no-http', action='store_true', help='Only measure in-process minting')
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        # Tokens are never verified here, so any key works when none is configured
+        api_key = settings.LIVEKIT_API_KEY or 'bench-key'
+        api_secret = settings.LIVEKIT_API_SECRET or 'bench-secret-' + 'x' * 32
+        identities = options['identities']
+
+        report = {'in_process': {}}
+        for name, enabled in (('uncached', False), ('cached', True)):
+            cache = LiveKitTokenCache(api_key, api_secret, enabled=enabled)
+            report['in_process'][name] = _mint_rate(cache, identities, options['calls'])
+
+        if not options['no_http']:
+            report['http'] = self._http(options, api_key, api_secret)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(f"in-process, {identities} identities:")
+        self.stdout.write(f"{'case':<10} | {'per_s':>9} | {'p50_us':>7} | {'p99_us':>7} | {'minted':>7}")
+        for name, row in report['in_process'].items():
+            self.stdout.write(f"{name:<10} | {row['per_s']:>9} | {row['p50_us']:>7} | {row['p99_us']:>7} | "
+                              f"{row.get('minted', 0):>7}")
+        if 'http' in report:
+            self.stdout.write("")
+            print_table(self.stdout, report['http'])
+            for name in ('uncached', 'cached'):
+                row = report['http'][f'bulk_{name}']
+                self.stdout.write(f"bulk_{name}: {row['tokens_per_s']} tokens/s "
+                                  f"({options['bulk_size']} per request)")
+
+    def _http(self, options, api_key, api_secret):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='backend.settings',
+                   LIVEKIT_API_KEY=api_key, LIVEKIT_API_SECRET=api_secret)
+        ports = {'uncached': 8103, 'cached': 8104}
+        procs = []
+        for name, port in ports.items():
+            procs.append(subprocess.Popen(
+                [sys.executable, '-m', 'uvicorn', 'backend.asgi:application', '--host', '127.0.0.1',
+                 '--port', str(port), '--workers', str(options['workers']),
+                 '--log-level', 'warning', '--no-access-log'],
+                cwd=str(settings.BASE_DIR),
+                env=dict(env, LIVEKIT_TOKEN_CACHE='true' if name == 'cached' else 'false'),
+            ))
+
+        identities, bulk_size = options['identities'], options['bulk_size']
+        bulk_payload = {
+            'room': 'bench-room',
+            'participants': [{'username': f"user-{i % identities}"} for i in range(bulk_size)],
+        }
+        report = {}
+        try:
+            for name, port in ports.items():
+                base_url = f"http://127.0.0.1:{port}"
+                asyncio.run(wait_for_http(base_url + '/api/health/'))
+
+                def token_url(i, base_url=base_url):
+                    query = urlencode({'room': 'bench-room', 'username': f"user-{i % identities}"})
+                    return f"{base_url}/api/livekit-token/?{query}"
+
+                asyncio.run(run_http_load(token_url, concurrency=4, total=50))  # warm-up
+                report[name] = asyncio.run(run_http_load(
+                    token_url, concurrency=options['concurrency'], total=options['requests']))
+                bulk = asyncio.run(run_http_load(
+                    base_url + '/api/livekit-token/bulk/', 'POST', bulk_payload,
+                    concurrency=min(options['concurrency'], 8), total=max(1, options['requests'] // bulk_size),
+                ))
+                bulk['tokens_per_s'] = round(bulk['rps'] * bulk_size)
+                report[f'bulk_{name}'] = bulk
+        finally:
+            for proc in procs:
+                proc.send_signal(signal.SIGTERM)
+                try:
+                    proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+        return report
@@ -0,0 +1,173 @@
+import asyncio
+import datetime
+import json
+import os
+import platform
+import signal
+import subprocess
+import sys
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarking import print_table, run_http_load, wait_for_http
+from api.fakes import GmailStubServer, LLMStubServer, TokenVerifierServer
+
+API_KEY = 'loadtest-key'
+API_SECRET = 'loadtest-secret-' + 'x' * 32
+
+VOICE_COMMAND = "Send an email to alice@example.com with subject launch saying we ship on Friday"
+
+SCENARIOS = ('send_email', 'voice_command', 'generate_text', 'livekit_token')
+
+
+class Command(BaseCommand):
+    help = (
+        "Offline load test of the API: starts local stand-ins for Gmail, the LLM providers "
+        "and a LiveKit token verifier (api/fakes.py), runs uvicorn with the AIService pointed "
+        "at them (AI_SERVICE_FACTORY=api.benchmarking.stub_ai_service) and drives each "
+        "scenario at every --concurrency level. Latency and error injection are set per stub. "
+        "Writes a JSON report with --output; --compare prints the change against an earlier one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+        parser.add_argument('--concurrency', default='1,8,32,64', help='Comma-separated levels')
+        parser.add_argument('--requests', type=int, default=400, help='Requests per scenario and level')
+        parser.add_argument('--workers', type=int, default=1, help='uvicorn worker processes')
+        parser.add_argument('--port', type=int, default=8110)
+        parser.add_argument('--gmail-latency', type=float, default=0.08)
+        parser.add_argument('--gmail-error-rate', type=float, default=0.0)
+        parser.add_argument('--llm-latency', type=float, default=0.3, help='Time to first token')
+        parser.add_argument('--llm-token-delay', type=float, default=0.01)
+        parser.add_argument('--llm-tokens', type=int, default=40)
+        parser.add_argument('--llm-error-rate', type=float, default=0.0)
+        parser.add_argument('--verifier-latency', type=float, default=0.002)
+        parser.add_argument('--verifier-error-rate', type=float, default=0.0)
+        parser.add_argument('--output', help='Write the JSON report here')
+        parser.add_argument('--compare', help='Earlier JSON report to diff against')
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        scenarios = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenario(s) {', '.join(sorted(unknown))}; choose from {', '.join(SCENARIOS)}")
+        levels = [int(value) for value in options['concurrency'].split(',')]
+
+        gmail = GmailStubServer(latency=options['gmail_latency'], error_rate=options['gmail_error_rate'])
+        llm = LLMStubServer(latency=options['llm_latency'], token_delay=options['llm_token_delay'],
+                            tokens=options['llm_tokens'], error_rate=options['llm_error_rate'], error_status=500)
+        verifier = TokenVerifierServer(API_KEY, API_SECRET, latency=options['verifier_latency'],
+                                       error_rate=options['verifier_error_rate'])
+        with gmail, llm, verifier:
+            server = self._spawn(options, gmail.url, llm.url)
+            try:
+                base_url = f"http://127.0.0.1:{options['port']}"
+                asyncio.run(wait_for_http(base_url + '/api/health/?ready=1', timeout=120, expect_status=200))
+                results = {name: {} for name in scenarios}
+                for name in scenarios:
+                    for level in levels:
+                        results[name][str(level)] = asyncio.run(
+                            self._scenario(name, base_url, verifier.url, level, options['requests']))
+            finally:
+                server.send_signal(signal.SIGTERM)
+                try:
+                    server.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+
+        report = {
+            'meta': self._meta(options),
+            'results': results,
+            'stubs': {'gmail': dict(gmail.stats), 'llm': dict(llm.stats), 'verifier': dict(verifier.stats)},
+        }
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(report, handle, indent=2, sort_keys=True)
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2, sort_keys=True))
+        else:
+            rows = {f"{name}@{level}": row for name, by_level in results.items() for level, row in by_level.items()}
+            print_table(self.stdout, rows)
+            self.stdout.write(f"stubs: {report['stubs']}")
+        if options['compare']:
+            with open(options['compare']) as handle:
+                self._print_comparison(json.load(handle), report)
+
+    def _spawn(self, options, gmail_url, llm_url):
+        env = dict(
+            os.environ, DJANGO_SETTINGS_MODULE='backend.settings',
+            AI_SERVICE_FACTORY='api.benchmarking.stub_ai_service',
+            LOADTEST_GMAIL_URL=gmail_url, LOADTEST_LLM_URL=llm_url,
+            LIVEKIT_API_KEY=API_KEY, LIVEKIT_API_SECRET=API_SECRET,
+            EMAIL_QUEUE_ENABLED='false',
+        )
+        return subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'backend.asgi:application', '--host', '127.0.0.1',
+             '--port', str(options['port']), '--workers', str(options['workers']),
+             '--log-level', 'warning', '--no-access-log'],
+            cwd=str(settings.BASE_DIR), env=env,
+            # Every request logs at INFO; the report is what matters here
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+
+    async def _scenario(self, name, base_url, verifier_url, concurrency, total):
+        if name == 'send_email':
+            payload = {'to': 'load@example.com', 'subject': 'Load test', 'body': 'Hello from the load test'}
+            return await run_http_load(base_url + '/api/send-email/', 'POST', payload,
+                                       concurrency=concurrency, total=total)
+        if name == 'voice_command':
+            return await run_http_load(base_url + '/api/process-voice-command/', 'POST', {'text': VOICE_COMMAND},
+                                       concurrency=concurrency, total=total)
+        if name == 'generate_text':
+            async def streamed_text(session, body):
+                # The stream is always a 200; a failed generation shows up as an error event
+                return b'data: {"text"' in body and b'event: error' not in body
+            return await run_http_load(base_url + '/api/generate-text/stream/', 'POST',
+                                       {'prompt': 'Write a short thank-you email to the team'},
+                                       concurrency=concurrency, total=total, check=streamed_text)
+
+        def token_url(i):
+            return f"{base_url}/api/livekit-token/?{urlencode({'room': f'load-{i % 50}', 'username': f'caller-{i}'})}"
+
+        async def verified(session, body):
+            # Each token goes through the verifier the way a LiveKit server would check it on join
+            token = json.loads(body)['token']
+            async with session.get(f"{verifier_url}rtc/validate", params={'access_token': token}) as response:
+                await response.read()
+                return response.status == 200
+        return await run_http_load(token_url, concurrency=concurrency, total=total, check=verified)
+
+    @staticmethod
+    def _meta(options):
+        try:
+            commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=str(settings.BASE_DIR),
+                                    capture_output=True, text=True, timeout=10).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            commit = None
+        return {
+            'commit': commit,
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'options': {key: options[key] for key in (
+                'requests', 'workers', 'gmail_latency', 'gmail_error_rate', 'llm_latency', 'llm_token_delay',
+                'llm_tokens', 'llm_error_rate', 'verifier_latency', 'verifier_error_rate')},
+        }
+
+    def _print_comparison(self, before, after):
+        self.stdout.write(f"\nchange since {before['meta'].get('commit')} ({before['meta'].get('created')}):")
+        self.stdout.write(f"{'scenario@level':<20} | {'rps':>8} | {'p50_ms':>8} | {'p95_ms':>8} | {'p99_ms':>8} | "
+                          f"{'errors':>8}")
+        for name, by_level in after['results'].items():
+            for level, row in by_level.items():
+                old = before['results'].get(name, {}).get(level)
+                if old is None:
+                    continue
+                cells = []
+                for key in ('rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+                    cells.append(f"{(row[key] - old[key]) / old[key] * 100:+.1f}%" if old[key] else 'n/a')
+                cells.append(f"{row['error_rate'] - old['error_rate']:+.4f}")
+                self.stdout.write(f"{name + '@' + level:<20} | " + " | ".join(f"{cell:>8}" for cell in cells))
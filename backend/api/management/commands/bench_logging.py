@@ -0,0 +1,104 @@
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from api import Email
+from api.benchmarking import percentile
+
+
+class LegacyJsonFormatter(logging.Formatter):
+    """JsonFormatter as it was before the cached timestamp and shared encoder"""
+
+    def format(self, record):
+        log_data = {
+            "timestamp": datetime.fromtimestamp(record.created).strftime('%Y-%m-%d %H:%M:%S,%f')[:-3],
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "function": record.funcName,
+            "line": record.lineno,
+        }
+        if record.exc_info:
+            log_data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(log_data)
+
+
+def _timed_calls(func, calls):
+    samples = []
+    for i in range(calls):
+        started = time.perf_counter()
+        func(i)
+        samples.append(time.perf_counter() - started)
+    return {
+        "calls": calls,
+        "mean_us": round(sum(samples) / calls * 1e6, 2),
+        "p50_us": round(percentile(samples, 50) * 1e6, 2),
+        "p99_us": round(percentile(samples, 99) * 1e6, 2),
+        "max_us": round(max(samples) * 1e6, 1),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Log-call overhead on the caller's thread with Email.setup_logging's three handlers "
+        "(console, tabular file, JSON file): synchronous handlers against the QueueHandler/"
+        "QueueListener mode, plus the cost of JsonFormatter.format before and after."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=20000)
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        calls = options['calls']
+        log = logging.getLogger('api.bench_logging')
+        report = {}
+
+        record = logging.LogRecord('api.Email', logging.INFO, __file__, 1, "Email sent successfully to %s",
+                                   ("user@example.com",), None, func='send_email')
+        legacy = LegacyJsonFormatter()
+        report["json_format_legacy"] = _timed_calls(lambda i: legacy.format(record), calls)
+        formatter = Email.JsonFormatter()
+        report["json_format"] = _timed_calls(lambda i: formatter.format(record), calls)
+
+        # The console handler binds sys.stderr when it is created; keep it off the terminal
+        saved_stderr = sys.stderr
+        root = logging.getLogger()
+        saved_handlers, saved_level = list(root.handlers), root.level
+        try:
+            with tempfile.TemporaryDirectory() as log_dir, open(os.devnull, 'w') as devnull:
+                sys.stderr = devnull
+                for mode, use_queue in (("sync_handlers", False), ("queued", True)):
+                    Email.setup_logging(use_queue=use_queue, log_dir=log_dir)
+                    report[mode] = _timed_calls(
+                        lambda i: log.info(f"Attempting to send email via tool to: user{i}@example.com"), calls)
+                    started = time.perf_counter()
+                    Email.stop_logging()  # drains the queue in queued mode
+                    report[mode]["drain_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                    for handler in list(root.handlers):
+                        root.removeHandler(handler)
+                        handler.close()
+                    with open(os.path.join(log_dir, Email.PathConfig.JSON_LOG_FILE.name)) as handle:
+                        report[mode]["json_lines_written"] = sum(1 for _ in handle)
+                    os.remove(os.path.join(log_dir, Email.PathConfig.JSON_LOG_FILE.name))
+        finally:
+            sys.stderr = saved_stderr
+            root.handlers[:] = saved_handlers
+            root.setLevel(saved_level)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(f"{'case':<20} | {'mean_us':>8} | {'p50_us':>8} | {'p99_us':>8} | {'max_us':>9}")
+        for case, row in report.items():
+            self.stdout.write(f"{case:<20} | {row['mean_us']:>8} | {row['p50_us']:>8} | {row['p99_us']:>8} | {row['max_us']:>9}")
+        for mode in ("sync_handlers", "queued"):
+            row = report[mode]
+            self.stdout.write(f"{mode}: {row['json_lines_written']} JSON lines written, drain {row['drain_ms']}ms")
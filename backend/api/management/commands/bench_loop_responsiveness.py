@@ -0,0 +1,80 @@
+import asyncio
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarking import make_offline_service, percentile
+from api.fakes import FakeGmailService
+
+
+class Command(BaseCommand):
+    help = (
+        "Check that the event loop stays responsive while emails are in flight. "
+        "A heartbeat task ticks every --interval seconds during --sends concurrent "
+        "AIService.send_email calls against a fake Gmail that blocks for --latency "
+        "seconds; fails if the worst heartbeat delay exceeds --max-jitter-ms. "
+        "api.tests.SendEmailLoopTests checks the same under manage.py test."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sends', type=int, default=10)
+        parser.add_argument('--latency', type=float, default=0.5, help='Blocking time of each fake Gmail send')
+        parser.add_argument('--interval', type=float, default=0.01, help='Heartbeat period in seconds')
+        parser.add_argument('--max-jitter-ms', type=float, default=50.0)
+        parser.add_argument('--inline', action='store_true',
+                            help='Call the Gmail request on the loop thread (the old behaviour) for comparison')
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        report = asyncio.run(self._run(options))
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            for key, value in report.items():
+                self.stdout.write(f"{key:<18} {value}")
+
+        if report['max_jitter_ms'] > options['max_jitter_ms']:
+            raise CommandError(
+                f"Event loop blocked: max heartbeat jitter {report['max_jitter_ms']}ms "
+                f"> {options['max_jitter_ms']}ms"
+            )
+
+    async def _run(self, options):
+        service = make_offline_service(gmail_service=FakeGmailService(latency=options['latency']))
+        if options['inline']:
+            async def _inline_send(message, account=None):
+                return service.gmail_service.users().messages().send(userId='me', body=message).execute()
+            service._send_email_message = _inline_send
+
+        interval = options['interval']
+        jitter = []
+        stop = asyncio.Event()
+
+        async def heartbeat():
+            expected = time.perf_counter() + interval
+            while not stop.is_set():
+                await asyncio.sleep(interval)
+                now = time.perf_counter()
+                jitter.append(max(0.0, now - expected))
+                expected = now + interval
+
+        beat = asyncio.create_task(heartbeat())
+        started = time.perf_counter()
+        results = await asyncio.gather(*(
+            service.send_email(f"user{i}@example.com", f"Subject {i}", "Body")
+            for i in range(options['sends'])
+        ))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await beat
+        service.close()
+
+        return {
+            "sends": options['sends'],
+            "succeeded": sum(1 for r in results if r.get("status") == "success"),
+            "elapsed_s": round(elapsed, 3),
+            "heartbeats": len(jitter),
+            "p99_jitter_ms": round(percentile(jitter, 99) * 1000, 2),
+            "max_jitter_ms": round(max(jitter, default=0.0) * 1000, 2),
+        }
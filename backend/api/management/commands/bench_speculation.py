@@ -0,0 +1,118 @@
+import asyncio
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.benchmarking import build_corpus, percentile
+from api.speculation import SpeculationStats, Speculator
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay synthetic user turns through the speculative reply logic (api/speculation.py) "
+        "against a fake streaming LLM: interim transcripts arrive word by word, some turns pause "
+        "mid-sentence or get a revised final word. Reports how soon the reply starts after end of "
+        "turn, the hit rate (committed / decided speculations), the share of turns answered from a "
+        "speculation and the wasted tokens, for each --stable-after value. "
+        "Time runs --speed times faster than real; results are in real seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--turns', type=int, default=200)
+        parser.add_argument('--stable-after', default='0.2,0.3,0.5', help='Comma-separated values to compare')
+        parser.add_argument('--threshold', type=float, default=0.9, help='Final/interim match threshold')
+        parser.add_argument('--word-interval', type=float, default=0.25, help='Seconds between interim results')
+        parser.add_argument('--eou-delay', type=float, default=0.5, help='End of speech to end of turn')
+        parser.add_argument('--pause-rate', type=float, default=0.3, help='Turns with a mid-sentence pause')
+        parser.add_argument('--pause', type=float, default=0.7, help='Length of that pause')
+        parser.add_argument('--revision-rate', type=float, default=0.15, help='Turns whose final word changes')
+        parser.add_argument('--ttft', type=float, default=0.45, help='Fake LLM time to first token')
+        parser.add_argument('--tokens', type=int, default=40, help='Fake LLM reply length in tokens')
+        parser.add_argument('--tps', type=float, default=80.0, help='Fake LLM tokens per second')
+        parser.add_argument('--speed', type=float, default=10.0)
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        turns = self._script(options)
+        report = {}
+        for value in options['stable_after'].split(','):
+            report[f"stable_after={value}"] = asyncio.run(self._run(turns, float(value), options))
+
+        baseline = options['ttft']
+        if options['json']:
+            self.stdout.write(json.dumps({'baseline_first_token_s': baseline, 'runs': report}, indent=2))
+            return
+        self.stdout.write(f"{len(turns)} turns; without speculation the reply starts {baseline}s after end of turn")
+        self.stdout.write(f"{'run':<17} | {'hit_rate':>8} | {'served':>6} | {'p50_s':>6} | {'p95_s':>6} | "
+                          f"{'mean_s':>6} | {'wasted_tok/turn':>15} | {'wasted/used':>11}")
+        for name, row in report.items():
+            self.stdout.write(f"{name:<17} | {row['hit_rate']:>8} | {row['served_rate']:>6} | {row['p50_s']:>6} | "
+                              f"{row['p95_s']:>6} | {row['mean_s']:>6} | {row['wasted_tokens_per_turn']:>15} | "
+                              f"{row['wasted_to_used']:>11}")
+
+    @staticmethod
+    def _script(options):
+        """Per turn: the interim texts with the gap before each, and the final transcript"""
+        rng = random.Random(11)
+        turns = []
+        for row in build_corpus(options['turns']):
+            words = row['text'].split()
+            pause_at = rng.randrange(2, len(words)) if len(words) > 3 and rng.random() < options['pause_rate'] else None
+            events = []
+            for i in range(1, len(words) + 1):
+                gap = options['word_interval'] + (options['pause'] if i - 1 == pause_at else 0.0)
+                events.append((gap, " ".join(words[:i])))
+            final = list(words)
+            if rng.random() < options['revision_rate']:
+                final[-1] = rng.choice(['tomorrow', 'please', 'today', 'again', 'instead'])
+            turns.append((events, " ".join(final)))
+        return turns
+
+    async def _run(self, turns, stable_after, options):
+        speed = options['speed']
+
+        async def fake_llm(text):
+            await asyncio.sleep(options['ttft'] / speed)
+            for _ in range(options['tokens']):
+                yield "tok "
+                await asyncio.sleep(1 / options['tps'] / speed)
+
+        stats = SpeculationStats()
+        speculator = Speculator(fake_llm, lambda chunk: (len(chunk), None), stable_after=stable_after / speed,
+                                match_threshold=options['threshold'], stats=stats)
+        latencies = []
+        served = 0
+        for events, final in turns:
+            for gap, text in events:
+                await asyncio.sleep(gap / speed)
+                speculator.on_transcript(text, is_final=False)
+            await asyncio.sleep(options['word_interval'] / speed)
+            speculator.on_transcript(final, is_final=True)
+            await asyncio.sleep(options['eou_delay'] / speed)
+
+            # End of turn: what llm_node does
+            started = time.perf_counter()
+            stream = speculator.take(final)
+            if stream is not None:
+                served += 1
+            else:
+                stream = fake_llm(final)
+            async for _ in stream:
+                latencies.append((time.perf_counter() - started) * speed)
+                break
+            await stream.aclose()
+
+        used = stats.committed_tokens + stats.wasted_tokens
+        return {
+            **stats.to_dict(),
+            'saved_s': round(stats.saved_s * speed, 2),
+            'hit_rate': round(stats.hit_rate, 3),
+            'served_rate': round(served / len(turns), 3),
+            'p50_s': round(percentile(latencies, 50), 3),
+            'p95_s': round(percentile(latencies, 95), 3),
+            'mean_s': round(sum(latencies) / len(latencies), 3),
+            'wasted_tokens_per_turn': round(stats.wasted_tokens / len(turns), 1),
+            'wasted_to_used': round(stats.wasted_tokens / used, 3) if used else 0.0,
+        }
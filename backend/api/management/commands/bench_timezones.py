@@ -0,0 +1,70 @@
+import json
+import random
+import time
+
+import pytz
+from django.core.management.base import BaseCommand
+
+from api.timezones import TimezoneIndex
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark the timezone index behind AIService.get_current_time: "
+        "build time, exact lookups over every pytz.all_timezones name and city "
+        "alias, fuzzy lookups of misspelled names, and formatted current_time calls."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=20, help='Passes over the alias set')
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        index = TimezoneIndex()
+        build_ms = (time.perf_counter() - started) * 1000
+
+        names = []
+        for zone in pytz.all_timezones:
+            names.append(zone)
+            names.append(zone.split('/')[-1].replace('_', ' '))
+        misses = [name for name in names if index.lookup(name) is None]
+
+        exact_us = self._per_call_us(index.lookup, names, options['rounds'])
+
+        rng = random.Random(7)
+        cities = sorted({zone.split('/')[-1].replace('_', ' ') for zone in pytz.common_timezones if len(zone.split('/')[-1]) > 5})
+        misspelled = [self._typo(rng, city) for city in cities]
+        fuzzy_cold_us = self._per_call_us(index.lookup, misspelled, 1)
+        fuzzy_warm_us = self._per_call_us(index.lookup, misspelled, options['rounds'])
+
+        current_us = self._per_call_us(index.current_time, names, options['rounds'])
+
+        report = {
+            "index_keys": len(index),
+            "build_ms": round(build_ms, 1),
+            "alias_names": len(names),
+            "unresolved": len(misses),
+            "exact_lookup_us": exact_us,
+            "fuzzy_lookup_cold_us": fuzzy_cold_us,
+            "fuzzy_lookup_warm_us": fuzzy_warm_us,
+            "current_time_us": current_us,
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            for key, value in report.items():
+                self.stdout.write(f"{key:<22} {value}")
+
+    @staticmethod
+    def _per_call_us(func, names, rounds):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for name in names:
+                func(name)
+        return round((time.perf_counter() - started) / (rounds * len(names)) * 1e6, 2)
+
+    @staticmethod
+    def _typo(rng, name):
+        i = rng.randrange(1, len(name) - 1)
+        return name[:i] + name[i + 1] + name[i] + name[i + 2:]
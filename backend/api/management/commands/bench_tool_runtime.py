@@ -0,0 +1,85 @@
+import asyncio
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.benchmarking import make_offline_service
+from api.fakes import FakeGmailService
+from api.tool_runtime import ToolPolicy, ToolRuntime
+from api.tools import ai_service_registry, send_email_tool
+
+
+class Command(BaseCommand):
+    help = (
+        "Perceived latency of the agent's send_email tool as Gmail slows down: seconds until "
+        "the caller hears something (a filler or the result) with the tool run inline versus "
+        "under the tool runtime (api/tool_runtime.py), against a fake Gmail that blocks for "
+        "each --latencies value. Also times --parallel concurrent calls."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--latencies', default='0.2,1,3,8,25', help='Comma-separated Gmail latencies (s)')
+        parser.add_argument('--timeout', type=float, default=20.0, help='Tool deadline (Call.py default)')
+        parser.add_argument('--filler-after', type=float, default=1.5)
+        parser.add_argument('--parallel', type=int, default=4)
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        report = asyncio.run(self._run(options))
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(f"{'gmail_s':>7} | {'inline_first_s':>14} | {'runtime_first_s':>15} | "
+                          f"{'runtime_total_s':>15} | {'fillers':>7} | outcome")
+        for row in report['latency']:
+            self.stdout.write(f"{row['gmail_s']:>7} | {row['inline_first_s']:>14} | {row['runtime_first_s']:>15} | "
+                              f"{row['runtime_total_s']:>15} | {row['fillers']:>7} | {row['outcome']}")
+        row = report['parallel']
+        self.stdout.write(f"{row['calls']} parallel calls at {row['gmail_s']}s each: {row['wall_s']}s wall, "
+                          f"{row['fillers']} filler(s) spoken")
+
+    async def _run(self, options):
+        gmail = FakeGmailService(latency=0.0)
+        ai_service_registry.set(make_offline_service(gmail_service=gmail))
+        policy = ToolPolicy(timeout=options['timeout'], filler_after=options['filler_after'])
+
+        async def send(i=0):
+            return await send_email_tool(f'bench{i}@example.com', 'Tool runtime benchmark', 'Hello', enqueue=False)
+
+        rows = []
+        for latency in (float(value) for value in options['latencies'].split(',')):
+            gmail.latency = latency
+            # Inline: the caller hears nothing until the tool returns; no deadline applies
+            started = time.perf_counter()
+            if latency <= options['timeout']:
+                await send()
+                inline_first = round(time.perf_counter() - started, 2)
+            else:
+                inline_first = f">{options['timeout']}"  # would stall for the full latency
+
+            spoken = []
+            runtime = ToolRuntime({'send_email': policy}, speak=lambda text: spoken.append(time.perf_counter()))
+            started = time.perf_counter()
+            result = await runtime.run('send_email', send)
+            finished = time.perf_counter()
+            first = spoken[0] if spoken else finished
+            rows.append({
+                'gmail_s': latency,
+                'inline_first_s': inline_first,
+                'runtime_first_s': round(first - started, 2),
+                'runtime_total_s': round(finished - started, 2),
+                'fillers': len(spoken),
+                'outcome': 'sent' if result.startswith('Email successfully sent') else 'timed out',
+            })
+
+        gmail.latency = 3.0
+        spoken = []
+        runtime = ToolRuntime({'send_email': policy}, speak=lambda text: spoken.append(text))
+        started = time.perf_counter()
+        await asyncio.gather(*(runtime.run('send_email', send, i=i) for i in range(options['parallel'])))
+        parallel = {
+            'calls': options['parallel'], 'gmail_s': gmail.latency,
+            'wall_s': round(time.perf_counter() - started, 2), 'fillers': len(spoken),
+        }
+        return {'latency': rows, 'parallel': parallel}
@@ -0,0 +1,105 @@
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.benchmarking import percentile, print_table
+from api.tts_cache import TTSAudioCache
+
+VOICE, MODEL, SAMPLE_RATE = "bench-voice", "bench-model", 24000
+
+
+class Command(BaseCommand):
+    help = (
+        "Time to first audio for a fixed phrase from the on-disk TTS cache (api/tts_cache.py) "
+        "versus a simulated TTS provider with --ttfb seconds to first byte, plus put "
+        "throughput and LRU eviction against a --budget-mb cache filled with --clips clips "
+        "of --clip-s seconds of 24kHz mono PCM."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--phrases', type=int, default=200)
+        parser.add_argument('--ttfb', type=float, default=0.35, help='Simulated TTS time to first byte (s)')
+        parser.add_argument('--clip-s', type=float, default=2.0)
+        parser.add_argument('--clips', type=int, default=300)
+        parser.add_argument('--budget-mb', type=float, default=16.0)
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory(prefix='bench-tts-cache-') as directory:
+            report = asyncio.run(self._run(directory, options))
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        print_table(self.stdout, report['first_audio'])
+        for name in ('put', 'eviction'):
+            self.stdout.write(f"{name}: {report[name]}")
+
+    async def _run(self, directory, options):
+        clip = os.urandom(int(SAMPLE_RATE * options['clip_s']) * 2)
+        phrases = [f"Filler phrase number {i}, one moment please." for i in range(options['phrases'])]
+
+        async def fake_tts_first_frame(text):
+            await asyncio.sleep(options['ttfb'])
+            return clip[:SAMPLE_RATE // 50 * 2]
+
+        cache = TTSAudioCache(os.path.join(directory, 'first-audio'), max_bytes=1024 * 1024 * 1024)
+        miss, hit = [], []
+        for text in phrases:
+            started = time.perf_counter()
+            audio = cache.get(text, VOICE, MODEL, SAMPLE_RATE)
+            assert audio is None
+            await fake_tts_first_frame(text)
+            miss.append(time.perf_counter() - started)
+            await asyncio.to_thread(cache.put, text, VOICE, MODEL, SAMPLE_RATE, 1, clip)
+        for text in random.Random(3).sample(phrases, len(phrases)):
+            started = time.perf_counter()
+            audio = cache.get(text, VOICE, MODEL, SAMPLE_RATE)
+            first = next(audio.chunks())
+            bytes(first)  # touch the page like the frame copy in Call.py does
+            hit.append(time.perf_counter() - started)
+            del first
+            audio.close()
+
+        first_audio = {}
+        for name, sample in (('tts (miss)', miss), ('cache (hit)', hit)):
+            first_audio[name] = {
+                'requests': len(sample),
+                'p50_ms': round(percentile(sample, 50) * 1000, 3),
+                'p95_ms': round(percentile(sample, 95) * 1000, 3),
+                'p99_ms': round(percentile(sample, 99) * 1000, 3),
+            }
+
+        budget = int(options['budget_mb'] * 1024 * 1024)
+        cache = TTSAudioCache(os.path.join(directory, 'eviction'), max_bytes=budget)
+        started = time.perf_counter()
+        for i in range(options['clips']):
+            cache.put(f"clip {i}", VOICE, MODEL, SAMPLE_RATE, 1, clip)
+            if i % 3 == 0:
+                # Keep the first clip hot; it must survive eviction
+                hot = cache.get("clip 0", VOICE, MODEL, SAMPLE_RATE)
+                hot.close()
+        elapsed = time.perf_counter() - started
+        stats = cache.stats()
+        on_disk = sum(entry.stat().st_size for entry in os.scandir(cache.directory))
+        reopened = TTSAudioCache(cache.directory, max_bytes=budget)
+        return {
+            'first_audio': first_audio,
+            'put': {
+                'clips_per_s': round(options['clips'] / elapsed, 1),
+                'mb_per_s': round(options['clips'] * len(clip) / elapsed / 1024 / 1024, 1),
+            },
+            'eviction': {
+                'budget_bytes': budget,
+                'index_bytes': stats['bytes'],
+                'disk_bytes': on_disk,
+                'entries': stats['entries'],
+                'evictions': stats['evictions'],
+                'hot_clip_kept': cache.contains("clip 0", VOICE, MODEL, SAMPLE_RATE),
+                'entries_after_reopen': reopened.stats()['entries'],
+            },
+        }
@@ -0,0 +1,130 @@
+import asyncio
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarking import build_corpus, percentile
+
+REPLY = ("Sure, I can help with that. I have written the email and it is ready to go out from your account. "
+         "Is there anything else you would like me to do?")
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays user utterances through the Call.py agent in an AgentSession with the real Silero "
+        "VAD and turn handling (min/max endpointing as in Call.py) but scripted STT, LLM and TTS "
+        "(api/voice_replay.py), and reports each turn's latency from the end of the user's speech to "
+        "the first reply audio. Utterances are the 16-bit WAV files in --wav-dir (transcripts in "
+        "sidecar .txt files) or --utterances synthesized voiced ones. Runs in real time on the CPU; "
+        "--max-p95-ms fails the command when the 95th percentile is over budget."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wav-dir', help='Replay these recordings instead of synthesized utterances')
+        parser.add_argument('--utterances', type=int, default=8)
+        parser.add_argument('--turn-detection', choices=('vad', 'eou'), default='vad',
+                            help="'vad' like Call.py, or the LiveKit English EOU model as in assistant-back/agent.py")
+        parser.add_argument('--min-endpointing', type=float, help='Default: Call.MIN_ENDPOINTING_DELAY')
+        parser.add_argument('--max-endpointing', type=float, help='Default: Call.MAX_ENDPOINTING_DELAY')
+        parser.add_argument('--stt-delay', type=float, default=0.2, help='Transcript this long after the VAD segment')
+        parser.add_argument('--llm-ttft', type=float, default=0.4)
+        parser.add_argument('--llm-token-delay', type=float, default=0.02)
+        parser.add_argument('--tts-ttfb', type=float, default=0.25)
+        parser.add_argument('--reply', default=REPLY)
+        parser.add_argument('--gap', type=float, default=1.0, help='Silence before each utterance (s)')
+        parser.add_argument('--turn-timeout', type=float, default=15.0)
+        parser.add_argument('--max-p95-ms', type=float, help='Fail when the p95 end-of-speech to first audio is above')
+        parser.add_argument('--output', help='Write the JSON report here')
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        # LiveKit plugins must be imported, and their models loaded, on the main thread
+        from livekit.plugins import silero
+        from api import Call
+        from api.voice_replay import load_wav_utterances, synthetic_utterance
+
+        if options['wav_dir']:
+            try:
+                utterances = load_wav_utterances(options['wav_dir'])
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read the recordings: {e}")
+            if not utterances:
+                raise CommandError(f"No .wav files in {options['wav_dir']}")
+            rates = {utterance.sample_rate for utterance in utterances}
+            if len(rates) > 1:
+                raise CommandError(f"The recordings mix sample rates {sorted(rates)}; resample them to one")
+        else:
+            texts = [row['text'] for row in build_corpus(options['utterances'], seed=11)]
+            utterances = [synthetic_utterance(f"utterance-{i + 1}", text, seed=i) for i, text in enumerate(texts)]
+
+        turn_detection = 'vad'
+        if options['turn_detection'] == 'eou':
+            from livekit.plugins.turn_detector.english import EnglishModel, _EUORunnerEn
+            from api.voice_replay import InProcessInference
+            executor = InProcessInference()
+            try:
+                executor.load(_EUORunnerEn.INFERENCE_METHOD)
+            except RuntimeError as e:
+                raise CommandError(f"{e} Download it once with: python -c \"from livekit.plugins.turn_detector "
+                                   f"import english; english._EUORunnerEn._download_files()\"")
+            turn_detection = EnglishModel(inference_executor=executor)
+
+        min_delay = options['min_endpointing'] if options['min_endpointing'] is not None else Call.MIN_ENDPOINTING_DELAY
+        max_delay = options['max_endpointing'] if options['max_endpointing'] is not None else Call.MAX_ENDPOINTING_DELAY
+        vad = silero.VAD.load()
+        turns = asyncio.run(self._run(Call, options, utterances, vad, turn_detection, min_delay, max_delay))
+
+        latencies = [turn.first_audio_s for turn in turns if turn.first_audio_s is not None]
+        report = {
+            'settings': {
+                'turn_detection': options['turn_detection'], 'min_endpointing_delay': min_delay,
+                'max_endpointing_delay': max_delay, 'utterances': options['wav_dir'] or 'synthetic',
+                **{key: options[key] for key in ('stt_delay', 'llm_ttft', 'llm_token_delay', 'tts_ttfb')},
+            },
+            'turns': [turn.to_dict() for turn in turns],
+            'summary': {
+                'turns': len(turns),
+                'missed': len(turns) - len(latencies),
+                'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+                'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+                'max_ms': round(max(latencies, default=0.0) * 1000, 1),
+            },
+        }
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(report, handle, indent=2)
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self._print(report)
+
+        summary = report['summary']
+        if summary['missed']:
+            raise CommandError(f"{summary['missed']} of {summary['turns']} turn(s) got no reply")
+        if options['max_p95_ms'] is not None and summary['p95_ms'] > options['max_p95_ms']:
+            raise CommandError(f"p95 end-of-speech to first audio {summary['p95_ms']}ms > {options['max_p95_ms']}ms")
+
+    async def _run(self, Call, options, utterances, vad, turn_detection, min_delay, max_delay):
+        from livekit.agents import AgentSession
+        from api.voice_replay import ReplayAudioInput, ScriptedLLM, ScriptedSTT, ScriptedTTS, replay
+
+        audio_input = ReplayAudioInput(utterances[0].sample_rate)
+        session = AgentSession(
+            stt=ScriptedSTT(lambda: audio_input.current_text, delay=options['stt_delay']),
+            llm=ScriptedLLM(options['reply'], ttft=options['llm_ttft'], token_delay=options['llm_token_delay']),
+            tts=ScriptedTTS(ttfb=options['tts_ttfb']),
+            vad=vad,
+            turn_handling=Call.turn_handling(min_delay, max_delay, turn_detection),
+        )
+        return await replay(session, Call.Assistant(), utterances, audio_input,
+                            gap=options['gap'], turn_timeout=options['turn_timeout'])
+
+    def _print(self, report):
+        columns = ('speech_end_s', 'first_audio_ms', 'end_of_turn_delay_ms', 'transcription_delay_ms',
+                   'llm_node_ttft_ms', 'tts_node_ttfb_ms')
+        self.stdout.write(f"{'utterance':<14} | " + " | ".join(f"{column:>22}" for column in columns))
+        for turn in report['turns']:
+            cells = ('-' if turn.get(column) is None else turn[column] for column in columns)
+            self.stdout.write(f"{turn['utterance']:<14} | " + " | ".join(f"{cell:>22}" for cell in cells))
+        self.stdout.write(f"settings: {report['settings']}")
+        self.stdout.write(f"summary: {report['summary']}")
@@ -0,0 +1,33 @@
+import asyncio
+import signal
+
+from django.core.management.base import BaseCommand
+
+from api.tools import initialize_ai_service
+from api.outbox import OutboxWorkerPool
+
+
+class Command(BaseCommand):
+    help = "Run the async worker pool that drains the outbound email queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=None, help='Defaults to settings.OUTBOX_WORKERS')
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help='Seconds between polls when idle, defaults to settings.OUTBOX_POLL_INTERVAL')
+
+    def handle(self, *args, **options):
+        asyncio.run(self._run(options))
+
+    async def _run(self, options):
+        pool = OutboxWorkerPool(
+            initialize_ai_service,
+            concurrency=options['concurrency'],
+            poll_interval=options['poll_interval'],
+        )
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, pool.stop)
+            except NotImplementedError:  # Windows
+                pass
+        await pool.run()
@@ -0,0 +1,172 @@
+# Emails with attachments as a seekable byte stream for Gmail's resumable media upload.
+# The message headers and text part are built by the email package as usual; each
+# attachment is base64-encoded from its file on demand, a few lines at a time, so no
+# more than the upload chunk being read is ever in memory, whatever the attachment sizes.
+import base64
+import io
+import mimetypes
+import os
+import uuid
+from dataclasses import dataclass
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import BinaryIO, List, Optional, Sequence, Tuple
+
+# base64.encodebytes writes lines of 76 characters, each from 57 input bytes, plus '\n'
+_RAW_PER_LINE = 57
+_LINE = 77
+
+
+def base64_size(size: int) -> int:
+    """Length of base64.encodebytes() output for `size` input bytes"""
+    lines = -(-size // _RAW_PER_LINE)
+    return 4 * -(-size // 3) + lines
+
+
+@dataclass
+class Attachment:
+    filename: str
+    size: int
+    content_type: str = 'application/octet-stream'
+    # Read from `path`, or from `file` (any seekable binary file, e.g. a Django upload)
+    path: Optional[str] = None
+    file: Optional[BinaryIO] = None
+
+    @classmethod
+    def from_path(cls, path: str, filename: Optional[str] = None,
+                  content_type: Optional[str] = None) -> 'Attachment':
+        filename = filename or os.path.basename(path)
+        return cls(filename, os.path.getsize(path), content_type or _guess_type(filename), path=str(path))
+
+    @classmethod
+    def from_upload(cls, upload) -> 'Attachment':
+        """From a Django UploadedFile; large ones are already on disk (TemporaryUploadedFile)"""
+        content_type = upload.content_type if upload.content_type and '/' in upload.content_type else None
+        return cls(upload.name, upload.size, content_type or _guess_type(upload.name), file=upload.file)
+
+
+def _guess_type(filename: str) -> str:
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+class _Base64Part:
+    """An attachment's body: base64 lines computed from the file when read"""
+
+    def __init__(self, attachment: Attachment):
+        self.attachment = attachment
+        self.size = base64_size(attachment.size)
+        self._file: Optional[BinaryIO] = None
+
+    def read(self, offset: int, size: int) -> bytes:
+        first = offset // _LINE
+        last = -(-(offset + size) // _LINE)
+        start, end = first * _RAW_PER_LINE, min(self.attachment.size, last * _RAW_PER_LINE)
+        source = self._open()
+        source.seek(start)
+        raw = source.read(end - start)
+        if len(raw) != end - start:
+            raise IOError(f"{self.attachment.filename} changed size while it was being sent")
+        skip = offset - first * _LINE
+        return base64.encodebytes(raw)[skip:skip + size]
+
+    def _open(self) -> BinaryIO:
+        if self._file is None:
+            self._file = open(self.attachment.path, 'rb') if self.attachment.path else self.attachment.file
+        return self._file
+
+    def close(self) -> None:
+        # Only what this part opened itself; an upload's file belongs to the request
+        if self._file is not None and self.attachment.path:
+            self._file.close()
+        self._file = None
+
+
+class _BytesPart:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.size = len(data)
+
+    def read(self, offset: int, size: int) -> bytes:
+        return self.data[offset:offset + size]
+
+    def close(self) -> None:
+        pass
+
+
+class MessageStream(io.RawIOBase):
+    """Read-only, seekable view of an RFC 822 message assembled from parts on demand"""
+
+    def __init__(self, parts: Sequence):
+        super().__init__()
+        self._parts: List[Tuple[int, object]] = []
+        start = 0
+        for part in parts:
+            self._parts.append((start, part))
+            start += part.size
+        self.size = start
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self.size}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self.size - self._position
+        chunks = []
+        for start, part in self._parts:
+            if size <= 0:
+                break
+            end = start + part.size
+            if end <= self._position:
+                continue
+            chunk = part.read(self._position - start, min(size, end - self._position))
+            chunks.append(chunk)
+            self._position += len(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self) -> None:
+        for _, part in self._parts:
+            part.close()
+        super().close()
+
+
+def build_message_stream(to: str, subject: str, body: str, attachments: Sequence[Attachment]) -> MessageStream:
+    """multipart/mixed message: the text body, then each attachment base64-encoded"""
+    boundary = f"===============vagent{uuid.uuid4().hex}=="
+    message = MIMEMultipart(boundary=boundary)
+    message['to'] = to
+    message['subject'] = subject
+    message.attach(MIMEText(body))
+    skeleton = message.as_bytes()
+    closing = f"--{boundary}--".encode()
+    parts: list = [_BytesPart(skeleton[:skeleton.rindex(closing)])]
+    for attachment in attachments:
+        maintype, _, subtype = attachment.content_type.partition('/')
+        part = MIMEBase(maintype, subtype or 'octet-stream')
+        del part['MIME-Version']
+        filename = attachment.filename if attachment.filename.isascii() else ('utf-8', '', attachment.filename)
+        part.add_header('Content-Disposition', 'attachment', filename=filename)
+        part['Content-Transfer-Encoding'] = 'base64'
+        part.set_payload('')
+        parts.append(_BytesPart(f"--{boundary}\n".encode() + part.as_bytes()))
+        parts.append(_Base64Part(attachment))
+    parts.append(_BytesPart(closing + b"\n"))
+    return MessageStream(parts)
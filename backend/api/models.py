@@ -1,3 +1,59 @@
+import uuid
+
 from django.db import models
+from django.utils import timezone
 
 # Create your models here.
+
+
+class OutboundEmail(models.Model):
+    """An email waiting in (or drained from) the outbox, see api/outbox.py"""
+
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    job_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    # Gmail account to send as; blank means the default account
+    account = models.CharField(max_length=128, blank=True)
+    to = models.CharField(max_length=320)
+    subject = models.TextField()
+    body = models.TextField(blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # Set while a worker holds the job (its lease); stale leases are released by the workers' reaper
+    locked_at = models.DateTimeField(null=True, blank=True)
+    message_id = models.CharField(max_length=128, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.job_id} -> {self.to} ({self.status})"
+
+    def status_dict(self):
+        """What the unauthenticated job status endpoint shows: delivery state, not the message"""
+        return {
+            'job_id': str(self.job_id),
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.status == self.STATUS_PENDING else None,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat(),
+        }
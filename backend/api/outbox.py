@@ -0,0 +1,184 @@
+# Durable outbound email queue: callers enqueue, a pool of async workers drains it
+import asyncio
+import logging
+import random
+from datetime import timedelta
+from typing import Awaitable, Callable, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+# Retry schedule: 2s, 4s, 8s, ... capped at 5 minutes, with jitter
+RETRY_BASE_DELAY = 2.0
+RETRY_MAX_DELAY = 300.0
+# A job locked for longer than this is assumed to belong to a crashed worker
+LEASE_TIMEOUT = timedelta(minutes=2)
+# Each send is cut off well inside the lease, so a live worker never has its job reclaimed
+SEND_TIMEOUT = LEASE_TIMEOUT.total_seconds() / 2
+
+
+def enqueue_email(to: str, subject: str, body: str, max_attempts: int = 5,
+                  account: Optional[str] = None) -> OutboundEmail:
+    """Persist an email for the workers to send (as `account`) and return the job"""
+    job = OutboundEmail.objects.create(
+        to=to, subject=subject, body=body or "", max_attempts=max_attempts, account=account or ""
+    )
+    logger.info(f"Queued email job {job.job_id} to {to}")
+    return job
+
+
+aenqueue_email = sync_to_async(enqueue_email)
+
+
+def backoff_delay(attempts: int) -> float:
+    """Exponential backoff with +/-20% jitter for the given number of failed attempts"""
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** max(0, attempts - 1)))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def recover_stale_jobs(lease: timedelta = LEASE_TIMEOUT) -> int:
+    """Put jobs left in 'sending' by a crashed worker back in the queue, or fail them once out of attempts"""
+    now = timezone.now()
+    stale = OutboundEmail.objects.filter(status=OutboundEmail.STATUS_SENDING, locked_at__lt=now - lease)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=OutboundEmail.STATUS_FAILED, locked_at=None, updated_at=now,
+        last_error="Worker lease expired on the last attempt",
+    )
+    recovered = stale.update(status=OutboundEmail.STATUS_PENDING, locked_at=None, next_attempt_at=now, updated_at=now)
+    if recovered or failed:
+        logger.warning(f"Recovered {recovered} and failed {failed} email job(s) abandoned by a crashed worker")
+    return recovered + failed
+
+
+def claim_next_job() -> Optional[OutboundEmail]:
+    """Atomically move the oldest due job to 'sending' and return it"""
+    now = timezone.now()
+    with transaction.atomic():
+        job = (
+            OutboundEmail.objects
+            .filter(status=OutboundEmail.STATUS_PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')
+            .first()
+        )
+        if job is None:
+            return None
+        claimed = OutboundEmail.objects.filter(pk=job.pk, status=OutboundEmail.STATUS_PENDING).update(
+            status=OutboundEmail.STATUS_SENDING, locked_at=now, attempts=F('attempts') + 1
+        )
+        if not claimed:
+            return None
+    job.refresh_from_db()
+    return job
+
+
+def _release(job: OutboundEmail, **fields) -> bool:
+    """Update a claimed job only while this worker still holds its lease"""
+    fields['updated_at'] = timezone.now()
+    updated = OutboundEmail.objects.filter(
+        pk=job.pk, status=OutboundEmail.STATUS_SENDING, locked_at=job.locked_at
+    ).update(locked_at=None, **fields)
+    if not updated:
+        logger.warning(f"Email job {job.job_id} lease was lost; leaving its status to the current holder")
+        return False
+    for name, value in fields.items():
+        setattr(job, name, value)
+    job.locked_at = None
+    return True
+
+
+def complete_job(job: OutboundEmail, message_id: str) -> bool:
+    return _release(job, status=OutboundEmail.STATUS_SENT, message_id=message_id or "", last_error="")
+
+
+def fail_job(job: OutboundEmail, error: str) -> bool:
+    """Schedule a retry with backoff, or give up once max_attempts is reached"""
+    if job.attempts >= job.max_attempts:
+        released = _release(job, status=OutboundEmail.STATUS_FAILED, last_error=error)
+        if released:
+            logger.error(f"Email job {job.job_id} failed permanently after {job.attempts} attempts: {error}")
+        return released
+    delay = backoff_delay(job.attempts)
+    released = _release(job, status=OutboundEmail.STATUS_PENDING, last_error=error,
+                        next_attempt_at=timezone.now() + timedelta(seconds=delay))
+    if released:
+        logger.warning(f"Email job {job.job_id} attempt {job.attempts} failed, retrying in {delay:.1f}s: {error}")
+    return released
+
+
+class OutboxWorkerPool:
+    """A pool of async workers that drain OutboundEmail through AIService.send_email"""
+
+    def __init__(self, get_service: Callable[[], Awaitable], concurrency: Optional[int] = None,
+                 poll_interval: Optional[float] = None):
+        self._get_service = get_service
+        self.concurrency = concurrency or settings.OUTBOX_WORKERS
+        self.poll_interval = poll_interval or settings.OUTBOX_POLL_INTERVAL
+        self._stopping = asyncio.Event()
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    async def run(self) -> None:
+        """Recover abandoned jobs, then run the workers until stop() is called"""
+        await sync_to_async(recover_stale_jobs)()
+        logger.info(f"Starting {self.concurrency} outbox worker(s)")
+        await asyncio.gather(self._reaper(), *(self._worker(n) for n in range(self.concurrency)))
+        logger.info("Outbox workers stopped")
+
+    async def _reaper(self) -> None:
+        """Periodically release jobs held by workers in other processes that died"""
+        interval = LEASE_TIMEOUT.total_seconds() / 2
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                await sync_to_async(recover_stale_jobs)()
+
+    async def _idle(self) -> None:
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _worker(self, number: int) -> None:
+        while not self._stopping.is_set():
+            # Resolve the service before claiming: building it can sit in OAuth or retries,
+            # and that time must not count against a job's lease
+            try:
+                service = await self._get_service()
+            except Exception as e:
+                logger.error(f"Outbox worker {number} could not get the email service: {e}")
+                service = None
+            if not service:
+                await self._idle()
+                continue
+            job = await sync_to_async(claim_next_job)()
+            if job is None:
+                await self._idle()
+                continue
+            await self._process(job, service)
+
+    async def _process(self, job: OutboundEmail, service) -> None:
+        try:
+            result = await asyncio.wait_for(
+                service.send_email(job.to, job.subject, job.body, account=job.account or None),
+                timeout=SEND_TIMEOUT,
+            )
+        except asyncio.TimeoutError:
+            result = {"status": "error", "message": f"Send timed out after {SEND_TIMEOUT:g}s"}
+        except Exception as e:
+            logger.error(f"Email job {job.job_id} raised: {e}", exc_info=True)
+            result = {"status": "error", "message": str(e)}
+
+        if result.get("status") == "success":
+            if await sync_to_async(complete_job)(job, result.get("message_id")):
+                logger.info(f"Email job {job.job_id} sent to {job.to}")
+        else:
+            await sync_to_async(fail_job)(job, result.get("message", "Unknown error sending email."))
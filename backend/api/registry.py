@@ -0,0 +1,124 @@
+# Process-wide registry for services that are expensive to build (AIService runs
+# the Gemini and Gmail setup, with retries, in its constructor). The first caller
+# starts construction on a background thread; everyone else, on any event loop or
+# thread, waits on that same future, and the event loop is never blocked.
+import asyncio
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Generic, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class ServiceRegistry(Generic[T]):
+    """Builds one instance of a service per process, once, off the event loop.
+
+    A failed build is remembered for `retry_interval` seconds so a broken
+    dependency does not turn every request into another 30s attempt.
+    """
+
+    def __init__(self, factory: Callable[[], T], name: str, retry_interval: float = 30.0):
+        self.factory = factory
+        self.name = name
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._future: Optional[concurrent.futures.Future] = None
+        self._pid: Optional[int] = None
+        self._started_at: Optional[float] = None
+        self._init_seconds: Optional[float] = None
+        self._failed_at: Optional[float] = None
+        self._error: Optional[str] = None
+
+    def start(self) -> concurrent.futures.Future:
+        """Start building in the background unless a build is running or done; returns its future"""
+        with self._lock:
+            future = self._future
+            # A forked worker inherits the future but not the thread building it
+            forked = self._pid is not None and self._pid != os.getpid()
+            retry = (future is not None and future.done() and future.exception() is not None
+                     and time.monotonic() - self._failed_at >= self.retry_interval)
+            if future is None or forked or retry:
+                future = self._future = concurrent.futures.Future()
+                self._pid = os.getpid()
+                self._started_at = time.monotonic()
+                threading.Thread(target=self._build, args=(future,), name=f"{self.name}-init", daemon=True).start()
+            return future
+
+    def _build(self, future: concurrent.futures.Future) -> None:
+        logger.info(f"Initializing {self.name}...")
+        try:
+            instance = self.factory()
+        except Exception as e:
+            logger.error(f"Failed to initialize {self.name}: {e}", exc_info=True)
+            with self._lock:
+                self._failed_at = time.monotonic()
+                self._error = str(e)
+            future.set_exception(e)
+            return
+        with self._lock:
+            self._init_seconds = time.monotonic() - self._started_at
+            self._error = None
+        logger.info(f"{self.name} initialized in {self._init_seconds:.2f}s")
+        future.set_result(instance)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[T]:
+        """The service, waiting for the shared build if needed; None if it failed or timed out"""
+        future = self.start()
+        try:
+            # shield: a cancelled or timed-out caller must not cancel the build for everyone else
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Timed out after {timeout}s waiting for {self.name} to initialize")
+        except Exception:
+            pass  # already logged by _build
+        return None
+
+    def get_sync(self, timeout: Optional[float] = None) -> Optional[T]:
+        """Blocking variant of get() for threads outside an event loop"""
+        try:
+            return self.start().result(timeout)
+        except concurrent.futures.TimeoutError:
+            logger.warning(f"Timed out after {timeout}s waiting for {self.name} to initialize")
+        except Exception:
+            pass
+        return None
+
+    def peek(self) -> Optional[T]:
+        """The service if it is ready, without starting or waiting for a build"""
+        future = self._future
+        if future is not None and future.done() and future.exception() is None and self._pid == os.getpid():
+            return future.result()
+        return None
+
+    def set(self, instance: T) -> None:
+        """Install an already-built instance (benchmarks, offline tools)"""
+        future = concurrent.futures.Future()
+        future.set_result(instance)
+        with self._lock:
+            self._future, self._pid, self._error = future, os.getpid(), None
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            future = self._future
+            if future is None or self._pid != os.getpid():
+                state = 'idle'
+            elif not future.done():
+                state = 'initializing'
+            elif future.exception() is not None:
+                state = 'failed'
+            else:
+                state = 'ready'
+            status = {'state': state, 'ready': state == 'ready'}
+            if state == 'initializing':
+                status['waiting_s'] = round(time.monotonic() - self._started_at, 2)
+            if state == 'ready' and self._init_seconds is not None:
+                status['init_s'] = round(self._init_seconds, 2)
+            if state == 'failed':
+                status['error'] = self._error
+                status['retry_in_s'] = round(max(0.0, self._failed_at + self.retry_interval - time.monotonic()), 1)
+            return status
@@ -0,0 +1,166 @@
+# Response cache for AIService.generate_text: TTL + LRU in memory, optional SQLite tier on disk
+# (kept off the event loop), and single-flight so concurrent identical prompts share one upstream call
+import asyncio
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """TTL + LRU cache of generated text keyed on normalized prompt and model.
+
+    The memory tier is read and written inline. The disk tier's SQLite connection is
+    only used from one background thread: get_or_compute awaits disk reads there
+    (inside the single flight), and writes are queued to it without waiting.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 1024, disk_path: Optional[Union[str, Path]] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[Tuple[int, str], asyncio.Task] = {}
+        self._stats: Counter = Counter()
+        self._db: Optional[sqlite3.Connection] = None
+        self._disk: Optional[ThreadPoolExecutor] = None
+        if disk_path:
+            self._disk = ThreadPoolExecutor(max_workers=1, thread_name_prefix="response-cache-disk")
+            self._disk.submit(self._open_disk, Path(disk_path)).result()
+
+    @staticmethod
+    def make_key(prompt: str, model: str) -> str:
+        """Whitespace-insensitive key so reformatted copies of a prompt share an entry"""
+        normalized = re.sub(r'\s+', ' ', prompt or '').strip()
+        return hashlib.sha256(f"{model}\0{normalized}".encode('utf-8')).hexdigest()
+
+    def _open_disk(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+        )
+        self._db.execute('DELETE FROM responses WHERE expires_at <= ?', (time.time(),))
+        logger.info(f"Response cache disk tier at {path}")
+
+    def get(self, key: str) -> Optional[str]:
+        """The value from the memory tier, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return value
+                del self._entries[key]
+                self._stats['expirations'] += 1
+            self._stats['misses'] += 1
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        """Store in memory; the disk write, if any, happens in the background"""
+        if not value:
+            return  # never cache failures
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store_memory(key, value, expires_at)
+        if self._disk is not None:
+            self._disk.submit(self._disk_set, key, value, expires_at).add_done_callback(self._log_disk_error)
+
+    def _disk_get(self, key: str) -> Optional[Tuple[str, float]]:
+        return self._db.execute(
+            'SELECT value, expires_at FROM responses WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone()
+
+    def _disk_set(self, key: str, value: str, expires_at: float) -> None:
+        self._db.execute(
+            'INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)', (key, value, expires_at)
+        )
+
+    @staticmethod
+    def _log_disk_error(future) -> None:
+        if future.exception() is not None:
+            logger.warning(f"Response cache disk write failed: {future.exception()}")
+
+    def _store_memory(self, key: str, value: str, expires_at: float) -> None:
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[str]]) -> str:
+        """Return the cached value, or run `compute` once for all concurrent callers of `key`"""
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        task = self._inflight.get(flight_key)
+        if task is None:
+            task = loop.create_task(self._fill(key, compute))
+            self._inflight[flight_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(flight_key, None))
+        else:
+            self._stats['coalesced'] += 1
+        # shield: one caller giving up must not cancel the call the others are waiting on
+        return await asyncio.shield(task)
+
+    async def _fill(self, key: str, compute: Callable[[], Awaitable[str]]) -> str:
+        if self._disk is not None:
+            try:
+                row = await asyncio.get_running_loop().run_in_executor(self._disk, self._disk_get, key)
+            except sqlite3.Error as e:
+                logger.warning(f"Response cache disk read failed: {e}")
+                row = None
+            if row is not None:
+                with self._lock:
+                    self._store_memory(key, row[0], row[1])
+                self._stats['disk_hits'] += 1
+                return row[0]
+        self._stats['upstream_calls'] += 1
+        value = await compute()
+        self.set(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self._disk is not None:
+            self._disk.submit(self._db.execute, 'DELETE FROM responses').result()
+
+    def close(self) -> None:
+        """Finish queued disk writes and close the disk tier"""
+        if self._disk is not None:
+            self._disk.submit(self._db.close).result()
+            self._disk.shutdown(wait=True)
+            self._disk = None
+
+    def stats(self) -> Dict[str, Any]:
+        # Disk hits are memory misses answered from disk
+        lookups = self._stats['hits'] + self._stats['misses']
+        hits = self._stats['hits'] + self._stats['disk_hits']
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self._stats['hits'],
+            'disk_hits': self._stats['disk_hits'],
+            'misses': self._stats['misses'],
+            'evictions': self._stats['evictions'],
+            'expirations': self._stats['expirations'],
+            'coalesced': self._stats['coalesced'],
+            'upstream_calls': self._stats['upstream_calls'],
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,189 @@
+# Speculative LLM generation for the voice agent: once an interim transcript has been
+# stable for a moment, start generating the reply in the background. When the turn
+# ends, the speculative reply is used if the final transcript matches the one it was
+# generated from closely enough; otherwise it is cancelled and the LLM is asked again.
+# Kept free of LiveKit imports: the stream factory and chunk accounting come from Call.py.
+import asyncio
+import difflib
+import logging
+import math
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION = '.,!?;:"()'
+
+
+def _words(text: str) -> List[str]:
+    return [word for word in (w.strip(_PUNCTUATION) for w in (text or '').lower().split()) if word]
+
+
+def transcripts_match(speculated: str, final: str, threshold: float = 0.9) -> bool:
+    """Word-level similarity of two transcripts (1.0 = same words in the same order)"""
+    a, b = _words(speculated), _words(final)
+    if a == b:
+        return True
+    if not a or not b:
+        return False
+    return difflib.SequenceMatcher(None, a, b, autojunk=False).ratio() >= threshold
+
+
+@dataclass
+class SpeculationStats:
+    started: int = 0
+    committed: int = 0
+    discarded: int = 0
+    # Completion tokens generated for speculations that were thrown away
+    wasted_tokens: int = 0
+    committed_tokens: int = 0
+    # Generation time already done when a speculation was committed, summed
+    saved_s: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        decided = self.committed + self.discarded
+        return self.committed / decided if decided else 0.0
+
+    def to_dict(self):
+        return {**asdict(self), 'saved_s': round(self.saved_s, 3), 'hit_rate': round(self.hit_rate, 4)}
+
+
+class _Speculation:
+    def __init__(self, text: str):
+        self.text = text
+        self.started_at = time.monotonic()
+        self.chunks: List[Any] = []
+        self.chars = 0
+        self.usage_tokens: Optional[int] = None
+        self.error: Optional[BaseException] = None
+        self.finished = False
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def tokens(self) -> int:
+        # Providers report usage at the end of a stream; estimate until then (~4 chars per token)
+        return self.usage_tokens if self.usage_tokens is not None else math.ceil(self.chars / 4)
+
+
+class Speculator:
+    """Starts a reply on a stable interim transcript and hands it over at end of turn.
+
+    `start_stream(text)` returns an async iterator of LLM chunks for a user turn
+    saying `text`; `chunk_accounting(chunk)` returns (text length, reported
+    completion tokens or None) for a chunk.
+    """
+
+    def __init__(self, start_stream: Callable[[str], AsyncIterator[Any]],
+                 chunk_accounting: Callable[[Any], Tuple[int, Optional[int]]] = lambda chunk: (len(str(chunk)), None),
+                 stable_after: float = 0.3, min_words: int = 3, match_threshold: float = 0.9,
+                 stats: Optional[SpeculationStats] = None):
+        self.start_stream = start_stream
+        self.chunk_accounting = chunk_accounting
+        self.stable_after = stable_after
+        self.min_words = min_words
+        self.match_threshold = match_threshold
+        self.stats = stats or SpeculationStats()
+        self._finals: List[str] = []
+        self._current: Optional[_Speculation] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def on_transcript(self, text: str, is_final: bool) -> None:
+        """Feed every interim and final STT result of the current user turn"""
+        full = " ".join(self._finals + [text]).strip()
+        if is_final:
+            self._finals.append(text)
+        if self._current is not None:
+            if transcripts_match(self._current.text, full, self.match_threshold):
+                return
+            self._discard()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if len(_words(full)) < self.min_words:
+            return
+        if is_final:
+            # A final segment will not change any more
+            self._start(full)
+        else:
+            self._timer = asyncio.get_running_loop().call_later(self.stable_after, self._start, full)
+
+    def _start(self, text: str) -> None:
+        self._timer = None
+        spec = _Speculation(text)
+        spec.task = asyncio.create_task(self._generate(spec), name="speculative-llm")
+        self._current = spec
+        self.stats.started += 1
+
+    async def _generate(self, spec: _Speculation) -> None:
+        try:
+            async for chunk in self.start_stream(spec.text):
+                chars, usage = self.chunk_accounting(chunk)
+                spec.chars += chars
+                if usage is not None:
+                    spec.usage_tokens = usage
+                spec.chunks.append(chunk)
+                spec.changed.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            spec.error = e
+        finally:
+            spec.finished = True
+            spec.changed.set()
+
+    def _discard(self) -> None:
+        spec, self._current = self._current, None
+        if spec is None:
+            return
+        spec.task.cancel()
+        self.stats.discarded += 1
+        self.stats.wasted_tokens += spec.tokens
+
+    def take(self, final_text: str) -> Optional[AsyncIterator[Any]]:
+        """At end of turn: the speculative stream if it matches `final_text`, else None (and it is cancelled)"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._finals = []
+        spec = self._current
+        if spec is None:
+            return None
+        if spec.error is not None or not transcripts_match(spec.text, final_text, self.match_threshold):
+            self._discard()
+            return None
+        self._current = None
+        self.stats.committed += 1
+        self.stats.saved_s += time.monotonic() - spec.started_at
+        return self._replay(spec)
+
+    async def _replay(self, spec: _Speculation) -> AsyncIterator[Any]:
+        """Chunks generated so far, then the rest as it arrives"""
+        sent = 0
+        try:
+            while True:
+                while sent < len(spec.chunks):
+                    yield spec.chunks[sent]
+                    sent += 1
+                if spec.finished:
+                    break
+                spec.changed.clear()
+                if sent < len(spec.chunks) or spec.finished:
+                    continue
+                await spec.changed.wait()
+            if spec.error is not None:
+                raise spec.error
+        finally:
+            # The caller stopped reading (the user interrupted) or the stream ended
+            spec.task.cancel()
+            self.stats.committed_tokens += spec.tokens
+
+    async def aclose(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        spec, self._current = self._current, None
+        if spec is not None:
+            spec.task.cancel()
+            await asyncio.gather(spec.task, return_exceptions=True)
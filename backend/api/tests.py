@@ -1,3 +1,1551 @@
-from django.test import TestCase
+import asyncio
+import base64
+import email
+import hashlib
+import io
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from voice_common import chat_window
+
+from . import jsonstream, outbox, views
+from .Email import AIService, ServiceConfig
+from .benchmarking import IMPORT_TARGETS, eager_imports, make_offline_service
+from .credentials import ACCESS_TOKEN_LIFETIME, GmailCredentialManager, atomic_write, file_lock
+from .fakes import FakeGmailService, GmailStubServer
+from .gmail_pool import GmailClient, GmailClientPool, UnknownAccountError
+from .intents import IntentMatcher
+from .livekit import LiveKitTokenCache
+from .mime_stream import Attachment, base64_size, build_message_stream
+from .models import OutboundEmail
+from .registry import ServiceRegistry
+from .response_cache import ResponseCache
+from .speculation import Speculator, transcripts_match
+from .timezones import TimezoneIndex
+from .tool_runtime import DEFAULT_POLICY, ToolPolicy, ToolRuntime
+from .tools import send_email_tool
+from .tts_cache import TTSAudioCache
+
+
+class SendEmailLoopTests(SimpleTestCase):
+    """Blocking Gmail calls must run on the service executor, not the event loop"""
+
+    async def test_loop_stays_responsive_during_sends(self):
+        service = make_offline_service(gmail_service=FakeGmailService(latency=0.2))
+        self.addCleanup(service.close)
+        interval = 0.01
+        jitter = []
+        stop = asyncio.Event()
+
+        async def heartbeat():
+            expected = time.perf_counter() + interval
+            while not stop.is_set():
+                await asyncio.sleep(interval)
+                now = time.perf_counter()
+                jitter.append(max(0.0, now - expected))
+                expected = now + interval
+
+        beat = asyncio.create_task(heartbeat())
+        results = await asyncio.gather(*(
+            service.send_email(f"user{i}@example.com", f"Subject {i}", "Body") for i in range(10)
+        ))
+        stop.set()
+        await beat
+
+        self.assertEqual([r['status'] for r in results], ['success'] * 10)
+        # Ten sends blocking inline would stall the loop for ~2s
+        self.assertGreater(len(jitter), 10)
+        self.assertLess(max(jitter), 0.05)
+
+
+class FakeProvider:
+    """Stands in for gemini_model and openai_llm: answers after `delay`, or raises `error`"""
+
+    def __init__(self, text='', delay=0.0, error=None):
+        self.text, self.delay, self.error = text, delay, error
+        self.calls = 0
+        self.cancelled = False
+
+    async def _answer(self):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error:
+            raise self.error
+        return self.text
+
+    async def generate_content_async(self, prompt):
+        return SimpleNamespace(text=await self._answer())
+
+    async def ainvoke(self, prompt):
+        return await self._answer()
+
+
+class ServiceConfigTests(SimpleTestCase):
+    def test_defaults_are_read_when_the_config_is_created(self):
+        env = {'LLM_MODE': 'race', 'LLM_HEDGE_DELAY': '0.25', 'AI_SERVICE_MAX_WORKERS': '3',
+               'AI_CACHE_ENABLED': 'false', 'GMAIL_UPLOAD_CHUNK_KB': '256'}
+        with mock.patch.dict(os.environ, env):
+            config = ServiceConfig()
+        self.assertEqual((config.LLM_MODE, config.HEDGE_DELAY, config.EXECUTOR_MAX_WORKERS),
+                         ('race', 0.25, 3))
+        self.assertEqual((config.CACHE_ENABLED, config.UPLOAD_CHUNK_SIZE), (False, 256 * 1024))
+        self.assertEqual(ServiceConfig(LLM_MODE='hedge').LLM_MODE, 'hedge')
+
+    def test_service_reads_its_config_after_loading_dotenv(self):
+        class Service(AIService):
+            def _initialize_services(self):
+                pass
+
+        def load_dotenv():
+            os.environ['LLM_MODE'] = 'hedge'
+
+        keys = {name: 'test' for name in ('OPENAI_API_KEY', 'SERPAPI_API_KEY', 'GEMINI_API_KEY')}
+        with mock.patch.dict(os.environ, keys), mock.patch('api.Email.load_dotenv', side_effect=load_dotenv):
+            os.environ.pop('LLM_MODE', None)
+            service = Service()
+        self.addCleanup(service.close)
+        self.assertEqual(service.config.LLM_MODE, 'hedge')
+
+
+class HedgedGenerateTextTests(SimpleTestCase):
+    def service(self, gemini, openai, mode='hedge', delay=0.1, timeout=2.0):
+        config = ServiceConfig(LLM_MODE=mode, HEDGE_DELAY=delay, GEMINI_TIMEOUT=timeout,
+                               OPENAI_TIMEOUT=timeout, CACHE_ENABLED=False)
+        service = make_offline_service(config)
+        self.addCleanup(service.close)
+        service.gemini_model, service.openai_llm = gemini, openai
+        return service
+
+    def stats(self, service):
+        return {name: dict(counter) for name, counter in service.llm_stats.items() if counter}
+
+    async def test_primary_wins_before_the_hedge_delay(self):
+        gemini, openai = FakeProvider('from gemini', delay=0.01), FakeProvider('from openai')
+        service = self.service(gemini, openai)
+        self.assertEqual(await service.generate_text('hi'), 'from gemini')
+        self.assertEqual(openai.calls, 0)
+        self.assertEqual(self.stats(service), {'gemini': {'wins': 1}})
+
+    async def test_hedge_wins_and_the_primary_is_cancelled(self):
+        gemini, openai = FakeProvider('from gemini', delay=1.0), FakeProvider('from openai', delay=0.01)
+        service = self.service(gemini, openai, delay=0.05)
+        started = time.perf_counter()
+        self.assertEqual(await service.generate_text('hi'), 'from openai')
+        elapsed = time.perf_counter() - started
+        self.assertTrue(0.05 <= elapsed < 0.5, elapsed)
+        # The loser is cancelled, not awaited; let the cancellation reach the provider
+        await asyncio.sleep(0.01)
+        self.assertTrue(gemini.cancelled)
+        self.assertEqual(self.stats(service), {'gemini': {'cancellations': 1}, 'openai': {'wins': 1},
+                                               'hedge': {'fired': 1}})
+
+    async def test_race_fires_both_at_once(self):
+        gemini, openai = FakeProvider('from gemini', delay=0.01), FakeProvider('from openai', delay=1.0)
+        service = self.service(gemini, openai, mode='race')
+        self.assertEqual(await service.generate_text('hi'), 'from gemini')
+        self.assertEqual((gemini.calls, openai.calls), (1, 1))
+        self.assertEqual(self.stats(service), {'gemini': {'wins': 1}, 'openai': {'cancellations': 1},
+                                               'hedge': {'fired': 1}})
+
+    async def test_failing_primary_hedges_without_waiting_for_the_delay(self):
+        gemini = FakeProvider(error=RuntimeError('quota'))
+        openai = FakeProvider('from openai', delay=0.01)
+        service = self.service(gemini, openai, delay=1.0)
+        started = time.perf_counter()
+        self.assertEqual(await service.generate_text('hi'), 'from openai')
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assertEqual(self.stats(service), {'gemini': {'errors': 1, 'losses': 1}, 'openai': {'wins': 1},
+                                               'hedge': {'fired': 1}})
+
+    async def test_both_fail(self):
+        gemini, openai = FakeProvider(error=RuntimeError('quota')), FakeProvider('', delay=0.01)
+        service = self.service(gemini, openai, mode='race')
+        self.assertEqual(await service.generate_text('hi'), '')
+        self.assertEqual(self.stats(service), {'gemini': {'errors': 1, 'losses': 1},
+                                               'openai': {'empty': 1, 'losses': 1}, 'hedge': {'fired': 1}})
+
+    async def test_deadline_expiry_counts_as_a_failure(self):
+        gemini, openai = FakeProvider('late', delay=5.0), FakeProvider('from openai', delay=0.2)
+        service = self.service(gemini, openai, delay=1.0, timeout=0.05)
+        self.assertEqual(await service.generate_text('hi'), '')
+        self.assertTrue(gemini.cancelled)
+        self.assertEqual(self.stats(service), {'gemini': {'timeouts': 1, 'losses': 1},
+                                               'openai': {'timeouts': 1, 'losses': 1}, 'hedge': {'fired': 1}})
+
+
+class IntentMatcherTests(SimpleTestCase):
+    def setUp(self):
+        self.matcher = IntentMatcher()
+
+    def assertEmailSlots(self, text, subject, body):
+        match = self.matcher.match(text)
+        self.assertEqual(match.intent, 'email')
+        self.assertEqual(match.slots.get('recipient'), 'john@example.com')
+        self.assertEqual(match.slots.get('subject'), subject)
+        self.assertEqual(match.slots.get('body'), body)
+        self.assertTrue(match.skip_llm, match.to_dict())
+
+    def test_bare_subject_and_body_keywords(self):
+        self.assertEmailSlots("send an email to john@example.com subject Lunch body see you at noon",
+                              'Lunch', 'see you at noon')
+
+    def test_subject_and_body_joined_by_and(self):
+        self.assertEmailSlots("Send an email to john@example.com with subject Lunch and body see you at noon",
+                              'Lunch', 'see you at noon')
+
+    def test_comma_separated_message(self):
+        self.assertEmailSlots("send an email to john@example.com, subject Lunch, message see you at noon",
+                              'Lunch', 'see you at noon')
+
+    def test_marked_subject_and_body(self):
+        self.assertEmailSlots("send an email to john@example.com subject: Lunch body: see you at noon.",
+                              'Lunch', 'see you at noon')
+        self.assertEmailSlots("send an email to john@example.com with the subject Lunch saying see you at noon",
+                              'Lunch', 'see you at noon')
+
+    def test_body_keeps_later_keywords(self):
+        match = self.matcher.match("send an email to john@example.com subject Notes body the message is about lunch")
+        self.assertEqual(match.slots['subject'], 'Notes')
+        self.assertEqual(match.slots['body'], 'the message is about lunch')
+
+    def test_message_trigger_is_not_a_body(self):
+        match = self.matcher.match("send a message to john saying hi there")
+        self.assertEqual(match.slots, {'recipient_name': 'john', 'body': 'hi there'})
+        self.assertFalse(match.skip_llm)
+
+    def test_time_and_other(self):
+        match = self.matcher.match("what time is it in Tokyo")
+        self.assertEqual((match.intent, match.slots), ('time', {'location': 'Tokyo'}))
+        self.assertFalse(self.matcher.match("how are you today").detected)
+
+
+class SpeculatorTests(SimpleTestCase):
+    def speculator(self, chunks=('Sure, ', 'sending ', 'it now.'), gate=None, **kwargs):
+        self.prompts = []
+
+        async def start_stream(text):
+            self.prompts.append(text)
+            for i, chunk in enumerate(chunks):
+                if gate is not None and i == 1:
+                    await gate.wait()
+                await asyncio.sleep(0)
+                yield chunk
+
+        return Speculator(start_stream, **{'stable_after': 0.05, 'min_words': 3, **kwargs})
+
+    @staticmethod
+    async def collect(stream):
+        return [chunk async for chunk in stream]
+
+    def test_transcripts_match(self):
+        self.assertTrue(transcripts_match('Send an email to John.', 'send an email to john'))
+        ten = 'please send the quarterly report to john and mary today'
+        self.assertTrue(transcripts_match(ten, ten.replace('mary', 'marie')))  # 9 of 10 words: 0.9
+        self.assertFalse(transcripts_match(ten, ten.replace('mary', 'marie').replace('john', 'jon')))
+        self.assertFalse(transcripts_match('', 'hello there'))
+        self.assertTrue(transcripts_match('', ''))
+
+    async def test_starts_once_an_interim_is_stable(self):
+        speculator = self.speculator()
+        speculator.on_transcript('send an email', is_final=False)
+        await asyncio.sleep(0.03)
+        speculator.on_transcript('send an email to john', is_final=False)  # changed: the timer restarts
+        await asyncio.sleep(0.03)
+        self.assertEqual(speculator.stats.started, 0)
+        await asyncio.sleep(0.05)
+        self.assertEqual((speculator.stats.started, self.prompts), (1, ['send an email to john']))
+        await speculator.aclose()
+
+    async def test_short_interims_do_not_start(self):
+        speculator = self.speculator()
+        speculator.on_transcript('send an', is_final=False)
+        await asyncio.sleep(0.08)
+        self.assertEqual(speculator.stats.started, 0)
+
+    async def test_final_segment_starts_at_once_and_commits(self):
+        speculator = self.speculator()
+        speculator.on_transcript('what time is it', is_final=True)
+        self.assertEqual(speculator.stats.started, 1)
+        stream = speculator.take('What time is it?')
+        self.assertEqual(await self.collect(stream), ['Sure, ', 'sending ', 'it now.'])
+        stats = speculator.stats
+        self.assertEqual((stats.committed, stats.discarded, stats.wasted_tokens), (1, 0, 0))
+        self.assertEqual(stats.committed_tokens, math.ceil(len('Sure, sending it now.') / 4))
+        self.assertGreater(stats.saved_s, 0)
+
+    async def test_replay_hands_over_chunks_generated_after_take(self):
+        gate = asyncio.Event()
+        speculator = self.speculator(gate=gate)
+        speculator.on_transcript('what time is it', is_final=True)
+        await asyncio.sleep(0.01)
+        stream = speculator.take('what time is it')
+        self.assertEqual(await stream.__anext__(), 'Sure, ')
+        gate.set()
+        self.assertEqual(await self.collect(stream), ['sending ', 'it now.'])
+
+    async def test_changed_transcript_discards_and_counts_wasted_tokens(self):
+        speculator = self.speculator(chunks=('x' * 40,))
+        speculator.on_transcript('what time is it', is_final=True)
+        await asyncio.sleep(0.01)
+        speculator.on_transcript('in tokyo please', is_final=False)
+        self.assertEqual((speculator.stats.discarded, speculator.stats.wasted_tokens), (1, 10))
+        self.assertIsNone(speculator.take('what time is it in tokyo please'))
+        self.assertEqual(speculator.stats.committed, 0)
+
+    async def test_take_with_a_different_final_discards(self):
+        speculator = self.speculator()
+        speculator.on_transcript('send an email to john', is_final=True)
+        await asyncio.sleep(0.01)
+        self.assertIsNone(speculator.take('cancel that, never mind'))
+        self.assertEqual((speculator.stats.discarded, speculator.stats.hit_rate), (1, 0.0))
+
+    async def test_failed_speculation_is_not_used(self):
+        async def start_stream(text):
+            raise RuntimeError('provider down')
+            yield
+
+        speculator = Speculator(start_stream)
+        speculator.on_transcript('what time is it', is_final=True)
+        await asyncio.sleep(0.01)
+        self.assertIsNone(speculator.take('what time is it'))
+        self.assertEqual(speculator.stats.discarded, 1)
+
+
+class TTSAudioCacheTests(SimpleTestCase):
+    VOICE = ('voice-1', 'sonic', 16000)
+    PCM = bytes(range(256)) * 25  # 6400 bytes: 200ms of 16kHz mono
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def cache(self, clips=3):
+        # Room for `clips` clips of PCM
+        return TTSAudioCache(self.directory, max_bytes=clips * (len(self.PCM) + 12))
+
+    def put(self, cache, text):
+        return cache.put(text, *self.VOICE, num_channels=1, pcm=self.PCM)
+
+    def cached(self, cache):
+        return sorted(text for text in ('one', 'two', 'three', 'four') if cache.contains(text, *self.VOICE))
+
+    def test_round_trip(self):
+        cache = self.cache()
+        self.put(cache, 'One moment.')
+        audio = cache.get('  One   moment. ', *self.VOICE)
+        self.addCleanup(audio.close)
+        self.assertEqual((audio.sample_rate, audio.num_channels, audio.duration), (16000, 1, 0.2))
+        chunks = list(audio.chunks(frame_ms=20))
+        self.assertEqual((len(chunks), b''.join(chunks)), (10, self.PCM))
+        self.assertIsNone(cache.get('One moment.', 'voice-2', 'sonic', 16000))
+        self.assertIsNone(cache.put('long', *self.VOICE, num_channels=1, pcm=bytes(4 * len(self.PCM))))
+
+    def test_least_recently_used_clip_is_evicted(self):
+        cache = self.cache()
+        for text in ('one', 'two', 'three'):
+            self.put(cache, text)
+        cache.get('one', *self.VOICE).close()
+        self.put(cache, 'four')
+        self.assertEqual(self.cached(cache), ['four', 'one', 'three'])
+        self.assertEqual(len(list(self.directory.glob('*.pcm'))), 3)
+        self.assertLessEqual(cache.stats()['bytes'], cache.max_bytes)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_restart_rebuilds_recency_from_mtimes(self):
+        cache = self.cache()
+        for age, text in ((30, 'one'), (10, 'two'), (20, 'three')):
+            key = self.put(cache, text)
+            stamp = time.time() - age
+            os.utime(self.directory / f'{key}.pcm', (stamp, stamp))
+        restarted = self.cache(clips=2)
+        self.assertEqual(self.cached(restarted), ['three', 'two'])
+        self.assertEqual(restarted.stats()['entries'], 2)
+        self.put(restarted, 'four')
+        self.assertEqual(self.cached(restarted), ['four', 'two'])
+
+    def test_corrupt_clip_is_dropped(self):
+        cache = self.cache()
+        key = self.put(cache, 'one')
+        (self.directory / f'{key}.pcm').write_bytes(b'not audio')
+        self.assertIsNone(cache.get('one', *self.VOICE))
+        self.assertFalse((self.directory / f'{key}.pcm').exists())
+        self.assertEqual((cache.stats()['entries'], cache.stats()['misses']), (0, 1))
+
+
+class ToolRuntimeTests(SimpleTestCase):
+    def runtime(self, min_filler_gap=0.0, **policy):
+        self.spoken = []
+        policy = ToolPolicy(**{'timeout': 1.0, 'filler_after': 0.05, 'progress_every': 0.1, **policy})
+        return ToolRuntime({'send_email': policy}, speak=self.spoken.append, min_filler_gap=min_filler_gap)
+
+    @staticmethod
+    def tool(seconds, result='sent', state=None):
+        async def run(**kwargs):
+            try:
+                await asyncio.sleep(seconds)
+            except asyncio.CancelledError:
+                if state is not None:
+                    state['cancelled'] = True
+                raise
+            return result
+        return run
+
+    async def test_fast_tool_says_nothing(self):
+        runtime = self.runtime()
+        self.assertEqual(await runtime.run('send_email', self.tool(0.01)), 'sent')
+        self.assertEqual(self.spoken, [])
+
+    async def test_slow_tool_gets_a_filler_then_progress(self):
+        runtime = self.runtime()
+        self.assertEqual(await runtime.run('send_email', self.tool(0.3)), 'sent')
+        self.assertEqual(self.spoken, ['One moment.', 'Still working on it.'])
+
+    async def test_deadline_cancels_the_tool(self):
+        state = {}
+        runtime = self.runtime(timeout=0.15)
+        started = time.perf_counter()
+        self.assertEqual(await runtime.run('send_email', self.tool(5, state=state)),
+                         DEFAULT_POLICY.timeout_message)
+        self.assertLess(time.perf_counter() - started, 1.0)
+        self.assertTrue(state['cancelled'])
+
+    async def test_unknown_tool_uses_the_default_policy(self):
+        runtime = self.runtime()
+        self.assertEqual(await runtime.run('get_time', self.tool(0.01, result='noon')), 'noon')
+
+    async def test_concurrent_tools_share_the_filler_gap(self):
+        runtime = self.runtime(min_filler_gap=5.0)
+        results = await asyncio.gather(runtime.run('send_email', self.tool(0.2)),
+                                       runtime.run('send_email', self.tool(0.2)))
+        self.assertEqual(results, ['sent', 'sent'])
+        self.assertEqual(self.spoken, ['One moment.'])
+
+    async def test_cancelling_the_caller_cancels_the_tool(self):
+        state = {}
+        runtime = self.runtime()
+        call = asyncio.create_task(runtime.run('send_email', self.tool(5, state=state)))
+        await asyncio.sleep(0.02)
+        call.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await call
+        await asyncio.sleep(0)
+        self.assertTrue(state['cancelled'])
+
+    async def test_speak_failure_does_not_fail_the_tool(self):
+        def speak(text):
+            raise RuntimeError('session closed')
+
+        runtime = ToolRuntime({'send_email': ToolPolicy(filler_after=0.01)}, speak=speak)
+        self.assertEqual(await runtime.run('send_email', self.tool(0.05)), 'sent')
+
+    async def test_aclose_cancels_running_tools(self):
+        state = {}
+        runtime = self.runtime()
+        call = asyncio.create_task(runtime.run('send_email', self.tool(5, state=state)))
+        await asyncio.sleep(0.02)
+        await runtime.aclose()
+        self.assertTrue(state['cancelled'])
+        with self.assertRaises(asyncio.CancelledError):
+            await call
+
+
+class TimezoneIndexTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.index = TimezoneIndex()
+
+    def offset_hours(self, name):
+        entries = self.index.lookup(name)
+        self.assertIsNotNone(entries, name)
+        return entries[0].tz.utcoffset(datetime(2026, 1, 15)).total_seconds() / 3600
+
+    def test_utc_offsets_keep_their_sign(self):
+        self.assertEqual(self.offset_hours('GMT+5'), 5)
+        self.assertEqual(self.offset_hours('utc-3:30'), -3.5)
+        self.assertEqual(self.offset_hours('UTC plus 5'), 5)
+        self.assertEqual(self.offset_hours('what time is it in GMT-8'), -8)
+        self.assertIsNone(self.index.lookup('utc+15'))
+
+    def test_etc_zones_keep_posix_meaning(self):
+        self.assertEqual(self.index.lookup('Etc/GMT+5')[0].zone, 'Etc/GMT+5')
+        self.assertEqual(self.offset_hours('Etc/GMT+5'), -5)
+        self.assertEqual(self.offset_hours('Etc/GMT-5'), 5)
+
+    def test_country_codes_are_not_words(self):
+        for word in ('in', 'it', 'me', 'no', 'is'):
+            self.assertIsNone(self.index.lookup(word), word)
+
+    def test_states_and_cities(self):
+        self.assertEqual(self.index.lookup('Indiana')[0].zone, 'America/Indiana/Indianapolis')
+        self.assertEqual(self.index.lookup('texas')[0].zone, 'America/Chicago')
+        self.assertEqual(self.index.lookup('California')[0].zone, 'America/Los_Angeles')
+        self.assertEqual(self.index.lookup('St. Louis')[0].zone, 'America/Chicago')
+        self.assertEqual(self.index.lookup('Port-au-Prince')[0].zone, 'America/Port-au-Prince')
+
+    def test_fuzzy_match_is_strict_and_only_for_long_names(self):
+        self.assertEqual(self.index.lookup('Tokoyo')[0].zone, 'Asia/Tokyo')
+        self.assertEqual(self.index.lookup('indianna')[0].zone, 'America/Indiana/Indianapolis')
+        self.assertIsNone(self.index.lookup('Toky'))
+        self.assertIsNone(self.index.lookup('banana'))
+
+    def test_country_zones_collapse_by_offset(self):
+        lines = self.index.current_time('canada').splitlines()
+        self.assertLess(len(lines), 8)
+        self.assertEqual(len(lines), len({line.rsplit(': ', 1)[1] for line in lines}))
+        self.assertTrue(any('Toronto' in line for line in lines), lines)
+
+    def test_current_time_is_cached_until_the_minute_changes(self):
+        index = TimezoneIndex()
+        with mock.patch('api.timezones.time.time', return_value=60 * 1000 + 5), \
+                mock.patch.object(index, 'lookup', wraps=index.lookup) as lookup:
+            first = index.current_time('Tokyo')
+            self.assertEqual(index.current_time('what time is it in tokyo'), first)
+            self.assertEqual(lookup.call_count, 1)
+        with mock.patch('api.timezones.time.time', return_value=60 * 1001), \
+                mock.patch.object(index, 'lookup', wraps=index.lookup) as lookup:
+            index.current_time('Tokyo')
+            self.assertEqual(lookup.call_count, 1)
+        self.assertIsNone(index.current_time('nowhere at all'))
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.job = outbox.enqueue_email('a@example.com', 'Hi', 'Body', max_attempts=3)
+
+    def test_claim_is_exclusive(self):
+        claimed = outbox.claim_next_job()
+        self.assertEqual(claimed.pk, self.job.pk)
+        self.assertEqual((claimed.status, claimed.attempts), (OutboundEmail.STATUS_SENDING, 1))
+        self.assertIsNotNone(claimed.locked_at)
+        self.assertIsNone(outbox.claim_next_job())
+
+    def test_claim_skips_jobs_not_yet_due(self):
+        OutboundEmail.objects.filter(pk=self.job.pk).update(next_attempt_at=timezone.now() + timedelta(minutes=1))
+        self.assertIsNone(outbox.claim_next_job())
+
+    def test_failed_job_is_rescheduled_with_backoff(self):
+        job = outbox.claim_next_job()
+        before = timezone.now()
+        with mock.patch('api.outbox.random.uniform', return_value=1.0):
+            outbox.fail_job(job, 'Gmail said no')
+        job.refresh_from_db()
+        self.assertEqual(job.status, OutboundEmail.STATUS_PENDING)
+        self.assertEqual(job.last_error, 'Gmail said no')
+        self.assertIsNone(job.locked_at)
+        self.assertAlmostEqual((job.next_attempt_at - before).total_seconds(), outbox.RETRY_BASE_DELAY, delta=0.5)
+        self.assertIsNone(outbox.claim_next_job())
+
+    def test_backoff_doubles_up_to_the_cap(self):
+        with mock.patch('api.outbox.random.uniform', return_value=1.0):
+            self.assertEqual([outbox.backoff_delay(n) for n in (1, 2, 3)], [2.0, 4.0, 8.0])
+            self.assertEqual(outbox.backoff_delay(30), outbox.RETRY_MAX_DELAY)
+        for _ in range(20):
+            self.assertTrue(1.6 <= outbox.backoff_delay(1) <= 2.4)
+
+    def test_job_fails_at_max_attempts(self):
+        for attempt in range(3):
+            OutboundEmail.objects.filter(pk=self.job.pk).update(next_attempt_at=timezone.now())
+            job = outbox.claim_next_job()
+            outbox.fail_job(job, f'error {attempt}')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.last_error), (OutboundEmail.STATUS_FAILED, 3, 'error 2'))
+        self.assertIsNone(outbox.claim_next_job())
+
+    def test_stale_sending_job_is_recovered(self):
+        outbox.claim_next_job()
+        self.assertEqual(outbox.recover_stale_jobs(), 0)
+        OutboundEmail.objects.filter(pk=self.job.pk).update(
+            locked_at=timezone.now() - outbox.LEASE_TIMEOUT - timedelta(seconds=1))
+        self.assertEqual(outbox.recover_stale_jobs(), 1)
+        job = outbox.claim_next_job()
+        self.assertEqual((job.pk, job.attempts), (self.job.pk, 2))
+
+    def test_stale_job_out_of_attempts_fails(self):
+        OutboundEmail.objects.filter(pk=self.job.pk).update(
+            status=OutboundEmail.STATUS_SENDING, attempts=3,
+            locked_at=timezone.now() - outbox.LEASE_TIMEOUT - timedelta(seconds=1))
+        self.assertEqual(outbox.recover_stale_jobs(), 1)
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.locked_at), (OutboundEmail.STATUS_FAILED, None))
+        self.assertIsNone(outbox.claim_next_job())
+
+    @staticmethod
+    def _service(send):
+        class Service:
+            async def send_email(self, to, subject, body, account=None):
+                return await send()
+        return Service()
+
+    def test_worker_marks_job_sent(self):
+        async def send():
+            return {'status': 'success', 'message_id': 'm-1'}
+
+        job = outbox.claim_next_job()
+        pool = outbox.OutboxWorkerPool(None, concurrency=1, poll_interval=0.01)
+        # async_to_sync keeps the worker's ORM calls on this thread's (test transaction's) connection
+        async_to_sync(pool._process)(job, self._service(send))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.message_id, job.locked_at), (OutboundEmail.STATUS_SENT, 'm-1', None))
+
+    def test_worker_gets_the_service_before_claiming(self):
+        seen = []
+
+        async def get_service():
+            job = await OutboundEmail.objects.aget(pk=self.job.pk)
+            seen.append((job.status, job.attempts))
+            return self._service(send)
+
+        async def send():
+            pool.stop()
+            return {'status': 'success', 'message_id': 'm-1'}
+
+        pool = outbox.OutboxWorkerPool(get_service, concurrency=1, poll_interval=0.01)
+        async_to_sync(pool._worker)(0)
+        self.assertEqual(seen, [(OutboundEmail.STATUS_PENDING, 0)])
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, OutboundEmail.STATUS_SENT)
+
+    def test_slow_send_times_out_inside_the_lease(self):
+        self.assertLess(outbox.SEND_TIMEOUT, outbox.LEASE_TIMEOUT.total_seconds())
+
+        async def send():
+            await asyncio.sleep(5)
+
+        job = outbox.claim_next_job()
+        with mock.patch.object(outbox, 'SEND_TIMEOUT', 0.05):
+            async_to_sync(outbox.OutboxWorkerPool(None)._process)(job, self._service(send))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_at), (OutboundEmail.STATUS_PENDING, None))
+        self.assertIn('timed out', job.last_error)
+
+    def test_send_outliving_its_lease_leaves_the_job_to_the_new_holder(self):
+        async def send():
+            # The lease runs out mid-send; the reaper requeues the job and another worker claims it
+            await OutboundEmail.objects.filter(pk=self.job.pk).aupdate(
+                locked_at=timezone.now() - outbox.LEASE_TIMEOUT - timedelta(seconds=1))
+            await sync_to_async(outbox.recover_stale_jobs)()
+            reclaimed.append(await sync_to_async(outbox.claim_next_job)())
+            return {'status': 'success', 'message_id': 'late'}
+
+        reclaimed = []
+        job = outbox.claim_next_job()
+        async_to_sync(outbox.OutboxWorkerPool(None)._process)(job, self._service(send))
+        current = OutboundEmail.objects.get(pk=self.job.pk)
+        self.assertEqual((current.status, current.attempts, current.message_id), (OutboundEmail.STATUS_SENDING, 2, ''))
+        self.assertEqual(current.locked_at, reclaimed[0].locked_at)
+        self.assertFalse(outbox.fail_job(job, 'late failure'))
+
+        self.assertTrue(outbox.complete_job(reclaimed[0], 'm-2'))
+        current.refresh_from_db()
+        self.assertEqual((current.status, current.message_id), (OutboundEmail.STATUS_SENT, 'm-2'))
+
+
+class QueuedSendEmailApiTests(TestCase):
+    def test_queue_returns_202_and_job_status(self):
+        response = self.client.post('/api/send-email/', {'to': 'a@example.com', 'subject': 'Hi', 'body': 'Body',
+                                                          'queue': True}, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        data = response.json()
+        self.assertEqual(data['status'], OutboundEmail.STATUS_PENDING)
+        self.assertEqual(data['status_url'], f"/api/send-email/jobs/{data['job_id']}/")
+
+        status = self.client.get(data['status_url'])
+        self.assertEqual(status.status_code, 200)
+        self.assertEqual(status.json()['job_id'], data['job_id'])
+        self.assertEqual(status.json()['status'], OutboundEmail.STATUS_PENDING)
+        # Anyone with the id can ask, so the message itself stays private
+        self.assertFalse({'to', 'subject', 'body', 'account', 'last_error'} & set(status.json()))
+
+    def test_email_tool_follows_the_django_setting(self):
+        with override_settings(EMAIL_QUEUE_ENABLED=True):
+            result = async_to_sync(send_email_tool)('b@example.com', 'Hi', 'Body')
+        self.assertIn('queued', result)
+        self.assertTrue(OutboundEmail.objects.filter(to='b@example.com').exists())
+
+        with override_settings(EMAIL_QUEUE_ENABLED=False), mock.patch.dict(os.environ, {'EMAIL_QUEUE_ENABLED': 'true'}), \
+                mock.patch('api.tools.initialize_ai_service', return_value=None):
+            result = async_to_sync(send_email_tool)('c@example.com', 'Hi', 'Body')
+        self.assertIn('not available', result)
+        self.assertFalse(OutboundEmail.objects.filter(to='c@example.com').exists())
+
+    def test_unknown_job_is_404(self):
+        response = self.client.get('/api/send-email/jobs/00000000-0000-0000-0000-000000000000/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_missing_field_is_400(self):
+        response = self.client.post('/api/send-email/', {'to': 'a@example.com', 'queue': True},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(EMAIL_QUEUE_ENABLED=False)
+class SendEmailApiTests(SimpleTestCase):
+    async def post(self, body):
+        return await AsyncClient().post('/api/send-email/', body, content_type='application/json')
+
+    async def test_direct_send(self):
+        service = make_offline_service(gmail_service=FakeGmailService(latency=0))
+        self.addCleanup(service.close)
+        with mock.patch('api.tools.initialize_ai_service', return_value=service):
+            response = await self.post({'to': 'a@example.com', 'subject': 'Hi', 'body': 'Body'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json(), {'success': True,
+                                           'message': "Email successfully sent to a@example.com with subject 'Hi'."})
+
+    async def test_send_failure_is_500(self):
+        with mock.patch('api.tools.initialize_ai_service', return_value=None):
+            response = await self.post({'to': 'a@example.com', 'subject': 'Hi', 'body': 'Body'})
+        self.assertEqual(response.status_code, 500)
+        self.assertIn('not available', response.json()['error'])
+
+    async def test_missing_field_is_400(self):
+        response = await self.post({'to': 'a@example.com', 'subject': 'Hi'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Missing required field: body'})
+
+    async def test_invalid_json_is_400(self):
+        response = await self.post('{"to": ')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Invalid JSON data'})
+
+
+class ResponseCacheTests(SimpleTestCase):
+    def test_entries_expire_after_ttl(self):
+        cache = ResponseCache(ttl=10)
+        with mock.patch('api.response_cache.time.time', return_value=1000.0):
+            cache.set('k', 'v')
+        with mock.patch('api.response_cache.time.time', return_value=1009.0):
+            self.assertEqual(cache.get('k'), 'v')
+        with mock.patch('api.response_cache.time.time', return_value=1010.0):
+            self.assertIsNone(cache.get('k'))
+        self.assertEqual(cache.stats()['expirations'], 1)
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = ResponseCache(ttl=60, max_entries=2)
+        cache.set('a', '1')
+        cache.set('b', '2')
+        cache.get('a')
+        cache.set('c', '3')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), ('1', '3'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_empty_values_are_not_cached(self):
+        cache = ResponseCache(ttl=60)
+        cache.set('k', '')
+        self.assertIsNone(cache.get('k'))
+
+    def test_keys_ignore_whitespace_but_not_model(self):
+        self.assertEqual(ResponseCache.make_key('hello  world\n', 'm'), ResponseCache.make_key(' hello world', 'm'))
+        self.assertNotEqual(ResponseCache.make_key('hello', 'm1'), ResponseCache.make_key('hello', 'm2'))
+
+    async def test_concurrent_misses_share_one_call(self):
+        cache = ResponseCache(ttl=60)
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return 'value'
+
+        results = await asyncio.gather(*(cache.get_or_compute('k', compute) for _ in range(5)))
+        self.assertEqual(results, ['value'] * 5)
+        self.assertEqual(calls, 1)
+        self.assertEqual(cache.stats()['coalesced'], 4)
+        self.assertEqual(await cache.get_or_compute('k', compute), 'value')
+        self.assertEqual(calls, 1)
+
+    async def test_cancelled_caller_does_not_cancel_the_flight(self):
+        cache = ResponseCache(ttl=60)
+
+        async def compute():
+            await asyncio.sleep(0.05)
+            return 'value'
+
+        first = asyncio.ensure_future(cache.get_or_compute('k', compute))
+        second = asyncio.ensure_future(cache.get_or_compute('k', compute))
+        await asyncio.sleep(0)
+        first.cancel()
+        self.assertEqual(await second, 'value')
+
+    async def test_disk_tier_survives_restart(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'responses.sqlite3')
+        cache = ResponseCache(ttl=60, disk_path=path)
+
+        async def compute():
+            return 'from upstream'
+
+        self.assertEqual(await cache.get_or_compute('k', compute), 'from upstream')
+        cache.close()
+
+        reopened = ResponseCache(ttl=60, disk_path=path)
+        self.addCleanup(reopened.close)
+
+        async def fail():
+            raise AssertionError('should have come from disk')
+
+        self.assertEqual(await reopened.get_or_compute('k', fail), 'from upstream')
+        self.assertEqual(reopened.stats()['disk_hits'], 1)
+        # Promoted to memory: the next lookup does not touch the disk
+        self.assertEqual(reopened.get('k'), 'from upstream')
+
+
+class JsonStreamTests(SimpleTestCase):
+    def array(self, body, chunk_size=jsonstream.CHUNK_SIZE):
+        stream = io.BytesIO(body)
+        is_array, prefix = jsonstream.sniff_array(stream)
+        self.assertTrue(is_array)
+        with mock.patch.object(jsonstream, 'CHUNK_SIZE', chunk_size):
+            return list(jsonstream.iter_json_array(stream, prefix))
+
+    def test_array_items(self):
+        body = b'\xef\xbb\xbf [ "a", {"id": 1, "text": "b"}, 12345, [1, 2], null ]'
+        expected = ["a", {"id": 1, "text": "b"}, 12345, [1, 2], None]
+        self.assertEqual(self.array(body), expected)
+        # Elements, numbers and multi-byte characters split across reads
+        self.assertEqual(self.array(body, chunk_size=3), expected)
+        self.assertEqual(self.array('["caf\u00e9", "\u00fc"]'.encode(), chunk_size=1), ["caf\u00e9", "\u00fc"])
+        self.assertEqual(self.array(b'[]'), [])
+
+    def test_malformed_array(self):
+        for body in (b'["a", "b"', b'["a" "b"]', b'["a", nope]', b'["a",'):
+            with self.subTest(body=body), self.assertRaises(jsonstream.StreamFormatError):
+                self.array(body)
+        items = []
+        with self.assertRaises(jsonstream.StreamFormatError):
+            for item in jsonstream.iter_json_array(io.BytesIO(b'["a", "b", oops]')):
+                items.append(item)
+        self.assertEqual(items, ["a", "b"])
+
+    def test_oversized_array_element(self):
+        with mock.patch.object(jsonstream, 'MAX_ITEM_SIZE', 16), self.assertRaises(jsonstream.StreamFormatError):
+            self.array(b'["short", "' + b'x' * 100 + b'"]', chunk_size=8)
+
+    def test_ndjson_reports_bad_lines_and_carries_on(self):
+        stream = io.BytesIO(b'"a"\n\n{"text": "b"}\nnot json\n"c"')
+        is_array, prefix = jsonstream.sniff_array(stream)
+        self.assertFalse(is_array)
+        items = list(jsonstream.iter_ndjson(stream, prefix))
+        self.assertEqual([item for item, _ in items], ["a", {"text": "b"}, None, "c"])
+        self.assertIsNone(items[0][1])
+        self.assertTrue(items[2][1].startswith("Invalid JSON"))
+
+    def test_ndjson_oversized_line_is_skipped(self):
+        with mock.patch.object(jsonstream, 'MAX_ITEM_SIZE', 16):
+            items = list(jsonstream.iter_ndjson(io.BytesIO(b'"' + b'x' * 100 + b'"\n"ok"\n')))
+        self.assertEqual(items[0][0], None)
+        self.assertEqual(items[1], ("ok", None))
+
+
+class VoiceCommandApiTests(SimpleTestCase):
+    async def post(self, body):
+        return await AsyncClient().post('/api/process-voice-command/', body, content_type='application/json')
+
+    async def test_email_command(self):
+        response = await self.post({'text': 'send an email to john@example.com subject Lunch body see you at noon'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['action'], data['detected'], data['skip_llm']), ('email', True, True))
+        self.assertEqual(data['message'], 'Email request detected with recipient, subject and body.')
+
+    async def test_missing_text_is_400(self):
+        response = await self.post({'words': 'hello'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Missing required field: text'})
+
+    async def test_invalid_json_is_400(self):
+        response = await self.post('{oops')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Invalid JSON data'})
+
+    def test_classify_voice_command(self):
+        result = views.classify_voice_command('send an email to john@example.com')
+        self.assertEqual(result['action'], 'email')
+        self.assertFalse(result['skip_llm'])
+        self.assertTrue(result['message'].startswith('Email request detected. Please provide: '))
+
+        self.assertEqual(views.classify_voice_command('what time is it in Lagos')['message'], 'Time request detected.')
+
+        result = views.classify_voice_command('hello there')
+        self.assertEqual((result['action'], result['detected']), ('other', False))
+        self.assertEqual(result['message'], 'No specific action detected. Processing as general query.')
+
+
+class VoiceCommandBatchTests(SimpleTestCase):
+    async def post(self, body, content_type='application/json'):
+        response = await AsyncClient().post('/api/process-voice-command/batch/', body, content_type=content_type)
+        self.assertEqual(response.status_code, 200)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        return [json.loads(line) for line in content.decode().splitlines()]
+
+    async def test_json_array(self):
+        lines = await self.post(json.dumps([
+            "send an email to john@example.com subject Lunch body see you at noon",
+            {"id": "call-42", "text": "what time is it in Lagos"},
+            {"id": "bad"},
+        ]))
+        self.assertEqual([line.get('index') for line in lines[:3]], [0, 1, 2])
+        self.assertEqual((lines[0]['action'], lines[0]['skip_llm']), ('email', True))
+        self.assertEqual((lines[1]['id'], lines[1]['action']), ('call-42', 'time'))
+        self.assertIn('error', lines[2])
+        self.assertEqual(lines[3]['summary'], {'total': 3, 'errors': 1, 'actions': {'email': 1, 'time': 1}})
+
+    async def test_ndjson(self):
+        lines = await self.post(b'"hello there"\n{oops\n"what time is it in Paris"\n', 'application/x-ndjson')
+        self.assertEqual(lines[0]['action'], 'other')
+        self.assertTrue(lines[1]['error'].startswith('Invalid JSON'))
+        self.assertEqual(lines[2]['slots'], {'location': 'Paris'})
+        self.assertEqual(lines[3]['summary']['errors'], 1)
+
+    async def test_malformed_array_stops_with_an_error_line(self):
+        lines = await self.post(b'["what time is it in Paris", oops, "never read"]')
+        self.assertEqual(lines[0]['action'], 'time')
+        self.assertEqual(lines[1]['index'], 1)
+        self.assertIn('error', lines[1])
+        self.assertEqual(lines[2]['summary'], {'total': 2, 'errors': 1, 'actions': {'time': 1}})
+
+    async def test_large_batch_yields_the_event_loop(self):
+        with mock.patch('api.views.CLASSIFY_FLUSH_LINES', 10):
+            response = await AsyncClient().post('/api/process-voice-command/batch/',
+                                                json.dumps(["what time is it in Paris"] * 200),
+                                                content_type='application/json')
+            ticks = 0
+            stop = asyncio.Event()
+
+            async def ticker():
+                nonlocal ticks
+                while not stop.is_set():
+                    ticks += 1
+                    await asyncio.sleep(0)
+
+            task = asyncio.create_task(ticker())
+            await asyncio.sleep(0)
+            ticks = 0
+            chunks = [chunk async for chunk in response.streaming_content]
+            stop.set()
+            await task
+        self.assertEqual(json.loads(chunks[-1].splitlines()[-1])['summary']['total'], 200)
+        # Other tasks get a turn between the flushed groups of ten
+        self.assertGreaterEqual(ticks, 19)
+
+
+LIVEKIT_KEY = 'test-key'
+LIVEKIT_SECRET = 'test-secret-' + 'x' * 32
+
+
+def verify_livekit_token(token):
+    from livekit import api
+    return api.TokenVerifier(LIVEKIT_KEY, LIVEKIT_SECRET).verify(token)
+
+
+class LiveKitTokenCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = LiveKitTokenCache(LIVEKIT_KEY, LIVEKIT_SECRET, ttl=3600, refresh_margin=600)
+
+    def test_repeat_request_is_a_cache_hit(self):
+        token, expires_at = self.cache.get('room', 'alice')
+        self.assertEqual(self.cache.get('room', 'alice'), (token, expires_at))
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['minted'], 1)
+        self.assertNotEqual(self.cache.get('room', 'bob')[0], token)
+        self.assertNotEqual(self.cache.get('room', 'alice', grants={'can_publish': False})[0], token)
+        self.assertEqual(verify_livekit_token(token).identity, 'alice')
+
+    def test_token_is_reminted_within_refresh_margin(self):
+        with mock.patch('api.livekit.time.time', return_value=1_000_000.0):
+            token, expires_at = self.cache.get('room', 'alice')
+        self.assertEqual(expires_at, 1_000_000.0 + 3600)
+        with mock.patch('api.livekit.time.time', return_value=expires_at - 601):
+            self.assertEqual(self.cache.get('room', 'alice')[0], token)
+        with mock.patch('api.livekit.time.time', return_value=expires_at - 600):
+            fresh, fresh_expires_at = self.cache.get('room', 'alice')
+        self.assertEqual(fresh_expires_at, expires_at - 600 + 3600)
+        self.assertEqual(self.cache.stats()['minted'], 2)
+
+    def test_disabled_cache_always_mints(self):
+        cache = LiveKitTokenCache(LIVEKIT_KEY, LIVEKIT_SECRET, enabled=False)
+        cache.get('room', 'alice')
+        cache.get('room', 'alice')
+        self.assertEqual(cache.stats(), {'entries': 0, 'minted': 2})
+
+    def test_grants_can_only_be_switched_off(self):
+        token, _ = self.cache.get('room', 'alice', grants={'can_publish': False})
+        claims = verify_livekit_token(token)
+        self.assertFalse(claims.video.can_publish)
+        self.assertEqual(claims.video.room, 'room')
+        for grants in ({'room_admin': True}, {'room': 'other'}, {'can_publish': 'yes'}, ['can_publish']):
+            with self.subTest(grants=grants), self.assertRaises(ValueError):
+                LiveKitTokenCache.clean_grants(grants)
+
+
+@override_settings(LIVEKIT_TOKEN_GMAIL_ACCOUNTS=['sales'])
+class LiveKitTokenApiTests(SimpleTestCase):
+    def setUp(self):
+        cache = LiveKitTokenCache(LIVEKIT_KEY, LIVEKIT_SECRET)
+        patcher = mock.patch('api.views.get_token_cache', return_value=cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def metadata(self, token):
+        return verify_livekit_token(token).metadata
+
+    def test_allowed_account_is_signed_into_metadata(self):
+        response = self.client.get('/api/livekit-token/', {'room': 'r', 'username': 'u', 'account': 'sales'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(self.metadata(response.json()['token'])), {'gmail_account': 'sales'})
+
+    def test_default_account_needs_no_metadata(self):
+        for params in ({}, {'account': 'default'}):
+            response = self.client.get('/api/livekit-token/', {'room': 'r', 'username': 'u', **params})
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(self.metadata(response.json()['token']))
+
+    def test_other_accounts_are_refused(self):
+        response = self.client.get('/api/livekit-token/', {'room': 'r', 'username': 'u', 'account': 'ceo'})
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get('/api/livekit-token/', {'room': 'r', 'username': 'u', 'account': '../ceo'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_checks_each_participant(self):
+        url = '/api/livekit-token/bulk/'
+        ok = {'room': 'r', 'participants': [{'username': 'a', 'account': 'sales'},
+                                             {'username': 'b', 'grants': {'can_publish': False}}]}
+        response = self.client.post(url, ok, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([t['username'] for t in response.json()['tokens']], ['a', 'b'])
+
+        refused = {'room': 'r', 'participants': [{'username': 'a'}, {'username': 'b', 'account': 'ceo'}]}
+        response = self.client.post(url, refused, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(response.json()['error'].startswith('participants[1]'))
+
+        escalate = {'room': 'r', 'participants': [{'username': 'a', 'grants': {'room_admin': True}}]}
+        self.assertEqual(self.client.post(url, escalate, content_type='application/json').status_code, 400)
+
+    async def test_bulk_is_a_native_async_view(self):
+        self.assertTrue(asyncio.iscoroutinefunction(views.generate_livekit_tokens_bulk))
+        payload = {'room': 'r', 'participants': [{'username': f'user-{i}'} for i in range(250)]}
+        response = await AsyncClient().post('/api/livekit-token/bulk/', payload, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        tokens = response.json()['tokens']
+        self.assertEqual([t['username'] for t in tokens], [f'user-{i}' for i in range(250)])
+        self.assertEqual(verify_livekit_token(tokens[-1]['token']).identity, 'user-249')
+
+
+class ServiceRegistryTests(SimpleTestCase):
+    def registry(self, factory=None, **kwargs):
+        self.builds = 0
+
+        def build():
+            self.builds += 1
+            time.sleep(0.05)
+            return factory() if factory else object()
+
+        return ServiceRegistry(build, name='TestService', **kwargs)
+
+    async def test_concurrent_awaiters_share_one_build(self):
+        registry = self.registry()
+        instances = await asyncio.gather(*(registry.get() for _ in range(10)))
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(len({id(instance) for instance in instances}), 1)
+        self.assertIs(registry.peek(), instances[0])
+        self.assertEqual(registry.status()['state'], 'ready')
+
+    async def test_timed_out_caller_does_not_cancel_the_build(self):
+        registry = self.registry()
+        self.assertIsNone(await registry.get(timeout=0.01))
+        self.assertIsNotNone(await registry.get())
+        self.assertEqual(self.builds, 1)
+
+    async def test_failed_build_is_retried_after_the_interval(self):
+        failures = [RuntimeError('Gmail unreachable')]
+
+        def factory():
+            if failures:
+                raise failures.pop()
+            return 'service'
+
+        registry = self.registry(factory, retry_interval=0.2)
+        self.assertIsNone(await registry.get())
+        status = registry.status()
+        self.assertEqual((status['state'], status['error']), ('failed', 'Gmail unreachable'))
+        # Inside the window the failure is reported without another build
+        self.assertIsNone(await registry.get())
+        self.assertEqual(self.builds, 1)
+        await asyncio.sleep(0.2)
+        self.assertEqual(await registry.get(), 'service')
+        self.assertEqual(self.builds, 2)
+
+    async def test_forked_process_builds_its_own(self):
+        registry = self.registry()
+        parent = await registry.get()
+        with mock.patch('api.registry.os.getpid', return_value=os.getpid() + 1):
+            self.assertIsNone(registry.peek())
+            self.assertEqual(registry.status()['state'], 'idle')
+            child = await registry.get()
+        self.assertIsNot(child, parent)
+        self.assertEqual(self.builds, 2)
+
+
+class HealthCheckTests(SimpleTestCase):
+    async def test_ready_probe_is_503_until_the_service_is_built(self):
+        release = threading.Event()
+        registry = ServiceRegistry(lambda: release.wait(5) and object(), name='AIService')
+        self.addCleanup(release.set)
+        client = AsyncClient()
+        with mock.patch('api.views.ai_service_registry', registry):
+            for state in ('idle', 'initializing'):
+                response = await client.get('/api/health/', {'ready': '1'})
+                self.assertEqual(response.status_code, 503)
+                self.assertEqual((response.json()['status'], response.json()['ai_service']['state']),
+                                 ('starting', state))
+                registry.start()
+            self.assertEqual((await client.get('/api/health/')).status_code, 200)
+
+            release.set()
+            await registry.get()
+            response = await client.get('/api/health/', {'ready': '1'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['ai_service']['state'], 'ready')
+
+    async def test_ready_probe_is_503_after_a_failed_build(self):
+        def fail():
+            raise RuntimeError('no credentials')
+
+        registry = ServiceRegistry(fail, name='AIService')
+        with mock.patch('api.views.ai_service_registry', registry):
+            await registry.get()
+            response = await AsyncClient().get('/api/health/', {'ready': '1'})
+        self.assertEqual((response.status_code, response.json()['status']), (503, 'unavailable'))
+
+
+class GmailClientPoolTests(SimpleTestCase):
+    def pool(self, **kwargs):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        pool = GmailClientPool(Path(directory.name) / 'token.json', Path(directory.name),
+                               Path(directory.name) / 'credentials.json', scopes=[], **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_concurrent_acquires_build_each_account_once(self):
+        pool = self.pool()
+        builds = []
+
+        def build(account, interactive):
+            builds.append(account)
+            time.sleep(0.05)
+            return GmailClient(account, object())
+
+        with mock.patch.object(pool, '_build', side_effect=build):
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                clients = list(executor.map(pool.acquire, ['sales', 'support'] * 8))
+        self.assertEqual(sorted(builds), ['sales', 'support'])
+        self.assertEqual(len({id(client) for client in clients}), 2)
+        self.assertEqual(pool.stats()['builds'], 2)
+
+    def test_failed_build_is_retried(self):
+        pool = self.pool()
+        with self.assertRaises(UnknownAccountError):
+            pool.acquire('nobody')
+        with mock.patch.object(pool, '_build', return_value=GmailClient('nobody', object())):
+            self.assertEqual(pool.acquire('nobody').account, 'nobody')
+        with self.assertRaises(ValueError):
+            pool.acquire('../etc/passwd')
+
+    def test_each_thread_gets_its_own_http(self):
+        client = GmailClient('sales', object())
+        barrier = threading.Barrier(2, timeout=5)
+
+        def in_thread():
+            barrier.wait()  # both tasks on separate threads at once
+            return client.http(), client.http()
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            (a, a_again), (b, b_again) = [f.result() for f in [executor.submit(in_thread) for _ in range(2)]]
+        self.assertIs(a, a_again)
+        self.assertIs(b, b_again)
+        self.assertIsNot(a, b)
+        self.assertNotIn(client.http(), (a, b))
+
+    def test_idle_clients_are_evicted_but_not_the_default(self):
+        pool = self.pool(idle_timeout=60)
+        default, sales, support = (pool.register(name, object()) for name in ('default', 'sales', 'support'))
+        sales.credential_manager = mock.Mock()
+        now = time.monotonic()
+        for client in (default, sales):
+            client.last_used = now - 61
+        support.last_used = now - 30
+        self.assertEqual(pool.evict_idle(now), 1)
+        self.assertEqual(pool.stats()['accounts'], ['default', 'support'])
+        sales.credential_manager.stop.assert_called_once()
+        self.assertIsNone(pool.get('sales'))
+
+    def test_least_recently_used_client_goes_past_max_clients(self):
+        pool = self.pool(max_clients=2)
+        pool.register('default', object())
+        pool.register('sales', object()).last_used = time.monotonic() - 10
+        with mock.patch.object(pool, '_build', side_effect=lambda account, interactive: GmailClient(account, object())):
+            pool.acquire('support')
+        self.assertEqual(pool.stats()['accounts'], ['default', 'support'])
+
+
+class CredentialManagerTests(SimpleTestCase):
+    SCOPES = ['https://www.googleapis.com/auth/gmail.send']
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.token_path = Path(directory.name) / 'token.json'
+
+    def write_token(self, token, expires_in):
+        from google.oauth2.credentials import Credentials
+        creds = Credentials(token=token, refresh_token='refresh', client_id='client', client_secret='secret',
+                            token_uri='https://oauth2.googleapis.com/token', scopes=self.SCOPES)
+        creds.expiry = datetime.utcnow() + timedelta(seconds=expires_in)
+        self.token_path.write_text(creds.to_json())
+
+    def manager(self, refresh_margin=600.0):
+        return GmailCredentialManager(self.token_path, self.token_path.with_name('credentials.json'),
+                                      self.SCOPES, refresh_margin=refresh_margin)
+
+    def fake_refresh(self, token):
+        def refresh(creds, request):
+            creds.token = token
+            creds.expiry = datetime.utcnow() + timedelta(hours=1)
+        return mock.patch('google.oauth2.credentials.Credentials.refresh', autospec=True, side_effect=refresh)
+
+    def test_corrupt_token_file_is_deleted(self):
+        self.token_path.write_text('{not json')
+        with self.assertRaises(LookupError):
+            self.manager().load(interactive=False)
+        self.assertFalse(self.token_path.exists())
+
+    def test_incomplete_token_file_is_kept(self):
+        self.token_path.write_text(json.dumps({'token': 'abc', 'refresh_token': 'refresh'}))
+        with self.assertRaisesRegex(ValueError, 'incomplete'):
+            self.manager().load(interactive=False)
+        self.assertTrue(self.token_path.exists())
+
+    def test_refresh_margin_must_be_shorter_than_the_token_lifetime(self):
+        for margin in (-1, ACCESS_TOKEN_LIFETIME, ACCESS_TOKEN_LIFETIME + 1):
+            with self.assertRaises(ValueError):
+                self.manager(refresh_margin=margin)
+        self.assertEqual(self.manager(refresh_margin=0).refresh_margin, 0)
+
+    def test_load_refreshes_a_token_inside_the_margin(self):
+        self.write_token('old', expires_in=60)
+        with self.fake_refresh('new'):
+            manager = self.manager()
+            self.assertEqual(manager.load(interactive=False).token, 'new')
+        self.assertEqual(manager.refresh_count, 1)
+        self.assertEqual(json.loads(self.token_path.read_text())['token'], 'new')
+
+    def test_refresh_adopts_a_token_another_worker_wrote(self):
+        self.write_token('mine', expires_in=1200)
+        manager = self.manager()
+        creds = manager.load(interactive=False)
+        creds.expiry = datetime.utcnow() + timedelta(seconds=60)
+        self.write_token('theirs', expires_in=3500)
+        with mock.patch('google.oauth2.credentials.Credentials.refresh', side_effect=AssertionError('refreshed')):
+            manager.refresh()
+        # Updated in place: authorized Http objects hold this object
+        self.assertIs(manager.credentials, creds)
+        self.assertEqual((creds.token, manager.refresh_count), ('theirs', 0))
+
+    def test_refresh_writes_the_new_token_for_other_workers(self):
+        self.write_token('mine', expires_in=1200)
+        manager = self.manager()
+        manager.load(interactive=False).expiry = datetime.utcnow() + timedelta(seconds=60)
+        self.write_token('mine', expires_in=60)
+        with self.fake_refresh('new'):
+            manager.refresh()
+        self.assertEqual((manager.credentials.token, manager.refresh_count), ('new', 1))
+        self.assertEqual(json.loads(self.token_path.read_text())['token'], 'new')
+
+    def test_atomic_write(self):
+        atomic_write(self.token_path, 'first')
+        self.assertEqual(self.token_path.read_text(), 'first')
+        self.assertEqual(self.token_path.stat().st_mode & 0o777, 0o600)
+        with mock.patch('api.credentials.os.replace', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                atomic_write(self.token_path, 'second')
+        self.assertEqual(self.token_path.read_text(), 'first')
+        self.assertEqual(sorted(p.name for p in self.token_path.parent.iterdir()), ['token.json'])
+
+    def test_file_lock_is_exclusive(self):
+        events = []
+        held = threading.Event()
+
+        def other():
+            held.wait()
+            with file_lock(self.token_path):
+                events.append('other')
+
+        thread = threading.Thread(target=other)
+        thread.start()
+        with file_lock(self.token_path):
+            held.set()
+            time.sleep(0.1)
+            events.append('first')
+        thread.join(timeout=5)
+        self.assertEqual(events, ['first', 'other'])
+
+
+class MessageStreamTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def attachment(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as handle:
+            handle.write(data)
+        return Attachment.from_path(path)
+
+    def test_base64_size(self):
+        for size in (0, 1, 2, 3, 56, 57, 58, 114, 1000):
+            self.assertEqual(base64_size(size), len(base64.encodebytes(b'x' * size)), size)
+
+    def test_round_trip(self):
+        files = {'empty.txt': b'', 'one.bin': b'\x00', 'line.bin': os.urandom(57),
+                 'report.pdf': os.urandom(10_000), 'r\u00e9sum\u00e9.txt': 'caf\u00e9\n'.encode()}
+        attachments = [self.attachment(name, data) for name, data in files.items()]
+        attachments.append(Attachment('upload.csv', 3, 'text/csv', file=io.BytesIO(b'a,b')))
+        stream = build_message_stream('to@example.com', 'Files', 'See attached', attachments)
+        data = stream.read()
+        self.assertEqual(len(data), stream.size)
+
+        message = email.message_from_bytes(data)
+        self.assertEqual((message['to'], message['subject']), ('to@example.com', 'Files'))
+        parts = message.get_payload()
+        self.assertEqual(parts[0].get_payload(), 'See attached')
+        received = {part.get_filename(): part.get_payload(decode=True) for part in parts[1:]}
+        self.assertEqual(received, {**files, 'upload.csv': b'a,b'})
+        self.assertEqual(parts[1].get_content_type(), 'text/plain')
+        self.assertEqual(parts[4].get_content_type(), 'application/pdf')
+        stream.close()
+
+    def test_random_access_reads_match(self):
+        stream = build_message_stream('to@example.com', 'Files', 'Body',
+                                      [self.attachment('a.bin', os.urandom(5000)),
+                                       self.attachment('b.bin', os.urandom(300))])
+        whole = stream.read()
+        for offset, size in ((0, 10), (100, 1000), (stream.size - 5, 50), (777, 7777), (stream.size, 10)):
+            stream.seek(offset)
+            self.assertEqual(stream.read(size), whole[offset:offset + size])
+        stream.seek(0)
+        buffer = bytearray(333)
+        chunks = []
+        while True:
+            count = stream.readinto(buffer)
+            if not count:
+                break
+            chunks.append(bytes(buffer[:count]))
+        self.assertEqual(b''.join(chunks), whole)
+        stream.close()
+
+    def test_upload_files_are_left_open(self):
+        upload = io.BytesIO(b'data')
+        stream = build_message_stream('to@example.com', 'S', 'B', [Attachment('a.txt', 4, file=upload)])
+        stream.read()
+        stream.close()
+        self.assertFalse(upload.closed)
+
+
+class AttachmentUploadTests(SimpleTestCase):
+    def setUp(self):
+        self.stub = GmailStubServer(latency=0).start()
+        self.addCleanup(self.stub.stop)
+        self.service = make_offline_service(gmail_service=self.stub.build_client())
+        self.addCleanup(self.service.close)
+        self.service.config.UPLOAD_CHUNK_SIZE = 256 * 1024
+        self.payload = os.urandom(700 * 1024)
+        self.attachment = Attachment('big.bin', len(self.payload), file=io.BytesIO(self.payload))
+
+    def fail_requests(self, *numbers):
+        """Make the stub answer its n-th requests (1-based) with a 503"""
+        calls = 0
+
+        def should_fail():
+            nonlocal calls
+            calls += 1
+            self.stub.stats['requests'] += 1
+            return calls in numbers
+        return mock.patch.object(self.stub, 'should_fail', side_effect=should_fail)
+
+    async def send(self):
+        message = self.service._create_email_upload('to@example.com', 'Files', 'Body', [self.attachment])
+        digest = hashlib.sha256(message.read()).hexdigest()
+        message.seek(0)
+        return message.size, digest, await self.service._send_email_upload(message)
+
+    async def test_multi_chunk_upload_resumes_after_5xx(self):
+        # Request 1 starts the session, 2-5 are chunks: the second chunk is lost once
+        with self.fail_requests(3), mock.patch('api.Email.time.sleep') as sleep:
+            size, digest, sent = await self.send()
+        self.assertTrue(sent['id'].startswith('stub-'))
+        self.assertEqual(self.stub.uploaded, [{'bytes': size, 'sha256': digest}])
+        self.assertGreater(size, 3 * self.service.config.UPLOAD_CHUNK_SIZE)
+        # One backoff; the stub's own zero-latency sleeps go through the same patched time.sleep
+        self.assertEqual([c.args[0] for c in sleep.call_args_list if c.args[0]], [2])
+
+    async def test_upload_gives_up_after_max_retries(self):
+        self.service.config.MAX_RETRIES = 2
+        with self.fail_requests(*range(3, 100)), mock.patch('api.Email.time.sleep'):
+            result = await self.service.send_email('to@example.com', 'Files', 'Body', attachments=[self.attachment])
+        self.assertEqual(result['status'], 'error')
+        self.assertEqual(self.stub.uploaded, [])
+
+    async def test_send_email_with_attachments(self):
+        result = await self.service.send_email('to@example.com', 'Files', 'Body', attachments=[self.attachment])
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['details']['attachments'], ['big.bin'])
+        self.assertEqual(len(self.stub.uploaded), 1)
+
+    async def test_oversized_message_is_refused(self):
+        self.service.config.MAX_MESSAGE_BYTES = 1024 * 1024
+        result = await self.service.send_email('to@example.com', 'Files', 'Body',
+                                               attachments=[self.attachment, self.attachment])
+        self.assertEqual(result['status'], 'error')
+        self.assertIn('limit', result['message'])
+        self.assertEqual(self.stub.stats['requests'], 0)
+
+
+class SendEmailAttachmentApiTests(TestCase):
+    def post(self, **fields):
+        upload = io.BytesIO(b'%PDF-1.4 test')
+        upload.name = 'report.pdf'
+        data = {'to': 'to@example.com', 'subject': 'Report', 'body': 'Attached', 'attachments': [upload], **fields}
+        return self.client.post('/api/send-email/', data)
+
+    def test_multipart_attachments_are_uploaded(self):
+        with GmailStubServer(latency=0) as stub:
+            service = make_offline_service(gmail_service=stub.build_client())
+            self.addCleanup(service.close)
+            with mock.patch('api.tools.initialize_ai_service', return_value=service), \
+                    override_settings(EMAIL_QUEUE_ENABLED=True):
+                response = self.post()
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertEqual(len(stub.uploaded), 1)
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    def test_queue_with_attachments_is_400(self):
+        response = self.post(queue='true')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cannot be queued', response.json()['error'])
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    def test_missing_field_in_form_is_400(self):
+        response = self.client.post('/api/send-email/', {'to': 'to@example.com', 'subject': 'Report'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ImportBoundaryTests(SimpleTestCase):
+    """Entry points must not load provider SDKs (or LiveKit, for Django) before they are used"""
+
+    def test_no_eager_imports(self):
+        for target in IMPORT_TARGETS:
+            with self.subTest(target=target):
+                self.assertEqual(eager_imports(target, str(settings.BASE_DIR)), [])
+
+
+class ChatWindowTests(SimpleTestCase):
+    """voice_common.chat_window, shared by this project's agent and assistant-back's"""
+
+    def entries(self, turns, text="hello there"):
+        entries = [chat_window.Entry('sys', 'system', 'You are a helpful assistant.')]
+        for i in range(turns):
+            entries.append(chat_window.Entry(f'u{i}', 'user', f"{text} {i}"))
+            entries.append(chat_window.Entry(f'a{i}', 'assistant', f"reply {i}"))
+        return entries
+
+    def window(self, summarize=None, **kwargs):
+        async def summarized(prompt):
+            self.prompts.append(prompt)
+            return 'SUMMARY'
+        self.prompts = []
+        return chat_window.ChatWindow(summarize or summarized, **kwargs)
+
+    async def test_short_history_is_sent_whole(self):
+        window = self.window(max_turns=6)
+        entries = self.entries(3)
+        plan = window.plan(entries)
+        self.assertEqual(plan.keep_ids, [entry.id for entry in entries])
+        self.assertIsNone(plan.summary)
+        self.assertEqual((plan.recent_turns, plan.pending_turns), (3, 0))
+        self.assertIsNone(window._refresh)
+
+    async def test_older_turns_are_replaced_by_the_summary(self):
+        window = self.window(max_turns=2, batch_turns=2)
+        entries = self.entries(4)
+        first = window.plan(entries)
+        # Not summarized yet: everything is still sent verbatim
+        self.assertEqual(first.keep_ids, [entry.id for entry in entries])
+        self.assertEqual(first.pending_turns, 2)
+        await window._refresh
+        self.assertIn('user: hello there 0', self.prompts[0])
+        self.assertNotIn('hello there 2', self.prompts[0])
+
+        second = window.plan(entries)
+        self.assertEqual(second.summary, 'SUMMARY')
+        self.assertEqual(second.keep_ids, ['sys', 'u2', 'a2', 'u3', 'a3'])
+        self.assertLess(second.prompt_tokens, first.prompt_tokens)
+        stats = window.stats()
+        self.assertEqual((stats['summaries'], stats['summarized_turns']), (1, 2))
+        await window.aclose()
+
+    async def test_token_cap_keeps_at_least_the_latest_turn(self):
+        window = self.window(max_turns=6, max_tokens=10, batch_turns=6)
+        plan = window.plan(self.entries(3, text="x" * 100))
+        self.assertEqual(plan.recent_turns, 1)
+        self.assertEqual(plan.keep_ids[-2:], ['u2', 'a2'])
+        self.assertEqual(plan.pending_turns, 2)
+        await window.aclose()
+
+    async def test_failing_summarizer_drops_the_oldest_turns(self):
+        async def failing(prompt):
+            raise RuntimeError('LLM down')
+
+        window = self.window(failing, max_turns=2, batch_turns=2)
+        plan = window.plan(self.entries(8))
+        self.assertEqual(plan.keep_ids, ['sys', 'u4', 'a4', 'u5', 'a5', 'u6', 'a6', 'u7', 'a7'])
+        await window._refresh
+        stats = window.stats()
+        self.assertEqual((stats['dropped_turns'], stats['summary_failures']), (4, 1))
+        self.assertEqual(window.summary, '')
+        await window.aclose()
+
+    async def test_aclose_cancels_a_running_refresh(self):
+        async def slow(prompt):
+            await asyncio.sleep(60)
+
+        window = self.window(slow, max_turns=1, batch_turns=1)
+        window.plan(self.entries(3))
+        refresh = window._refresh
+        await window.aclose()
+        self.assertTrue(refresh.cancelled())
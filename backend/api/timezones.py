@@ -0,0 +1,265 @@
+# Time lookup for AIService.get_current_time: an index from spoken place names,
+# countries and abbreviations to pre-built pytz zones, with fuzzy matching
+import difflib
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import pytz
+
+US_TIMEZONES = {
+    'eastern': 'US/Eastern',
+    'central': 'US/Central',
+    'mountain': 'US/Mountain',
+    'pacific': 'US/Pacific',
+    'alaska': 'US/Alaska',
+    'hawaii': 'US/Hawaii',
+}
+
+# States by the zone most of their people live in
+US_STATES = {
+    'alabama': 'America/Chicago', 'alaska': 'America/Anchorage', 'arizona': 'America/Phoenix',
+    'arkansas': 'America/Chicago', 'california': 'America/Los_Angeles', 'colorado': 'America/Denver',
+    'connecticut': 'America/New_York', 'delaware': 'America/New_York', 'florida': 'America/New_York',
+    'georgia': 'America/New_York', 'hawaii': 'Pacific/Honolulu', 'idaho': 'America/Boise',
+    'illinois': 'America/Chicago', 'indiana': 'America/Indiana/Indianapolis', 'iowa': 'America/Chicago',
+    'kansas': 'America/Chicago', 'kentucky': 'America/New_York', 'louisiana': 'America/Chicago',
+    'maine': 'America/New_York', 'maryland': 'America/New_York', 'massachusetts': 'America/New_York',
+    'michigan': 'America/Detroit', 'minnesota': 'America/Chicago', 'mississippi': 'America/Chicago',
+    'missouri': 'America/Chicago', 'montana': 'America/Denver', 'nebraska': 'America/Chicago',
+    'nevada': 'America/Los_Angeles', 'new hampshire': 'America/New_York', 'new jersey': 'America/New_York',
+    'new mexico': 'America/Denver', 'new york state': 'America/New_York', 'north carolina': 'America/New_York',
+    'north dakota': 'America/Chicago', 'ohio': 'America/New_York', 'oklahoma': 'America/Chicago',
+    'oregon': 'America/Los_Angeles', 'pennsylvania': 'America/New_York', 'rhode island': 'America/New_York',
+    'south carolina': 'America/New_York', 'south dakota': 'America/Chicago', 'tennessee': 'America/Chicago',
+    'texas': 'America/Chicago', 'utah': 'America/Denver', 'vermont': 'America/New_York',
+    'virginia': 'America/New_York', 'washington state': 'America/Los_Angeles', 'west virginia': 'America/New_York',
+    'wisconsin': 'America/Chicago', 'wyoming': 'America/Denver', 'district of columbia': 'America/New_York',
+    'puerto rico': 'America/Puerto_Rico',
+}
+
+# Curated names that win over anything derived from the tz database
+ALIASES = {
+    # Abbreviations people actually say; derived ones are ambiguous (CST, IST, BST...)
+    'est': 'US/Eastern', 'edt': 'US/Eastern', 'et': 'US/Eastern', 'eastern time': 'US/Eastern',
+    'cst': 'US/Central', 'cdt': 'US/Central', 'ct': 'US/Central', 'central time': 'US/Central',
+    'mst': 'US/Mountain', 'mdt': 'US/Mountain', 'mt': 'US/Mountain', 'mountain time': 'US/Mountain',
+    'pst': 'US/Pacific', 'pdt': 'US/Pacific', 'pt': 'US/Pacific', 'pacific time': 'US/Pacific',
+    'akst': 'US/Alaska', 'hst': 'US/Hawaii',
+    'gmt': 'GMT', 'utc': 'UTC', 'zulu': 'UTC',
+    'bst': 'Europe/London', 'cet': 'Europe/Paris', 'cest': 'Europe/Paris', 'eet': 'Europe/Athens',
+    'wat': 'Africa/Lagos', 'cat': 'Africa/Maputo', 'eat': 'Africa/Nairobi',
+    'ist': 'Asia/Kolkata', 'jst': 'Asia/Tokyo', 'kst': 'Asia/Seoul', 'sgt': 'Asia/Singapore',
+    'aest': 'Australia/Sydney', 'aedt': 'Australia/Sydney', 'nzst': 'Pacific/Auckland',
+    # Cities that are not zone names
+    'nyc': 'America/New_York', 'new york city': 'America/New_York', 'washington': 'America/New_York',
+    'washington dc': 'America/New_York', 'boston': 'America/New_York', 'miami': 'America/New_York',
+    'atlanta': 'America/New_York', 'philadelphia': 'America/New_York',
+    'houston': 'America/Chicago', 'dallas': 'America/Chicago', 'austin': 'America/Chicago',
+    'san francisco': 'America/Los_Angeles', 'la': 'America/Los_Angeles', 'seattle': 'America/Los_Angeles',
+    'san diego': 'America/Los_Angeles', 'las vegas': 'America/Los_Angeles', 'salt lake city': 'America/Denver',
+    'montreal': 'America/Toronto', 'ottawa': 'America/Toronto', 'rio de janeiro': 'America/Sao_Paulo',
+    'abuja': 'Africa/Lagos', 'ibadan': 'Africa/Lagos', 'port harcourt': 'Africa/Lagos',
+    'cape town': 'Africa/Johannesburg', 'beijing': 'Asia/Shanghai', 'shenzhen': 'Asia/Shanghai',
+    'mumbai': 'Asia/Kolkata', 'delhi': 'Asia/Kolkata', 'new delhi': 'Asia/Kolkata', 'bangalore': 'Asia/Kolkata',
+    'saigon': 'Asia/Ho_Chi_Minh', 'osaka': 'Asia/Tokyo', 'abu dhabi': 'Asia/Dubai',
+    'barcelona': 'Europe/Madrid', 'milan': 'Europe/Rome', 'munich': 'Europe/Berlin',
+    'frankfurt': 'Europe/Berlin', 'manchester': 'Europe/London', 'edinburgh': 'Europe/London',
+    'st petersburg': 'Europe/Moscow', 'melbourne': 'Australia/Melbourne',
+    'st louis': 'America/Chicago', 'saint louis': 'America/Chicago', 'kansas city': 'America/Chicago',
+    'minneapolis': 'America/Chicago', 'new orleans': 'America/Chicago', 'san antonio': 'America/Chicago',
+    'portland': 'America/Los_Angeles', 'san jose': 'America/Los_Angeles', 'orlando': 'America/New_York',
+    'england': 'Europe/London', 'uk': 'Europe/London', 'britain': 'Europe/London',
+}
+
+_WELL_KNOWN = frozenset(ALIASES.values()) | frozenset(US_STATES.values())
+
+# Phrases a transcript wraps around the place name ("what time is it in ...")
+_FILLER = re.compile(
+    r"^(?:(?:what(?: s| is)? )?(?:the )?(?:current )?(?:local )?time(?: is it)?(?: right)?(?: now)? )?"
+    r"(?:in |at |for )?(?:the )?"
+)
+# '+' and '-' are kept in front of a digit: "GMT+5" and "GMT-5" are ten hours apart
+_NON_WORD = re.compile(r"[^a-z0-9 +-]+|[+-](?!\d)")
+_SPACES = re.compile(r"\s+")
+# "UTC+5", "gmt -3:30", "utc plus 5", "GMT+05:45" (the sign means ahead of/behind UTC)
+_OFFSET = re.compile(r"^(?:utc|gmt) ?(?P<sign>[+-]|plus |minus )(?P<hours>\d{1,2})(?: ?:? ?(?P<minutes>\d{2}))?$")
+
+# Fuzzy matching is for misheard place names; short keys are too easy to match by accident
+FUZZY_MIN_LENGTH = 6
+FUZZY_CUTOFF = 0.85
+
+
+def normalize(name: str) -> str:
+    """Lower-case, drop punctuation and filler words so spoken names line up with index keys"""
+    text = _SPACES.sub(' ', _NON_WORD.sub(' ', (name or '').lower().replace('_', ' '))).strip()
+    return _FILLER.sub('', text).strip()
+
+
+def parse_offset(key: str) -> Optional[int]:
+    """Minutes east of UTC for a normalized "UTC+5"/"GMT-3:30" key, None if it is not one"""
+    match = _OFFSET.match(key)
+    if not match:
+        return None
+    hours, minutes = int(match['hours']), int(match['minutes'] or 0)
+    if hours > 14 or minutes >= 60:
+        return None
+    total = hours * 60 + minutes
+    return -total if match['sign'].strip() in ('-', 'minus') else total
+
+
+@dataclass(frozen=True)
+class ZoneEntry:
+    label: str
+    zone: str
+    tz: pytz.BaseTzInfo
+
+
+class TimezoneIndex:
+    """Maps city, country, abbreviation and alias names to pre-built pytz zones"""
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[ZoneEntry, ...]] = {}
+        self._zones: Dict[str, pytz.BaseTzInfo] = {}
+        self._minute = None
+        self._minute_cache: Dict[str, str] = {}
+        self._fuzzy_cache: Dict[str, Optional[str]] = {}
+        self._build()
+        self._keys: List[str] = list(self._entries)
+
+    def _tz(self, zone: str) -> pytz.BaseTzInfo:
+        tz = self._zones.get(zone)
+        if tz is None:
+            tz = self._zones[zone] = pytz.timezone(zone)
+        return tz
+
+    def _entry(self, label: str, zone: str) -> ZoneEntry:
+        return ZoneEntry(label=label, zone=zone, tz=self._tz(zone))
+
+    def _add(self, key: str, entries: Tuple[ZoneEntry, ...], override: bool = False) -> None:
+        key = normalize(key)
+        if key and (override or key not in self._entries):
+            self._entries[key] = entries
+
+    def _build(self) -> None:
+        # Zone names: "America/New_York" -> "america new york", "new york". Etc/GMT+5 is
+        # POSIX-inverted (UTC-5), so it is only reachable by its full name; parse_offset
+        # handles "GMT+5" as people mean it.
+        for zone in pytz.all_timezones:
+            parts = zone.split('/')
+            if parts[0] == 'Etc':
+                self._add(zone, (self._entry(zone, zone),), override=True)
+                continue
+            city = parts[-1].replace('_', ' ')
+            entry = (self._entry(city, zone),)
+            self._add(zone, entry, override=True)
+            self._add(city, entry)
+
+        # Countries: single-zone countries map directly, others to all their zones (one line
+        # per distinct offset when formatted). ISO codes are not keys: "in", "it", "no" and
+        # "me" are ordinary words in a transcript.
+        for code, country in pytz.country_names.items():
+            zones = pytz.country_timezones.get(code, [])
+            if not zones:
+                continue
+            if len(zones) == 1:
+                entries = (self._entry(country, zones[0]),)
+            else:
+                entries = tuple(self._entry(zone.split('/')[-1].replace('_', ' '), zone) for zone in zones)
+            self._add(country, entries)
+
+        # Abbreviations derived from the database (winter and summer), first zone wins
+        year = datetime.now().year
+        for zone in pytz.common_timezones:
+            tz = self._tz(zone)
+            for month in (1, 7):
+                abbreviation = tz.localize(datetime(year, month, 15)).tzname()
+                if abbreviation and abbreviation.isalpha():
+                    self._add(abbreviation, (self._entry(abbreviation.upper(), zone),))
+
+        us = tuple(self._entry(name.title(), zone) for name, zone in US_TIMEZONES.items())
+        for key in ('us', 'usa', 'united states', 'america', 'united states of america'):
+            self._add(key, us, override=True)
+        for state, zone in US_STATES.items():
+            self._add(state, (self._entry(state.title(), zone),))
+        for alias, zone in ALIASES.items():
+            self._add(alias, (self._entry(alias.title() if len(alias) > 3 else alias.upper(), zone),), override=True)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def keys(self) -> List[str]:
+        return list(self._keys)
+
+    def lookup(self, name: str) -> Optional[Tuple[ZoneEntry, ...]]:
+        """A UTC/GMT offset, an exact match on the normalized name, then a fuzzy match for misheard names"""
+        key = normalize(name)
+        offset = parse_offset(key)
+        if offset is not None:
+            return (self._offset_entry(offset),)
+        entries = self._entries.get(key)
+        if entries is None and key.endswith(' city'):
+            entries = self._entries.get(key[:-5])
+        if entries is None and len(key) >= FUZZY_MIN_LENGTH:
+            match = self._fuzzy_key(key)
+            entries = self._entries.get(match) if match else None
+        return entries
+
+    def _offset_entry(self, minutes: int) -> ZoneEntry:
+        sign = '-' if minutes < 0 else '+'
+        label = f"UTC{sign}{abs(minutes) // 60:02d}:{abs(minutes) % 60:02d}"
+        return ZoneEntry(label=label, zone=label, tz=pytz.FixedOffset(minutes))
+
+    def _fuzzy_key(self, key: str) -> Optional[str]:
+        # The index is static, so remembering the match (not the time) is safe
+        if key in self._fuzzy_cache:
+            return self._fuzzy_cache[key]
+        matches = difflib.get_close_matches(key, self._keys, n=1, cutoff=FUZZY_CUTOFF)
+        match = matches[0] if matches else None
+        if len(self._fuzzy_cache) < 4096:
+            self._fuzzy_cache[key] = match
+        return match
+
+    def current_time(self, name: str) -> Optional[str]:
+        """Formatted local time(s) for a place, cached only until the minute changes"""
+        minute = int(time.time() // 60)
+        if minute != self._minute:
+            self._minute = minute
+            self._minute_cache = {}
+        key = normalize(name)
+        cached = self._minute_cache.get(key)
+        if cached is not None:
+            return cached
+
+        entries = self.lookup(name)
+        if entries is None:
+            return None
+        now = datetime.now(pytz.utc)
+        # A country's zones that agree right now read as one line (Canada: 6, not 23),
+        # named after a city people know if the curated tables have one
+        shown: Dict[timedelta, Tuple[ZoneEntry, datetime]] = {}
+        for entry in entries:
+            local = now.astimezone(entry.tz)
+            current = shown.get(local.utcoffset())
+            if current is None or (current[0].zone not in _WELL_KNOWN and entry.zone in _WELL_KNOWN):
+                shown[local.utcoffset()] = (entry, local)
+        text = "\n".join(f"🕐 {entry.label}: {local.strftime('%I:%M %p')}" for entry, local in shown.values())
+        self._minute_cache[key] = text
+        return text
+
+
+_index: Optional[TimezoneIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_timezone_index() -> TimezoneIndex:
+    """Process-wide index, built on first use (AIService builds it at start-up)"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = TimezoneIndex()
+    return _index
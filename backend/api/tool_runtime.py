@@ -0,0 +1,99 @@
+# Runs the voice agent's tools as cancellable tasks with a deadline each, and says
+# something when one is slow, so a slow Gmail call shows up as "one moment" instead
+# of dead air. Kept free of LiveKit imports: `speak` is any callable taking text
+# (Call.py passes AgentSession.say).
+import asyncio
+import itertools
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ToolPolicy:
+    # Give up on the call after this many seconds
+    timeout: float = 15.0
+    # Say the first filler once the call has been running this long
+    filler_after: float = 1.5
+    # Then another progress line this often, until the fillers run out
+    progress_every: float = 5.0
+    fillers: Tuple[str, ...] = ("One moment.", "Still working on it.")
+    timeout_message: str = "That took too long, so I stopped waiting for it."
+
+
+DEFAULT_POLICY = ToolPolicy()
+
+
+class ToolRuntime:
+    """Tool calls for one session.
+
+    Each call runs in its own task, so calls issued together run in parallel.
+    Fillers are shared across concurrent calls: two slow tools produce one
+    "one moment", not two.
+    """
+
+    def __init__(self, policies: Optional[Dict[str, ToolPolicy]] = None,
+                 speak: Optional[Callable[[str], Any]] = None, min_filler_gap: float = 3.0):
+        self.policies = policies or {}
+        self.speak = speak
+        self.min_filler_gap = min_filler_gap
+        self._tasks: Set[asyncio.Task] = set()
+        self._last_spoken = float('-inf')
+        self._ids = itertools.count(1)
+
+    def _say(self, text: str) -> bool:
+        now = time.monotonic()
+        if self.speak is None or now - self._last_spoken < self.min_filler_gap:
+            return False
+        self._last_spoken = now
+        try:
+            self.speak(text)
+        except Exception as e:  # e.g. the session is closing; a missing filler is not worth failing the tool
+            logger.warning(f"Could not speak tool filler: {e}")
+        return True
+
+    async def run(self, name: str, func: Callable[..., Awaitable[Any]], **kwargs) -> Any:
+        """Run `func(**kwargs)` under the tool's policy; returns its result or the policy's timeout message.
+
+        Cancelling the caller (the user interrupted) cancels the tool task too.
+        """
+        policy = self.policies.get(name, DEFAULT_POLICY)
+        call_id = next(self._ids)
+        task = asyncio.create_task(func(**kwargs), name=f"tool-{name}-{call_id}")
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + policy.timeout
+        fillers = iter(policy.fillers)
+        wait = policy.filler_after
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                done, _ = await asyncio.wait({task}, timeout=max(0.0, min(wait, remaining)))
+                if done:
+                    return task.result()
+                if loop.time() >= deadline:
+                    logger.warning(f"Tool {name} timed out after {policy.timeout}s, cancelling it")
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                    return policy.timeout_message
+                filler = next(fillers, None)
+                if filler is not None:
+                    self._say(filler)
+                    logger.info(f"Tool {name} still running after {loop.time() - started:.1f}s")
+                wait = policy.progress_every
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+
+    async def aclose(self) -> None:
+        """Cancel every tool still running (session shutdown)"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
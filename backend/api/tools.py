@@ -0,0 +1,153 @@
+# Email tool and the shared AIService instance, used by both the LiveKit agent (Call.py)
+# and the Django views. Kept free of LiveKit imports so Django starts quickly.
+import importlib
+import json
+import os
+from functools import partial
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+# Import the AIService for email functionality
+from .Email import AIService
+from .registry import ServiceRegistry
+import logging # Import logging
+
+load_dotenv()
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# --- Email Tool Definition ---
+
+# Dotted path of a callable to build the AIService with instead of AIService() itself;
+# the offline load test sets it to api.benchmarking.stub_ai_service
+AI_SERVICE_FACTORY = os.getenv('AI_SERVICE_FACTORY')
+
+
+def _build_ai_service():
+    if AI_SERVICE_FACTORY:
+        module, _, name = AI_SERVICE_FACTORY.rpartition('.')
+        return getattr(importlib.import_module(module), name)()
+    return AIService()
+
+
+# The one AIService for this process. Its constructor blocks for seconds (Gemini and
+# Gmail setup with retries), so the registry builds it on a background thread and
+# every caller awaits that single build.
+ai_service_registry = ServiceRegistry(_build_ai_service, name='AIService')
+
+
+async def initialize_ai_service(timeout: Optional[float] = None):
+    """The shared AIService, waiting for its initialization if needed; None if that failed."""
+    return await ai_service_registry.get(timeout)
+
+
+def warm_up_ai_service() -> None:
+    """Start building the AIService in the background (server and worker start-up)"""
+    if os.getenv('AI_SERVICE_WARMUP', 'true').lower() in ('1', 'true', 'yes'):
+        ai_service_registry.start()
+
+def _ensure_django() -> None:
+    """The agent worker runs outside manage.py, so configure Django before using the ORM"""
+    from django.apps import apps
+    if not apps.ready:
+        import django
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+        django.setup()
+
+
+def email_queue_enabled() -> bool:
+    """settings.EMAIL_QUEUE_ENABLED: whether the email tool hands messages to the durable
+    outbox (api/outbox.py) instead of waiting for Gmail. Read from Django settings in the
+    agent worker too, so the views and the agent never disagree."""
+    _ensure_django()
+    from django.conf import settings
+    return settings.EMAIL_QUEUE_ENABLED
+
+
+async def enqueue_email_tool(to: str, subject: str, body: str, account: Optional[str] = None) -> str:
+    """Queues an email for the outbox workers and returns immediately."""
+    try:
+        _ensure_django()
+        from .outbox import aenqueue_email
+        job = await aenqueue_email(to=to, subject=subject, body=body, account=account)
+        return f"Email to {to} with subject '{subject}' is queued for delivery (job {job.job_id})."
+    except Exception as e:
+        logger.error(f"Exception in enqueue_email_tool: {e}", exc_info=True)
+        return f"An unexpected error occurred while trying to queue the email: {e}"
+
+
+async def send_email_tool(to: str, subject: str, body: str, enqueue: Optional[bool] = None,
+                          account: Optional[str] = None, attachments: Optional[List] = None) -> str:
+    """Sends an email to the specified recipient with the given subject and body.
+
+    `account` picks the Gmail account to send as (see api/gmail_pool.py); None is the default account.
+    `attachments` (file paths or mime_stream.Attachment) are streamed to Gmail, never queued:
+    the outbox stores message text only.
+    """
+    if enqueue is None:
+        enqueue = not attachments and email_queue_enabled()
+    if enqueue and attachments:
+        return "Error: Emails with attachments cannot be queued; send them directly."
+    if enqueue:
+        logger.info(f"Queueing email via tool to: {to}")
+        return await enqueue_email_tool(to=to, subject=subject, body=body, account=account)
+
+    logger.info(f"Attempting to send email via tool to: {to}")
+    try:
+        service = await initialize_ai_service()
+        if not service or (not service.gmail_service and not account):
+             logger.error("AIService or Gmail service not initialized during email sending attempt.")
+             return "Error: Email service is not available or not initialized properly."
+
+        logger.info(f"Calling AIService.send_email_via_assistant for {to}")
+        result = await service.send_email_via_assistant(to=to, subject=subject, body=body, account=account,
+                                                        attachments=attachments)
+        logger.info(f"AIService.send_email_via_assistant result: {result}")
+
+        if result.get("status") == "success":
+            logger.info(f"Email successfully sent to {to}")
+            return f"Email successfully sent to {to} with subject '{subject}'."
+        else:
+            error_message = result.get('message', 'Unknown error sending email.')
+            logger.error(f"Failed to send email via AIService: {error_message}")
+            return f"Failed to send email: {error_message}"
+    except Exception as e:
+        logger.error(f"Exception in send_email_tool: {e}", exc_info=True)
+        return f"An unexpected error occurred while trying to send the email: {e}"
+
+def gmail_account_from_metadata(metadata: Optional[str]) -> Optional[str]:
+    """The Gmail account a caller sends as, from their LiveKit participant metadata
+    ({"gmail_account": "..."}, set by the token endpoint); None means the default account."""
+    try:
+        account = json.loads(metadata).get('gmail_account') if metadata else None
+    except (ValueError, AttributeError):
+        logger.warning("Ignoring participant metadata that is not a JSON object")
+        return None
+    return account if isinstance(account, str) and account else None
+
+
+def email_tool_for_caller(metadata: Optional[str]):
+    """send_email_tool bound to the caller's Gmail account"""
+    account = gmail_account_from_metadata(metadata)
+    logger.info(f"Email tool will send as Gmail account: {account or 'default'}")
+    return partial(send_email_tool, account=account)
+
+
+# Schema describing the tool for the LLM
+send_email_tool_schema = {
+    "name": "send_email",
+    "description": "Sends an email to a recipient using the user's configured Gmail account.",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "to": {"type": "string", "description": "The recipient's email address."},
+            "subject": {"type": "string", "description": "The subject line of the email."},
+            "body": {"type": "string", "description": "The main content/body of the email."},
+        },
+        "required": ["to", "subject", "body"],
+    },
+}
@@ -0,0 +1,167 @@
+# On-disk cache of synthesized speech for lines the agent says again and again
+# (fillers, confirmations). Entries are raw 16-bit PCM files named by a hash of
+# (text, voice_id, model, sample_rate), read back through mmap so replaying one
+# neither copies the whole clip into the heap nor pays a TTS round trip.
+# Least recently used entries are deleted once the directory exceeds its budget.
+# Kept free of LiveKit imports; Call.py turns the chunks into audio frames.
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# magic, sample rate, channels
+_HEADER = struct.Struct('<6sIH')
+_MAGIC = b'VAPCM1'
+_SUFFIX = '.pcm'
+_SAMPLE_WIDTH = 2  # int16
+
+
+def cache_key(text: str, voice_id: str, model: str, sample_rate: int) -> str:
+    """Content address of a clip; whitespace differences do not change the audio"""
+    normalized = " ".join(text.split())
+    return hashlib.sha256(json.dumps([normalized, voice_id, model, sample_rate]).encode('utf-8')).hexdigest()
+
+
+class CachedAudio:
+    """A cached clip, memory-mapped read-only; close() when done playing it"""
+
+    def __init__(self, path: Path):
+        with open(path, 'rb') as handle:
+            self._mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, self.sample_rate, self.num_channels = _HEADER.unpack_from(self._mmap, 0)
+        except struct.error:
+            magic = None
+        if magic != _MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a cached clip")
+        self.pcm = memoryview(self._mmap)[_HEADER.size:]
+
+    @property
+    def duration(self) -> float:
+        return len(self.pcm) / (self.sample_rate * self.num_channels * _SAMPLE_WIDTH)
+
+    def chunks(self, frame_ms: int = 20) -> Iterator[memoryview]:
+        """Zero-copy slices of `frame_ms` milliseconds each"""
+        step = self.sample_rate * frame_ms // 1000 * self.num_channels * _SAMPLE_WIDTH
+        for offset in range(0, len(self.pcm), step):
+            yield self.pcm[offset:offset + step]
+
+    def close(self) -> None:
+        try:
+            self.pcm.release()
+            self._mmap.close()
+        except BufferError:
+            pass  # a chunk is still referenced; the mapping goes away when it is collected
+
+
+class TTSAudioCache:
+    """Content-addressed PCM clips in `directory`, LRU-evicted past `max_bytes`"""
+
+    def __init__(self, directory: Union[str, Path], max_bytes: int = 64 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats: Counter = Counter()
+        # key -> size, least recently used first; file mtimes carry recency across restarts
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        entries = []
+        for path in self.directory.glob(f'*{_SUFFIX}'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+        self._total = sum(self._index.values())
+        self._evict()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f'{key}{_SUFFIX}'
+
+    def contains(self, text: str, voice_id: str, model: str, sample_rate: int) -> bool:
+        with self._lock:
+            return cache_key(text, voice_id, model, sample_rate) in self._index
+
+    def missing(self, texts: Iterable[str], voice_id: str, model: str, sample_rate: int) -> List[str]:
+        """The texts that still need rendering"""
+        return [text for text in texts if not self.contains(text, voice_id, model, sample_rate)]
+
+    def get(self, text: str, voice_id: str, model: str, sample_rate: int) -> Optional[CachedAudio]:
+        key = cache_key(text, voice_id, model, sample_rate)
+        with self._lock:
+            if key not in self._index:
+                self._stats['misses'] += 1
+                return None
+            self._index.move_to_end(key)
+        path = self._path(key)
+        try:
+            audio = CachedAudio(path)
+            os.utime(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Dropping unreadable TTS cache entry {key}: {e}")
+            self._forget(key)
+            with self._lock:
+                self._stats['misses'] += 1
+            return None
+        with self._lock:
+            self._stats['hits'] += 1
+        return audio
+
+    def put(self, text: str, voice_id: str, model: str, sample_rate: int, num_channels: int,
+            pcm: Union[bytes, bytearray, memoryview]) -> Optional[str]:
+        """Store a clip; returns its key, or None if it is larger than the whole budget"""
+        size = _HEADER.size + len(pcm)
+        if size > self.max_bytes:
+            return None
+        key = cache_key(text, voice_id, model, sample_rate)
+        # Write then rename, so a reader never maps a half-written clip
+        fd, tmp_path = tempfile.mkstemp(dir=str(self.directory), prefix=f'.{key}.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as handle:
+                handle.write(_HEADER.pack(_MAGIC, sample_rate, num_channels))
+                handle.write(pcm)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        with self._lock:
+            self._total += size - self._index.pop(key, 0)
+            self._index[key] = size
+            self._stats['stored'] += 1
+        self._evict()
+        return key
+
+    def _forget(self, key: str) -> None:
+        with self._lock:
+            self._total -= self._index.pop(key, 0)
+        self._path(key).unlink(missing_ok=True)
+
+    def _evict(self) -> None:
+        while True:
+            with self._lock:
+                if self._total <= self.max_bytes or not self._index:
+                    return
+                key, size = self._index.popitem(last=False)
+                self._total -= size
+                self._stats['evictions'] += 1
+            try:
+                # Clips already mapped stay readable until closed (POSIX)
+                self._path(key).unlink(missing_ok=True)
+            except OSError as e:  # Windows refuses to delete a mapped file
+                logger.debug(f"Could not delete evicted TTS clip {key}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'entries': len(self._index), 'bytes': self._total, **self._stats}
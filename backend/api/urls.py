@@ -2,7 +2,7 @@
 from django.urls import path
 from django.http import JsonResponse
 from . import views
-from .views import send_email_api, generate_livekit_token, process_voice_command, health_check  # Correct the import name
+from .views import send_email_api, send_email_batch_api, email_job_status, generate_text_stream_api, generate_livekit_token, generate_livekit_tokens_bulk, process_voice_command, process_voice_command_batch, health_check  # Correct the import name
 
 # Simple root view function
 def api_root(request):
@@ -11,8 +11,13 @@ def api_root(request):
         'endpoints': {
             'health': '/api/health/',
             'send_email': '/api/send-email/',
+            'send_email_batch': '/api/send-email/batch/',
+            'email_job_status': '/api/send-email/jobs/<job_id>/',
+            'generate_text_stream': '/api/generate-text/stream/',
             'process_voice_command': '/api/process-voice-command/',
+            'process_voice_command_batch': '/api/process-voice-command/batch/',
             'livekit_token': '/api/livekit-token/',
+            'livekit_token_bulk': '/api/livekit-token/bulk/',
         }
     })
 
@@ -25,10 +30,17 @@ urlpatterns = [
     
     # Email functionality
     path('send-email/', send_email_api, name='send_email'),
+    path('send-email/batch/', send_email_batch_api, name='send_email_batch'),
+    path('send-email/jobs/<uuid:job_id>/', email_job_status, name='email_job_status'),
+
+    # Streaming text generation (server-sent events)
+    path('generate-text/stream/', generate_text_stream_api, name='generate_text_stream'),
     
     # Voice command processing
     path('process-voice-command/', process_voice_command, name='process_voice_command'),
+    path('process-voice-command/batch/', process_voice_command_batch, name='process_voice_command_batch'),
     
     # LiveKit token endpoint
     path('livekit-token/', generate_livekit_token, name='livekit_token'),
+    path('livekit-token/bulk/', generate_livekit_tokens_bulk, name='livekit_token_bulk'),
 ]
@@ -1,169 +1,498 @@
 # filepath: /home/opencode/vagent/backend/api/views.py
-from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 import asyncio
 import json
+import logging
+import time
+from collections import Counter
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
-from livekit import api
+from django.views.decorators.http import require_GET, require_POST, require_http_methods
 import os
-# Import our AIService and other tools
-from .Email import AIService
-from .Call import initialize_ai_service, send_email_tool
-from livekit import api
+from asgiref.sync import sync_to_async
+from .tools import ai_service_registry, initialize_ai_service, send_email_tool
+from .gmail_pool import DEFAULT_ACCOUNT, normalize_account
+from .intents import get_intent_matcher
+from .livekit import get_token_cache
+from .mime_stream import Attachment
+from .jsonstream import StreamFormatError, iter_json_array, iter_ndjson, sniff_array
+from .models import OutboundEmail
+from .outbox import aenqueue_email
 
+logger = logging.getLogger(__name__)
 
-# Initialize the AI service once for the whole application
-ai_service_instance = None
 
 async def get_ai_service():
-    """Get or initialize the AI service instance"""
-    global ai_service_instance
-    if ai_service_instance is None:
-        ai_service_instance = await initialize_ai_service()
-    return ai_service_instance
+    """The process-wide AI service (see tools.ai_service_registry), initialized once"""
+    return await initialize_ai_service()
 
 
-@api_view(['POST'])
-def send_email_api(request):
+def _read_email_form(request):
+    """The fields and uploaded attachments of a multipart send-email request"""
+    data = {key: request.POST[key] for key in ('to', 'subject', 'body', 'account') if key in request.POST}
+    if 'queue' in request.POST:
+        data['queue'] = request.POST['queue'].lower() in ('1', 'true', 'yes')
+    return data, request.FILES.getlist('attachments')
+
+
+@csrf_exempt
+@require_POST
+async def send_email_api(request):
     """
     API endpoint to send emails
-    Expects JSON data with:
+    Expects JSON data (or the same fields as multipart/form-data) with:
     {
         "to": "recipient@example.com",
         "subject": "Email Subject",
-        "body": "Email Body"
+        "body": "Email Body",
+        "account": "sales",       (optional Gmail account to send as, defaults to the default account)
+        "queue": false            (optional, defaults to settings.EMAIL_QUEUE_ENABLED)
     }
+
+    With "queue" the email goes to the durable outbox and the response is a
+    202 with a job id to poll at /api/send-email/jobs/<job_id>/.
+
+    Files sent as multipart "attachments" fields are streamed to Gmail from
+    Django's upload handlers (large ones are spooled to disk), so they are never
+    all held in memory. Such emails are always sent directly; "queue": true with
+    attachments is a 400.
+
+    This is a native async view: under ASGI (backend/asgi.py) the send is
+    awaited on the server's own event loop instead of spinning up a new loop
+    per request.
     """
     try:
-        data = json.loads(request.body)
+        attachments = []
+        if request.content_type == 'multipart/form-data':
+            # Parsing the form reads the upload and may write temporary files
+            data, uploads = await sync_to_async(_read_email_form)(request)
+            attachments = [Attachment.from_upload(upload) for upload in uploads]
+        else:
+            data = json.loads(request.body)
         
         # Validate required fields
         required_fields = ['to', 'subject', 'body']
         for field in required_fields:
             if field not in data:
-                return Response(
+                return JsonResponse(
                     {'error': f'Missing required field: {field}'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-        
-        # Use asyncio.run() to execute the async function
+
         try:
-            result = asyncio.run(
-                send_email_tool(
-                    to=data['to'],
-                    subject=data['subject'],
-                    body=data['body']
-                )
-            )
-        except RuntimeError as e:
-            # Handle cases where asyncio.run() cannot be used (e.g., nested loops)
-            # Fallback to creating a new loop if necessary, though asyncio.run is preferred
-            if "cannot be called from a running event loop" in str(e):
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                result = loop.run_until_complete(
-                    send_email_tool(
-                        to=data['to'],
-                        subject=data['subject'],
-                        body=data['body']
-                    )
-                )
-                loop.close()
-            else:
-                raise e # Re-raise other runtime errors
+            account = normalize_account(data.get('account'))
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if attachments and data.get('queue'):
+            return JsonResponse({'error': 'Emails with attachments cannot be queued'},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        if data.get('queue', settings.EMAIL_QUEUE_ENABLED and not attachments):
+            job = await aenqueue_email(to=data['to'], subject=data['subject'], body=data['body'], account=account)
+            return JsonResponse({
+                'success': True,
+                'job_id': str(job.job_id),
+                'status': job.status,
+                'status_url': f'/api/send-email/jobs/{job.job_id}/',
+            }, status=status.HTTP_202_ACCEPTED)
+        
+        result = await send_email_tool(
+            to=data['to'],
+            subject=data['subject'],
+            body=data['body'],
+            enqueue=False,
+            account=account,
+            attachments=attachments or None,
+        )
         
         # Check if the result contains an error message
         if "Error:" in result or "Failed to send email" in result or "unexpected error" in result:
-            return Response({'error': result}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            return JsonResponse({'error': result}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
-        return Response({'success': True, 'message': result}, status=status.HTTP_200_OK)
+        return JsonResponse({'success': True, 'message': result}, status=status.HTTP_200_OK)
     
     except json.JSONDecodeError:
-        return Response({'error': 'Invalid JSON data'}, status=status.HTTP_400_BAD_REQUEST)
+        return JsonResponse({'error': 'Invalid JSON data'}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         # Log the exception for debugging
-        import logging
-        logger = logging.getLogger(__name__)
         logger.error(f"Error in send_email_api: {e}", exc_info=True)
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return JsonResponse({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _sse(data: dict, event: str = None) -> str:
+    """Format one server-sent event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+async def generate_text_stream_api(request):
+    """
+    Stream generated text as server-sent events so drafts render progressively.
+    Accepts GET ?prompt=... (for EventSource) or POST JSON:
+    {
+        "prompt": "Write a short email thanking the team"
+    }
+    Emits `data: {"text": "..."}` per chunk, then a `metrics` event with
+    time-to-first-token and a final `done` event.
+    """
+    try:
+        if request.method == 'POST':
+            prompt = json.loads(request.body).get('prompt')
+        else:
+            prompt = request.GET.get('prompt')
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON data'}, status=status.HTTP_400_BAD_REQUEST)
+    if not prompt:
+        return JsonResponse({'error': 'Missing required field: prompt'}, status=status.HTTP_400_BAD_REQUEST)
+
+    service = await get_ai_service()
+    if not service:
+        return JsonResponse({'error': 'AI service is not available'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    async def events():
+        started = time.perf_counter()
+        info = {}
+        chars = 0
+        first_token_ms = None
+        try:
+            async for text in service.generate_text_stream(prompt, info=info):
+                if first_token_ms is None:
+                    first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+                chars += len(text)
+                yield _sse({'text': text})
+        except Exception as e:
+            logger.error(f"Error in generate_text_stream_api: {e}", exc_info=True)
+            yield _sse({'error': str(e)}, event='error')
+        yield _sse({
+            'provider': info.get('provider'),
+            'ttft_ms': first_token_ms,
+            'provider_ttft_ms': info.get('ttft_ms'),
+            'total_ms': round((time.perf_counter() - started) * 1000, 1),
+            'chars': chars,
+        }, event='metrics')
+        yield _sse({}, event='done')
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let a proxy buffer the stream
+    return response
+
+
+@require_GET
+async def email_job_status(request, job_id):
+    """Status of a queued email job (not its recipient or content: anyone with the id can ask)"""
+    try:
+        job = await OutboundEmail.objects.aget(job_id=job_id)
+    except OutboundEmail.DoesNotExist:
+        return JsonResponse({'error': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+    return JsonResponse(job.status_dict(), status=status.HTTP_200_OK)
+
+
+# Upper bound on messages accepted by one bulk request
+MAX_BULK_MESSAGES = 1000
+
+
+@csrf_exempt
+@require_POST
+async def send_email_batch_api(request):
+    """
+    API endpoint to send many emails in one call using Gmail batch requests
+    Expects JSON data with:
+    {
+        "messages": [
+            {"to": "recipient@example.com", "subject": "Email Subject", "body": "Email Body"},
+            ...
+        ],
+        "account": "sales"        (optional Gmail account to send as)
+    }
+    Returns one result per message, in the same order.
+    """
+    try:
+        data = json.loads(request.body)
+        messages = data.get('messages') if isinstance(data, dict) else None
+
+        if not isinstance(messages, list) or not messages:
+            return JsonResponse(
+                {'error': 'Missing required field: messages (non-empty list)'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(messages) > MAX_BULK_MESSAGES:
+            return JsonResponse(
+                {'error': f'Too many messages: {len(messages)} (max {MAX_BULK_MESSAGES})'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not all(isinstance(message, dict) for message in messages):
+            return JsonResponse({'error': 'Each message must be an object'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            account = normalize_account(data.get('account'))
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        service = await get_ai_service()
+        if not service:
+            return JsonResponse(
+                {'error': 'Error: Email service is not available or not initialized properly.'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        results = await service.send_emails_bulk(messages, account=account)
+        sent = sum(1 for result in results if result.get('status') == 'success')
+        return JsonResponse({
+            'success': sent == len(results),
+            'sent': sent,
+            'failed': len(results) - sent,
+            'results': results,
+        }, status=status.HTTP_200_OK)
 
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON data'}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Error in send_email_batch_api: {e}", exc_info=True)
+        return JsonResponse({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-@api_view(['GET'])
-def health_check(request):
-    """Simple health check endpoint"""
-    return Response({'status': 'ok'}, status=status.HTTP_200_OK)
+
+@require_GET
+async def health_check(request):
+    """
+    Health check endpoint; always 200 while the process is up.
+    With ?ready=1 it is a readiness probe: 503 until the AI service has finished initializing.
+    """
+    ai_service = ai_service_registry.status()
+    if request.GET.get('ready') and not ai_service['ready']:
+        state = 'unavailable' if ai_service['state'] == 'failed' else 'starting'
+        return JsonResponse({'status': state, 'ai_service': ai_service},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return JsonResponse({'status': 'ok', 'ai_service': ai_service}, status=status.HTTP_200_OK)
 
 
-@api_view(['POST'])
-def process_voice_command(request):
+@csrf_exempt
+@require_POST
+async def process_voice_command(request):
     """
     Process a voice command transcription and decide what action to take
     Expects JSON data with:
     {
         "text": "transcribed voice command"
     }
+    Returns the detected intent with its extracted slots and a confidence score.
+    When "skip_llm" is true every required slot was found, so the client can act
+    on the slots directly (e.g. POST them to /api/send-email/) without asking the LLM.
     """
     try:
         data = json.loads(request.body)
         
         # Validate required field
         if 'text' not in data:
-            return Response(
+            return JsonResponse(
                 {'error': 'Missing required field: text'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        text = data['text'].lower()
-        
-        # Simple keyword-based logic to decide if this is an email command
-        email_keywords = [
-            'send an email', 'send email', 'write an email', 'compose an email',
-            'email to', 'send a message', 'write a message', 'compose a message'
-        ]
-        
-        is_email_request = any(keyword in text for keyword in email_keywords)
-        
-        if is_email_request:
-            # For now just return that we detected an email request
-            # In a more advanced implementation, we could extract recipient, subject, etc.
-            return Response({
-                'action': 'email',
-                'detected': True,
-                'message': 'Email request detected. Please provide recipient, subject, and body.'
-            })
-        else:
-            # Not an email request, could be handled by other AI functions
-            return Response({
-                'action': 'other',
-                'detected': False,
-                'message': 'No specific action detected. Processing as general query.'
-            })
+        return JsonResponse(classify_voice_command(str(data['text'])))
             
     except json.JSONDecodeError:
-        return Response({'error': 'Invalid JSON data'}, status=status.HTTP_400_BAD_REQUEST)
+        return JsonResponse({'error': 'Invalid JSON data'}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return JsonResponse({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def classify_voice_command(text: str) -> dict:
+    """The process_voice_command result for one transcript"""
+    match = get_intent_matcher().match(text)
+
+    if match.intent == 'email':
+        if match.skip_llm:
+            message = 'Email request detected with recipient, subject and body.'
+        else:
+            message = f"Email request detected. Please provide: {', '.join(match.missing_slots)}."
+    elif match.detected:
+        message = f"{match.intent.capitalize()} request detected."
+    else:
+        # Not a known command, could be handled by other AI functions
+        message = 'No specific action detected. Processing as general query.'
+
+    return {
+        'action': match.intent,
+        'detected': match.detected,
+        'message': message,
+        **match.to_dict(),
+    }
+
+
+# Results are written out in groups of this many lines, and the event loop gets a turn
+# between groups (classification never awaits, so a big batch would otherwise hold it)
+CLASSIFY_FLUSH_LINES = 500
 
 
+def _batch_items(stream):
+    """(item, error) pairs from a JSON array or NDJSON body, whichever the body starts with"""
+    is_array, prefix = sniff_array(stream)
+    if not is_array:
+        yield from iter_ndjson(stream, prefix)
+        return
+    try:
+        for item in iter_json_array(stream, prefix):
+            yield item, None
+    except StreamFormatError as e:
+        # Nothing after a malformed array element can be recovered
+        yield None, str(e)
+
 
 @csrf_exempt
-@api_view(['GET'])
-def generate_livekit_token(request):
+@require_POST
+async def process_voice_command_batch(request):
+    """
+    Classify many transcripts in one request with the same logic as process_voice_command.
+    The body is either a JSON array or newline-delimited JSON (NDJSON); each item is a
+    transcript string or an object {"id": "...", "text": "..."}:
+
+        ["send an email to ...", {"id": "call-42", "text": "what time is it in Lagos"}]
+
+    The response is NDJSON, streamed as the body is read, one line per item in input
+    order ({"index": 0, "id": ..., "action": ..., "slots": ...} or {"index": 3, "error": ...}),
+    followed by a final {"summary": {...}} line. The body is parsed item by item, so
+    memory use does not grow with the number of transcripts. It is read from the copy
+    the ASGI handler already spooled, so reading it never waits on the network.
+    """
+    async def results():
+        counts = Counter()
+        errors = 0
+        index = 0
+        lines = []
+        for item, error in _batch_items(request):
+            if error is None:
+                if isinstance(item, str):
+                    item = {'text': item}
+                if not isinstance(item, dict) or not isinstance(item.get('text'), str):
+                    error = 'Each item must be a string or an object with a string "text" field'
+
+            if error is None:
+                result = {'index': index, 'id': item.get('id'), **classify_voice_command(item['text'])}
+                counts[result['action']] += 1
+            else:
+                result = {'index': index, 'error': error}
+                errors += 1
+            lines.append(json.dumps(result))
+            index += 1
+
+            if len(lines) >= CLASSIFY_FLUSH_LINES:
+                yield "\n".join(lines) + "\n"
+                lines = []
+                await asyncio.sleep(0)
+
+        lines.append(json.dumps({'summary': {'total': index, 'errors': errors, 'actions': dict(counts)}}))
+        yield "\n".join(lines) + "\n"
+
+    return StreamingHttpResponse(results(), content_type='application/x-ndjson')
+
+
+
+@require_GET
+async def generate_livekit_token(request):
+    # Cache hits take microseconds and a miss signs one HS256 JWT (~0.2ms), so
+    # this runs on the event loop instead of hopping to a sync thread
     room = request.GET.get('room', 'my-room')
     username = request.GET.get('username', 'Evidence Ejimone')
-    token = api.AccessToken(os.getenv('LIVEKIT_API_KEY'), os.getenv('LIVEKIT_API_SECRET')) \
-        .with_identity(username) \
-        .with_name(username) \
-        .with_grants(api.VideoGrants(
-            room_join=True,
-            room=room,
-        )).to_jwt()
+    try:
+        token, expires_at = _mint_token(get_token_cache(), room, username, request.GET.get('account'))
+    except PermissionError as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_403_FORBIDDEN)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     return JsonResponse({
         'token': token,
         'room': room,
-        'username': username
-    })
\ No newline at end of file
+        'username': username,
+        'expires_at': int(expires_at),
+    })
+
+
+def _caller_metadata(account):
+    """Participant metadata for a token; the voice agent sends email as the Gmail account named here.
+
+    Anyone can request a token, so only accounts in settings.LIVEKIT_TOKEN_GMAIL_ACCOUNTS
+    may be named (PermissionError otherwise).
+    """
+    if not account:
+        return None
+    account = normalize_account(account)
+    if account == DEFAULT_ACCOUNT:
+        return None
+    if account not in settings.LIVEKIT_TOKEN_GMAIL_ACCOUNTS:
+        raise PermissionError(f"Gmail account {account!r} may not be used from a LiveKit token")
+    return json.dumps({'gmail_account': account})
+
+
+def _mint_token(cache, room, username, account=None, grants=None):
+    """A cached or freshly signed token; PermissionError or ValueError for a refused request"""
+    return cache.get(room, username, metadata=_caller_metadata(account), grants=grants)
+
+
+MAX_BULK_TOKENS = 1000
+# Signing is ~0.2ms per token; give other requests the event loop between groups of this many
+BULK_TOKENS_PER_YIELD = 100
+
+
+@csrf_exempt
+@require_POST
+async def generate_livekit_tokens_bulk(request):
+    """
+    Mint tokens for many participants of one room in a single call
+    Expects JSON data with:
+    {
+        "room": "my-room",
+        "participants": [
+            {"username": "alice", "account": "sales", "grants": {"can_publish": false}},
+            ...
+        ]
+    }
+    "account" and "grants" are optional; "account" must be in settings.LIVEKIT_TOKEN_GMAIL_ACCOUNTS
+    (403 otherwise) and grants may only switch off can_publish, can_subscribe or can_publish_data. Returns one token per participant, in order.
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON data'}, status=status.HTTP_400_BAD_REQUEST)
+
+    participants = data.get('participants') if isinstance(data, dict) else None
+    room = data.get('room') if isinstance(data, dict) else None
+    if not isinstance(room, str) or not room:
+        return JsonResponse({'error': 'Missing required field: room'}, status=status.HTTP_400_BAD_REQUEST)
+    if not isinstance(participants, list) or not participants:
+        return JsonResponse(
+            {'error': 'Missing required field: participants (non-empty list)'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(participants) > MAX_BULK_TOKENS:
+        return JsonResponse(
+            {'error': f'Too many participants: {len(participants)} (max {MAX_BULK_TOKENS})'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    cache = get_token_cache()
+    tokens = []
+    for index, participant in enumerate(participants):
+        username = participant.get('username') if isinstance(participant, dict) else None
+        if not isinstance(username, str) or not username:
+            return JsonResponse(
+                {'error': f'participants[{index}]: missing username'}, status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            token, expires_at = _mint_token(cache, room, username, participant.get('account'),
+                                            participant.get('grants'))
+        except PermissionError as e:
+            return JsonResponse({'error': f'participants[{index}]: {e}'}, status=status.HTTP_403_FORBIDDEN)
+        except ValueError as e:
+            return JsonResponse({'error': f'participants[{index}]: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+        tokens.append({'username': username, 'token': token, 'expires_at': int(expires_at)})
+        if len(tokens) % BULK_TOKENS_PER_YIELD == 0:
+            await asyncio.sleep(0)
+
+    return JsonResponse({'room': room, 'tokens': tokens})
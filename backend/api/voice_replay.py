@@ -0,0 +1,409 @@
+# Offline replay of the voice pipeline, for turn latency work without a room or providers.
+# User utterances (WAV recordings, or synthesized voiced audio) are played in real time into
+# an AgentSession running the real Silero VAD and turn handling; STT, LLM and TTS are local
+# fakes with scripted delays. Each turn is timed from the end of the user's speech, known
+# exactly from the audio, to the first frame of the reply reaching the audio output.
+# Used by bench_voice_replay.
+import asyncio
+import logging
+import time
+import wave
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from livekit import rtc
+from livekit.agents import (
+    DEFAULT_API_CONNECT_OPTIONS, NOT_GIVEN, AgentSession, APIConnectOptions, llm, stt, tts, utils,
+)
+from livekit.agents.inference_runner import _InferenceRunner
+from livekit.agents.language import LanguageCode
+from livekit.agents.voice import io
+from voice_common.chat_window import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+FRAME_MS = 10  # what a room track delivers
+TTS_SAMPLE_RATE = 24000
+# A 10ms frame counts as speech above this fraction of the loudest frame's RMS (-30 dB)
+SPEECH_RMS_RATIO = 10 ** (-30 / 20)
+
+# (F1, F2, F3) of a few English vowels, for synthesized utterances
+_VOWEL_FORMANTS = ((730, 1090, 2440), (270, 2290, 3010), (530, 1840, 2480), (570, 840, 2410), (300, 870, 2240))
+
+
+@dataclass
+class Utterance:
+    name: str
+    # What the scripted STT returns for it
+    text: str
+    samples: np.ndarray  # int16 mono
+    sample_rate: int
+    # Offset (s) of the end of the last frame with speech in it
+    speech_end: float
+
+    @property
+    def duration(self) -> float:
+        return len(self.samples) / self.sample_rate
+
+
+def speech_end_offset(samples: np.ndarray, sample_rate: int) -> float:
+    """End of the last 10ms frame louder than SPEECH_RMS_RATIO of the loudest one"""
+    size = sample_rate * FRAME_MS // 1000
+    frames = len(samples) // size
+    if not frames:
+        return len(samples) / sample_rate
+    rms = np.sqrt(np.mean(samples[:frames * size].astype(np.float64).reshape(frames, size) ** 2, axis=1))
+    voiced = np.nonzero(rms > rms.max() * SPEECH_RMS_RATIO)[0]
+    return (voiced[-1] + 1) * size / sample_rate if len(voiced) else 0.0
+
+
+def load_wav_utterances(directory: str) -> List[Utterance]:
+    """16-bit PCM WAV files in name order; a sidecar .txt next to each holds its transcript"""
+    utterances = []
+    for path in sorted(Path(directory).glob('*.wav')):
+        with wave.open(str(path), 'rb') as handle:
+            if handle.getsampwidth() != 2:
+                raise ValueError(f"{path} is not 16-bit PCM")
+            channels, sample_rate = handle.getnchannels(), handle.getframerate()
+            samples = np.frombuffer(handle.readframes(handle.getnframes()), dtype=np.int16)
+        if channels > 1:
+            samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+        transcript = path.with_suffix('.txt')
+        text = transcript.read_text().strip() if transcript.exists() else path.stem.replace('_', ' ')
+        utterances.append(Utterance(path.stem, text, samples, sample_rate, speech_end_offset(samples, sample_rate)))
+    return utterances
+
+
+def synthetic_utterance(name: str, text: str, sample_rate: int = 16000, seed: int = 0,
+                        syllable_s: float = 0.2, word_gap_s: float = 0.06) -> Utterance:
+    """Voiced audio shaped like `text` (a vowel-like syllable per ~3 letters), which Silero hears as speech"""
+    rng = np.random.default_rng(seed)
+    words = text.split() or ['hello']
+    syllables = [max(1, round(len(word) / 3)) for word in words]
+    duration = sum(syllables) * syllable_s + (len(words) - 1) * word_gap_s
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    pitch = (100 + 40 * rng.random()) * (1 + 0.08 * np.sin(2 * np.pi * 0.7 * t) + 0.03 * np.sin(2 * np.pi * 5 * t))
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+
+    # Per sample: which syllable it belongs to (-1 in the gaps between words) and how far into it
+    syllable_of = np.full(len(t), -1)
+    position = np.zeros(len(t))
+    start, index = 0.0, 0
+    for count in syllables:
+        for _ in range(count):
+            first, last = int(start * sample_rate), int((start + syllable_s) * sample_rate)
+            syllable_of[first:last] = index
+            position[first:last] = np.linspace(0, 1, last - first, endpoint=False)
+            start += syllable_s
+            index += 1
+        start += word_gap_s
+    formants = np.array([_VOWEL_FORMANTS[i] for i in rng.integers(len(_VOWEL_FORMANTS), size=index)])[
+        np.maximum(syllable_of, 0)]
+
+    signal = np.zeros(len(t))
+    for harmonic in range(1, 40):
+        frequency = harmonic * pitch
+        amplitude = 0.02 / harmonic + sum(
+            np.exp(-((frequency - formants[:, j]) / bandwidth) ** 2 / 2) * 0.5 ** j
+            for j, bandwidth in enumerate((80, 100, 120)))
+        signal += amplitude * np.sin(harmonic * phase)
+    envelope = np.where(syllable_of >= 0, np.sin(np.pi * position) ** 0.6, 0.0)
+    signal = signal * envelope + 0.01 * rng.standard_normal(len(t)) * envelope
+    samples = (signal / max(np.abs(signal).max(), 1e-9) * 12000).astype(np.int16)
+    return Utterance(name, text, samples, sample_rate, speech_end_offset(samples, sample_rate))
+
+
+class ReplayAudioInput(io.AudioInput):
+    """A microphone that plays queued utterances and is silent in between, paced in real time"""
+
+    def __init__(self, sample_rate: int) -> None:
+        super().__init__(label="Replay")
+        self.sample_rate = sample_rate
+        self.frame_size = sample_rate * FRAME_MS // 1000
+        # What the scripted STT answers with: the utterance most recently started
+        self.current_text = ''
+        self._queue: List[tuple] = []
+        self._started: Optional[float] = None
+        self._sent = 0
+        self._closed = False
+
+    def play(self, utterance: Utterance) -> 'asyncio.Future[float]':
+        """Queue an utterance; the future gets the perf_counter time its speech ended"""
+        if utterance.sample_rate != self.sample_rate:
+            raise ValueError(f"{utterance.name} is {utterance.sample_rate}Hz, the input runs at {self.sample_rate}Hz")
+        speech_ended = asyncio.get_running_loop().create_future()
+        self._queue.append((utterance, 0, speech_ended))
+        return speech_ended
+
+    def close(self) -> None:
+        self._closed = True
+
+    async def __anext__(self) -> rtc.AudioFrame:
+        if self._closed:
+            raise StopAsyncIteration
+        if self._started is None:
+            self._started = time.perf_counter()
+        # A frame is delivered once all of it has been "spoken", like a real track
+        frame_end = self._started + (self._sent + self.frame_size) / self.sample_rate
+        await asyncio.sleep(max(0.0, frame_end - time.perf_counter()))
+
+        samples = np.zeros(self.frame_size, dtype=np.int16)
+        if self._queue:
+            utterance, offset, speech_ended = self._queue[0]
+            if offset == 0:
+                self.current_text = utterance.text
+            chunk = utterance.samples[offset:offset + self.frame_size]
+            samples[:len(chunk)] = chunk
+            offset += self.frame_size
+            end_sample = int(utterance.speech_end * utterance.sample_rate)
+            if offset >= end_sample and not speech_ended.done():
+                # When the last voiced sample was spoken, not when its frame arrived
+                speech_ended.set_result(self._started + (self._sent + self.frame_size - (offset - end_sample))
+                                        / self.sample_rate)
+            if offset >= len(utterance.samples):
+                self._queue.pop(0)
+            else:
+                self._queue[0] = (utterance, offset, speech_ended)
+        self._sent += self.frame_size
+        return rtc.AudioFrame(samples.tobytes(), self.sample_rate, 1, self.frame_size)
+
+
+class ReplayAudioOutput(io.AudioOutput):
+    """A speaker that plays out in real time and notes when each reply's first frame arrived"""
+
+    def __init__(self) -> None:
+        super().__init__(label="Replay", capabilities=io.AudioOutputCapabilities(pause=False), sample_rate=None)
+        self.first_frames: asyncio.Queue = asyncio.Queue()
+        # Current segment: [perf_counter of its first frame, seconds of audio captured]
+        self._segment: Optional[list] = None
+        self._playing: Dict[asyncio.Task, list] = {}
+
+    async def capture_frame(self, frame: rtc.AudioFrame) -> None:
+        await super().capture_frame(frame)
+        if self._segment is None:
+            self._segment = [time.perf_counter(), 0.0]
+            self.first_frames.put_nowait(self._segment[0])
+            self.on_playback_started(created_at=time.time())
+        self._segment[1] += frame.duration
+
+    def flush(self) -> None:
+        super().flush()
+        if self._segment is None:
+            return
+        segment, self._segment = self._segment, None
+        task = asyncio.create_task(self._play_out(segment))
+        self._playing[task] = segment
+        task.add_done_callback(self._playing.pop)
+
+    async def _play_out(self, segment: list) -> None:
+        started, pushed = segment
+        await asyncio.sleep(max(0.0, started + pushed - time.perf_counter()))
+        self.on_playback_finished(playback_position=pushed, interrupted=False)
+
+    def clear_buffer(self) -> None:
+        now = time.perf_counter()
+        interrupted = list(self._playing.values())
+        for task in list(self._playing):
+            task.cancel()
+        if self._segment is not None:
+            interrupted.append(self._segment)
+            self._segment = None
+        for started, pushed in interrupted:
+            self.on_playback_finished(playback_position=min(max(0.0, now - started), pushed), interrupted=True)
+
+
+class ScriptedSTT(stt.STT):
+    """Answers each VAD-segmented recognize() after `delay` seconds with `transcript()`.
+
+    Non-streaming, so the session wraps it in a StreamAdapter on its VAD,
+    the way a batch STT provider is used.
+    """
+
+    def __init__(self, transcript: Callable[[], str], delay: float = 0.2) -> None:
+        super().__init__(capabilities=stt.STTCapabilities(streaming=False, interim_results=False))
+        self._transcript = transcript
+        self._delay = delay
+
+    @property
+    def model(self) -> str:
+        return "scripted"
+
+    @property
+    def provider(self) -> str:
+        return "replay"
+
+    async def _recognize_impl(self, buffer, *, language=NOT_GIVEN,
+                              conn_options: APIConnectOptions) -> stt.SpeechEvent:
+        await asyncio.sleep(self._delay)
+        return stt.SpeechEvent(
+            type=stt.SpeechEventType.FINAL_TRANSCRIPT,
+            request_id=utils.shortuuid(),
+            alternatives=[stt.SpeechData(language=LanguageCode("en"), text=self._transcript(), confidence=1.0)],
+        )
+
+
+class ScriptedLLM(llm.LLM):
+    """Streams `reply` word by word, `ttft` seconds after the request, then `token_delay` apart"""
+
+    def __init__(self, reply: str, ttft: float = 0.4, token_delay: float = 0.02) -> None:
+        super().__init__()
+        self.reply = reply
+        self.ttft = ttft
+        self.token_delay = token_delay
+
+    @property
+    def model(self) -> str:
+        return "scripted"
+
+    @property
+    def provider(self) -> str:
+        return "replay"
+
+    def chat(self, *, chat_ctx: llm.ChatContext, tools=None, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+             **kwargs) -> llm.LLMStream:
+        return _ScriptedLLMStream(self, chat_ctx=chat_ctx, tools=tools or [], conn_options=conn_options)
+
+
+class _ScriptedLLMStream(llm.LLMStream):
+    async def _run(self) -> None:
+        request_id = utils.shortuuid()
+        scripted: ScriptedLLM = self._llm
+        words = scripted.reply.split()
+        await asyncio.sleep(scripted.ttft)
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(scripted.token_delay)
+            self._event_ch.send_nowait(llm.ChatChunk(
+                id=request_id, delta=llm.ChoiceDelta(role="assistant", content=word if i == 0 else " " + word)))
+        prompt_tokens = sum(estimate_tokens(message.text_content) for message in self._chat_ctx.messages())
+        self._event_ch.send_nowait(llm.ChatChunk(id=request_id, usage=llm.CompletionUsage(
+            completion_tokens=len(words), prompt_tokens=prompt_tokens, total_tokens=prompt_tokens + len(words))))
+
+
+class ScriptedTTS(tts.TTS):
+    """Returns `seconds_per_char` of quiet PCM per character, `ttfb` seconds after each request,
+    then in 100ms chunks at `realtime_factor` times real time"""
+
+    def __init__(self, ttfb: float = 0.3, seconds_per_char: float = 0.06, realtime_factor: float = 4.0) -> None:
+        super().__init__(capabilities=tts.TTSCapabilities(streaming=False), sample_rate=TTS_SAMPLE_RATE,
+                         num_channels=1)
+        self.ttfb = ttfb
+        self.seconds_per_char = seconds_per_char
+        self.realtime_factor = realtime_factor
+
+    @property
+    def model(self) -> str:
+        return "scripted"
+
+    @property
+    def provider(self) -> str:
+        return "replay"
+
+    def synthesize(self, text: str, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS
+                   ) -> tts.ChunkedStream:
+        return _ScriptedChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+
+class _ScriptedChunkedStream(tts.ChunkedStream):
+    async def _run(self, output_emitter: tts.AudioEmitter) -> None:
+        scripted: ScriptedTTS = self._tts
+        output_emitter.initialize(request_id=utils.shortuuid(), sample_rate=TTS_SAMPLE_RATE, num_channels=1,
+                                  mime_type="audio/pcm")
+        await asyncio.sleep(scripted.ttfb)
+        chunk = TTS_SAMPLE_RATE // 10
+        remaining = int(len(self._input_text) * scripted.seconds_per_char * TTS_SAMPLE_RATE)
+        # Not digital silence, in case anything downstream looks at levels
+        tone = (np.sin(2 * np.pi * 220 * np.arange(chunk) / TTS_SAMPLE_RATE) * 300).astype(np.int16).tobytes()
+        while remaining > 0:
+            size = min(chunk, remaining)
+            output_emitter.push(tone[:size * 2])
+            remaining -= size
+            if remaining > 0:
+                await asyncio.sleep(size / TTS_SAMPLE_RATE / scripted.realtime_factor)
+        output_emitter.flush()
+
+
+class InProcessInference:
+    """Runs LiveKit inference runners (the EOU turn detector) on a thread of this process.
+
+    A worker does this in a separate inference process; the replay has no worker.
+    """
+
+    def __init__(self) -> None:
+        self._runners: Dict[str, _InferenceRunner] = {}
+
+    def load(self, method: str) -> None:
+        runner = _InferenceRunner.registered_runners[method]()
+        runner.initialize()  # raises if the model files were never downloaded
+        self._runners[method] = runner
+
+    async def do_inference(self, method: str, data: bytes) -> Optional[bytes]:
+        return await asyncio.to_thread(self._runners[method].run, data)
+
+
+@dataclass
+class ReplayTurn:
+    utterance: str
+    speech_end_s: float
+    # End of the user's speech to the first reply frame at the output; None when no reply came
+    first_audio_s: Optional[float]
+    # The pipeline's own breakdown from the turn's chat messages (ChatMessage.metrics)
+    metrics: Dict[str, float]
+
+    def to_dict(self) -> Dict:
+        return {
+            'utterance': self.utterance,
+            'speech_end_s': round(self.speech_end_s, 3),
+            'first_audio_ms': round(self.first_audio_s * 1000, 1) if self.first_audio_s is not None else None,
+            **{f'{key}_ms': round(value * 1000, 1) for key, value in self.metrics.items()},
+        }
+
+
+_TURN_METRICS = ('end_of_turn_delay', 'transcription_delay', 'llm_node_ttft', 'tts_node_ttfb', 'e2e_latency')
+
+
+async def replay(session: AgentSession, agent, utterances: List[Utterance], audio_input: ReplayAudioInput,
+                 gap: float = 1.0, turn_timeout: float = 15.0) -> List[ReplayTurn]:
+    """Start `agent` on `session` (wired to `audio_input` and a ReplayAudioOutput) and play
+    the utterances one at a time, each `gap` seconds after the previous reply played out"""
+    audio_output = ReplayAudioOutput()
+    session.input.audio = audio_input
+    session.output.audio = audio_output
+    messages: List[llm.ChatMessage] = []
+    session.on("conversation_item_added",
+               lambda ev: messages.append(ev.item) if ev.item.type == "message" else None)
+    await session.start(agent=agent, record=False)
+
+    turns = []
+    try:
+        for utterance in utterances:
+            await asyncio.sleep(gap)
+            seen = len(messages)
+            while not audio_output.first_frames.empty():
+                audio_output.first_frames.get_nowait()
+            speech_ended = audio_input.play(utterance)
+            try:
+                first_frame = await asyncio.wait_for(
+                    audio_output.first_frames.get(), timeout=utterance.duration + turn_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"No reply to {utterance.name} within {turn_timeout}s of it ending")
+                first_frame = None
+            ended = await speech_ended
+            if first_frame is not None:
+                await audio_output.wait_for_playout()
+                # The assistant message is added once its speech is done
+                await asyncio.sleep(0.05)
+            metrics: Dict[str, float] = {}
+            for message in messages[seen:]:
+                for key in _TURN_METRICS:
+                    if key in message.metrics:
+                        metrics[key] = message.metrics[key]
+            turns.append(ReplayTurn(utterance.name, utterance.speech_end,
+                                    first_frame - ended if first_frame is not None else None, metrics))
+    finally:
+        audio_input.close()
+        await session.aclose()
+    return turns
+
@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
+
+The API views are native async views, so this is the preferred entrypoint:
+
+    gunicorn backend.asgi:application -k uvicorn.workers.UvicornWorker
 """
 
 import os
@@ -14,3 +18,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_asgi_application()
+
+# Start building the shared AIService now so the first request does not pay for it;
+# set AI_SERVICE_WARMUP=false to build it lazily instead
+from api.tools import warm_up_ai_service  # noqa: E402
+
+warm_up_ai_service()
@@ -41,6 +41,16 @@ CORS_ALLOW_CREDENTIALS = True
 LIVEKIT_API_KEY = os.environ.get('LIVEKIT_API_KEY')
 LIVEKIT_API_SECRET = os.environ.get('LIVEKIT_API_SECRET')
 LIVEKIT_URL = os.environ.get('LIVEKIT_URL', 'wss://grant-gqi9u97k.livekit.cloud')
+# Signed tokens are cached per (room, identity, grants) and reused until
+# LIVEKIT_TOKEN_REFRESH_MARGIN seconds before they expire (api/livekit.py)
+LIVEKIT_TOKEN_TTL = int(os.environ.get('LIVEKIT_TOKEN_TTL', str(6 * 3600)))
+LIVEKIT_TOKEN_REFRESH_MARGIN = int(os.environ.get('LIVEKIT_TOKEN_REFRESH_MARGIN', '600'))
+LIVEKIT_TOKEN_CACHE_ENABLED = os.environ.get('LIVEKIT_TOKEN_CACHE', 'true').lower() in ('1', 'true', 'yes')
+# Gmail accounts a token request may ask the voice agent to send as (?account=, comma-separated).
+# The token endpoints are public, so none are allowed unless listed; the default account always is.
+LIVEKIT_TOKEN_GMAIL_ACCOUNTS = [
+    name.strip() for name in os.environ.get('LIVEKIT_TOKEN_GMAIL_ACCOUNTS', '').split(',') if name.strip()
+]
 
 # Application definition
 
@@ -86,6 +96,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'backend.wsgi.application'
+ASGI_APPLICATION = 'backend.asgi.application'
 
 
 # Database
@@ -95,9 +106,24 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # WAL lets the outbox workers write while the API keeps reading
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
+# Outbound email queue (api/outbox.py). When enabled, /api/send-email/ and the
+# voice tool enqueue instead of sending inline; run `manage.py run_outbox_workers`.
+EMAIL_QUEUE_ENABLED = os.environ.get('EMAIL_QUEUE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+OUTBOX_WORKERS = int(os.environ.get('OUTBOX_WORKERS', '4'))
+OUTBOX_POLL_INTERVAL = float(os.environ.get('OUTBOX_POLL_INTERVAL', '1.0'))
+
+# Optional JSON intent table for process_voice_command (see api/intents.py for the format)
+VOICE_INTENTS_PATH = os.environ.get('VOICE_INTENTS_PATH')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+# Start building the shared AIService now so the first request does not pay for it;
+# set AI_SERVICE_WARMUP=false to build it lazily instead
+from api.tools import warm_up_ai_service  # noqa: E402
+
+warm_up_ai_service()
@@ -0,0 +1,2 @@
+# Code shared by the two voice agents, backend/api (Django) and assistant-back, which
+# are deployed on their own; each installs this package from its requirements.txt
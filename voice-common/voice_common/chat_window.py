@@ -0,0 +1,160 @@
+# Bounded chat context for the voice agents. The last few turns are sent verbatim;
+# older turns are folded into a running summary that a background LLM call keeps up
+# to date, so the prompt stops growing with the length of the call. Until a turn has
+# been summarized it stays in the prompt verbatim, so nothing is lost while the
+# summary catches up.
+# Kept free of LiveKit imports: the agents turn their chat contexts into Entry lists
+# and build the prompt from the plan. Used by both agents, backend/api/Call.py and
+# assistant-back/agent.py.
+import asyncio
+import logging
+import math
+from collections import Counter
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Set
+
+logger = logging.getLogger(__name__)
+
+_INSTRUCTION_ROLES = ('system', 'developer')
+
+SUMMARY_PROMPT = (
+    "You keep the running summary of a phone call between a user and a voice assistant. "
+    "Rewrite the summary so it also covers the new part of the conversation. Keep names, "
+    "email addresses, dates, what the user asked for and what was done or promised; drop "
+    "small talk. Answer with the summary only, at most {words} words.\n\n"
+    "Current summary:\n{summary}\n\nNew part of the conversation:\n{transcript}"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """~4 characters per token, close enough to budget a prompt"""
+    return math.ceil(len(text or '') / 4)
+
+
+@dataclass(frozen=True)
+class Entry:
+    id: str
+    # system/developer, user, assistant or tool
+    role: str
+    text: str
+
+
+@dataclass
+class WindowPlan:
+    # Summary to put after the instructions, or None
+    summary: Optional[str]
+    # Entries to send verbatim, in order
+    keep_ids: List[str]
+    prompt_tokens: int
+    recent_turns: int
+    # Older turns still verbatim because the summary has not caught up with them
+    pending_turns: int
+
+
+class ChatWindow:
+    """Decides what part of a session's history goes into the next prompt.
+
+    `summarize(prompt)` returns the LLM's answer to a summarization prompt.
+    At most `max_turns` recent turns, and no more than `max_tokens` of them,
+    are kept verbatim (the latest turn always is). The summary is refreshed
+    once `batch_turns` older turns are waiting for it, one LLM call per batch.
+    """
+
+    def __init__(self, summarize: Callable[[str], Awaitable[str]], max_turns: int = 6,
+                 max_tokens: int = 2000, summary_words: int = 150, batch_turns: int = 3):
+        self.summarize = summarize
+        self.max_turns = max(1, max_turns)
+        self.max_tokens = max_tokens
+        self.summary_words = summary_words
+        self.batch_turns = max(1, min(batch_turns, self.max_turns))
+        self.summary = ''
+        self._summarized: Set[str] = set()
+        self._summarized_turns = 0
+        self._refresh: Optional[asyncio.Task] = None
+        self._stats: Counter = Counter()
+        self._prompt_tokens_max = 0
+
+    @staticmethod
+    def _turns(entries: Sequence[Entry]) -> List[List[Entry]]:
+        turns: List[List[Entry]] = []
+        for entry in entries:
+            if entry.role == 'user' or not turns:
+                turns.append([])
+            turns[-1].append(entry)
+        return turns
+
+    @staticmethod
+    def _tokens(entries: Sequence[Entry]) -> int:
+        return sum(estimate_tokens(entry.text) for entry in entries)
+
+    def plan(self, entries: Sequence[Entry]) -> WindowPlan:
+        """Called before each LLM request, from the event loop (it may start a summary refresh)"""
+        pinned = 0
+        while pinned < len(entries) and entries[pinned].role in _INSTRUCTION_ROLES:
+            pinned += 1
+        turns = self._turns(entries[pinned:])
+
+        recent, recent_tokens = 0, 0
+        for turn in reversed(turns):
+            tokens = self._tokens(turn)
+            if recent and (recent >= self.max_turns or recent_tokens + tokens > self.max_tokens):
+                break
+            recent += 1
+            recent_tokens += tokens
+        older = turns[:len(turns) - recent]
+
+        pending = [turn for turn in older if any(entry.id not in self._summarized for entry in turn)]
+        if len(pending) > self.max_turns:
+            # The summarizer is failing or far behind; drop the oldest rather than grow without bound
+            dropped = pending[:-self.max_turns]
+            pending = pending[-self.max_turns:]
+            for turn in dropped:
+                self._summarized.update(entry.id for entry in turn)
+            self._stats['dropped_turns'] += len(dropped)
+            logger.warning(f"Dropped {len(dropped)} turn(s) from the chat context without summarizing them")
+        if len(pending) >= self.batch_turns and (self._refresh is None or self._refresh.done()):
+            self._refresh = asyncio.create_task(self._update_summary(pending), name="chat-summary")
+
+        summary = self.summary if self.summary and len(pending) < len(older) else None
+        keep = list(entries[:pinned]) + [entry for turn in pending + turns[len(older):] for entry in turn]
+        prompt_tokens = self._tokens(keep) + estimate_tokens(summary)
+
+        self._stats['prompts'] += 1
+        self._stats['prompt_tokens'] += prompt_tokens
+        self._prompt_tokens_max = max(self._prompt_tokens_max, prompt_tokens)
+        return WindowPlan(summary, [entry.id for entry in keep], prompt_tokens, recent, len(pending))
+
+    async def _update_summary(self, turns: List[List[Entry]]) -> None:
+        transcript = "\n".join(f"{entry.role}: {entry.text}" for turn in turns for entry in turn if entry.text)
+        prompt = SUMMARY_PROMPT.format(words=self.summary_words, summary=self.summary or "(none yet)",
+                                       transcript=transcript)
+        try:
+            summary = (await self.summarize(prompt) or '').strip()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._stats['summary_failures'] += 1
+            logger.warning(f"Could not summarize {len(turns)} turn(s), keeping them verbatim: {e}")
+            return
+        if not summary:
+            self._stats['summary_failures'] += 1
+            return
+        self.summary = summary
+        self._summarized.update(entry.id for turn in turns for entry in turn)
+        self._summarized_turns += len(turns)
+        self._stats['summaries'] += 1
+
+    def stats(self) -> Dict[str, int]:
+        prompts = self._stats['prompts']
+        return {
+            **self._stats,
+            'summarized_turns': self._summarized_turns,
+            'summary_tokens': estimate_tokens(self.summary),
+            'prompt_tokens_mean': round(self._stats['prompt_tokens'] / prompts) if prompts else 0,
+            'prompt_tokens_max': self._prompt_tokens_max,
+        }
+
+    async def aclose(self) -> None:
+        if self._refresh is not None:
+            self._refresh.cancel()
+            await asyncio.gather(self._refresh, return_exceptions=True)